@@ -0,0 +1,345 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import time
+
+from psycopg import sql as psycopg_sql
+from psycopg2 import sql
+
+import datagen
+import search
+from catalog import schema_catalog
+from db_pool import DB_NAME, SERVER_DB_NAME, connection_manager
+from instrumentation import query_log
+from service import close_runner, get_runner
+from table_api import NEXT, TableBrowser
+
+# Каталог для отчетов по умолчанию
+RESULTS_DIR = 'bench_results'
+# Копия базы, в которой bulk_delete удаляет строки (удаление фиксируется пачками и не откатывается)
+SCRATCH_DATABASE = DB_NAME + '__bench'
+# Таблицы, которые открываются в сценариях просмотра, и колонки сценариев поиска
+BROWSE_TABLES = ['payments', 'enrollments', 'reviews', 'users']
+SEARCH_TARGETS = [('users', 'name'), ('users', 'email'), ('reviews', 'comment'), ('tutors', 'bio')]
+# Репетиторы с наибольшим числом занятий: их занятия удаляет service_bulk_delete
+BUSIEST_TUTORS_QUERY = "SELECT tutor_id FROM Sessions GROUP BY tutor_id ORDER BY count(*) DESC, tutor_id LIMIT %s"
+SEARCH_TERMS = ['ан', 'ова', 'user12', 'Иван', 'example', 'Математика', 'практик', 'zzz']
+
+
+class Measurement:
+    # Время отдельных операций одного сценария и число обработанных строк
+    def __init__(self):
+        self.latencies = []
+        self.rows = 0
+
+    def time(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        return result
+
+    def report(self):
+        total = sum(self.latencies)
+        result = {
+            'operations': len(self.latencies),
+            'rows': self.rows,
+            'seconds': round(total, 6),
+            'rows_per_second': round(self.rows / total, 2) if total and self.rows else None,
+        }
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            result['latency_ms'] = {
+                'mean': round(statistics.mean(ordered) * 1000, 3),
+                'p50': round(ordered[len(ordered) // 2] * 1000, 3),
+                'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                'max': round(ordered[-1] * 1000, 3),
+            }
+        return result
+
+
+def table_sizes(connection):
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in schema_catalog.tables(include_views=False):
+            cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table)))
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def bench_review_inserts(connection, rng, count, batch_size):
+    # Вставка отзывов через триггер рейтинга: по одной строке и пачками; изменения откатываются
+    results = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(session_id), max(session_id) FROM Sessions")
+        low, high = cursor.fetchone()
+        cursor.execute("SELECT min(user_id), max(user_id) FROM Users WHERE role = 'student'")
+        student_low, student_high = cursor.fetchone()
+    if low is None or student_low is None:
+        return {'skipped': "нет занятий или студентов"}
+
+    def review_row():
+        return (rng.randint(low, high), rng.randint(student_low, student_high), rng.randint(1, 5), 'benchmark')
+
+    single = Measurement()
+    with connection.cursor() as cursor:
+        for _ in range(count):
+            single.time(cursor.execute,
+                        "INSERT INTO Reviews (session_id, student_id, rating, comment) VALUES (%s, %s, %s, %s)",
+                        review_row())
+            single.rows += 1
+    connection.rollback()
+    results['single_row'] = single.report()
+
+    batch = Measurement()
+    with connection.cursor() as cursor:
+        for _ in range(max(1, count // batch_size)):
+            rows = [review_row() for _ in range(batch_size)]
+            values = sql.SQL(', ').join(sql.Literal(row) for row in rows)
+            batch.time(cursor.execute, sql.SQL(
+                "INSERT INTO Reviews (session_id, student_id, rating, comment) VALUES {}").format(values))
+            batch.rows += batch_size
+    connection.rollback()
+    results['batch'] = batch.report()
+    return results
+
+
+def bench_search(connection, repeats):
+    # Поиск как в search_table: старый вариант (::text ILIKE) и индексный (search.search_condition)
+    results = {}
+    for table, column in SEARCH_TARGETS:
+        if not schema_catalog.has_column(table, column):
+            continue
+        data_type = schema_catalog.column_types(table)[column]
+        legacy = Measurement()
+        indexed = Measurement()
+        with connection.cursor() as cursor:
+            for _ in range(repeats):
+                for term in SEARCH_TERMS:
+                    legacy.time(cursor.execute, sql.SQL("SELECT * FROM {} WHERE {}::text ILIKE %s").format(
+                        sql.Identifier(table), sql.Identifier(column)), (f"%{term}%",))
+                    legacy.rows += len(cursor.fetchall())
+
+                    condition, params = search.search_condition(column, data_type, term)
+                    indexed.time(cursor.execute, sql.SQL("SELECT * FROM {} WHERE {}").format(
+                        sql.Identifier(table), condition), params)
+                    indexed.rows += len(cursor.fetchall())
+        results[f"{table}.{column}"] = {'legacy_ilike': legacy.report(), 'index_friendly': indexed.report()}
+    connection.rollback()
+    return results
+
+
+def bench_delete_cascade(connection, repeats):
+    # Прежнее удаление найденных записей процедурой delete_records_by_condition_proc (для сравнения
+    # с service_bulk_delete): удаление занятий по условию с каскадом; каждое удаление откатывается
+    measurement = Measurement()
+    with connection.cursor() as cursor:
+        for day in range(1, repeats + 1):
+            cursor.execute("SAVEPOINT bench_delete")
+            measurement.time(cursor.execute, "CALL delete_records_by_condition_proc(%s, %s, %s)",
+                             ('sessions', 'session_date', f"-{day:02d}"))
+            cursor.execute("ROLLBACK TO SAVEPOINT bench_delete")
+    connection.rollback()
+    return measurement.report()
+
+
+def bench_clear_all_tables(connection):
+    # clear_all_tables_proc внутри транзакции, которая затем откатывается
+    measurement = Measurement()
+    with connection.cursor() as cursor:
+        measurement.time(cursor.execute, "CALL clear_all_tables_proc()")
+    connection.rollback()
+    return measurement.report()
+
+
+def bench_table_load(connection, repeats, deep_pages):
+    # Просмотр TableBrowser на соединении psycopg2 (для сравнения с service_table_load):
+    # первая страница и переход на дальнюю страницу по ключу
+    results = {}
+    for table in BROWSE_TABLES:
+        if not schema_catalog.has_table(table):
+            continue
+        browser = TableBrowser(table)
+        first = Measurement()
+        deep = Measurement()
+        for _ in range(repeats):
+            page = first.time(browser.first_page, connection)
+            first.rows += len(page.rows)
+            for _ in range(deep_pages):
+                if not page.has_next:
+                    break
+                page = deep.time(browser.next_page, connection, page)
+                deep.rows += len(page.rows)
+        results[table] = {'first_page': first.report(), 'next_page': deep.report()}
+    connection.rollback()
+    return results
+
+
+def bench_service_table_load(runner, repeats, deep_pages):
+    # Открытие таблицы в GUI: DatabaseService.browse, первая и следующие страницы
+    results = {}
+    catalog = runner.call('catalog')
+    for table in BROWSE_TABLES:
+        if not catalog.has_table(table):
+            continue
+        first = Measurement()
+        deep = Measurement()
+        for _ in range(repeats):
+            page = first.time(runner.call, 'browse', table)
+            first.rows += len(page.rows)
+            for _ in range(deep_pages):
+                if not page.has_next:
+                    break
+                page = deep.time(runner.call, 'browse', table, NEXT, page)
+                deep.rows += len(page.rows)
+        results[table] = {'first_page': first.report(), 'next_page': deep.report()}
+    return results
+
+
+def bench_service_search(runner, repeats):
+    # Поиск в GUI: первая страница DatabaseService.search
+    results = {}
+    catalog = runner.call('catalog')
+    for table, column in SEARCH_TARGETS:
+        if not catalog.has_column(table, column):
+            continue
+        measurement = Measurement()
+        for _ in range(repeats):
+            for term in SEARCH_TERMS:
+                page = measurement.time(runner.call, 'search', table, column, term)
+                measurement.rows += len(page.rows)
+        results[f"{table}.{column}"] = measurement.report()
+    return results
+
+
+def bench_service_bulk_delete(runner, repeats):
+    # Удаление найденных записей в GUI: DatabaseService.bulk_delete занятий репетитора с каскадом.
+    # Пачки фиксируются, поэтому удаление идет в копии базы, которая затем удаляется
+    runner.call('delete_database', SCRATCH_DATABASE)
+    runner.call('terminate_sessions', DB_NAME)
+    runner.call('execute', psycopg_sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+        psycopg_sql.Identifier(SCRATCH_DATABASE), psycopg_sql.Identifier(DB_NAME)), dbname=SERVER_DB_NAME)
+    try:
+        tutors = runner.call('execute', BUSIEST_TUTORS_QUERY, (repeats,), dbname=SCRATCH_DATABASE, fetch=True).rows
+        measurement = Measurement()
+        for tutor_id, in tutors:
+            # Без паузы между пачками: она измеряла бы sleep, а не удаление
+            measurement.rows += measurement.time(runner.call, 'bulk_delete', 'sessions', 'tutor_id', str(tutor_id),
+                                                 search.EXACT, pause=0, dbname=SCRATCH_DATABASE)
+        return measurement.report()
+    finally:
+        runner.call('delete_database', SCRATCH_DATABASE)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    report = {
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'database': DB_NAME,
+        'parameters': vars(args),
+        'results': {},
+    }
+
+    if args.generate:
+        with connection_manager.connection() as connection:
+            print(f"Генерация данных: {args.generate} пользователей...")
+            report['generation'] = datagen.load(connection, datagen.SchoolDataGenerator(args.generate, args.seed))
+            schema_catalog.invalidate()
+
+    with connection_manager.connection(autocommit=False) as connection:
+        report['table_sizes'] = table_sizes(connection)
+        connection.rollback()
+
+        scenarios = [
+            ('review_insert', lambda: bench_review_inserts(connection, rng, args.reviews, args.batch_size)),
+            ('search', lambda: bench_search(connection, args.repeats)),
+            ('delete_found_records', lambda: bench_delete_cascade(connection, args.repeats)),
+            ('clear_all_tables', lambda: bench_clear_all_tables(connection)),
+            ('table_load', lambda: bench_table_load(connection, args.repeats, args.deep_pages)),
+        ]
+        for name, scenario in scenarios:
+            if args.only and name not in args.only:
+                continue
+            print(f"Сценарий {name}...")
+            try:
+                report['results'][name] = scenario()
+            except Exception as e:
+                connection.rollback()
+                report['results'][name] = {'error': str(e)}
+                print(f"  ошибка: {e}")
+
+    # Те же операции через DatabaseService (psycopg 3), которым пользуется GUI
+    runner = get_runner()
+    scenarios = [
+        ('service_table_load', lambda: bench_service_table_load(runner, args.repeats, args.deep_pages)),
+        ('service_search', lambda: bench_service_search(runner, args.repeats)),
+        ('service_bulk_delete', lambda: bench_service_bulk_delete(runner, args.repeats)),
+    ]
+    for name, scenario in scenarios:
+        if args.only and name not in args.only:
+            continue
+        print(f"Сценарий {name}...")
+        try:
+            report['results'][name] = scenario()
+        except Exception as e:
+            report['results'][name] = {'error': str(e)}
+            print(f"  ошибка: {e}")
+    return report
+
+
+def compare(current, previous, path=()):
+    # Печатает изменение медианной задержки относительно прошлого отчета
+    for key, value in current.items():
+        old = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict) and old is not None:
+            if 'latency_ms' in value and 'latency_ms' in old:
+                new_p50, old_p50 = value['latency_ms']['p50'], old['latency_ms']['p50']
+                change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0
+                print(f"{'/'.join(path + (key,))}: p50 {old_p50} -> {new_p50} мс ({change:+.1f}%)")
+            else:
+                compare(value, old, path + (key,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Нагрузочные тесты базы {DB_NAME} (локальный PostgreSQL)")
+    parser.add_argument('--generate', type=int, metavar='USERS',
+                        help="Перед тестами заполнить базу данными datagen.py для указанного числа пользователей")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reviews', type=int, default=1000, help="Сколько отзывов вставлять")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--deep-pages', type=int, default=20)
+    parser.add_argument('--only', action='append', help="Запустить только указанный сценарий")
+    parser.add_argument('--output', help="Файл отчета JSON (по умолчанию bench_results/<время>.json)")
+    parser.add_argument('--compare', help="Отчет JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    # Снятие планов медленных запросов нагружает базу и искажало бы замеры
+    query_log.configure(threshold=0)
+    try:
+        report = run(args)
+    except Exception as e:
+        print('Ошибка при выполнении тестов:', e)
+        return 1
+    finally:
+        close_runner()
+        connection_manager.closeall()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Отчет сохранен: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report['results'], json.load(f).get('results', {}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,327 @@
+import argparse
+import csv
+import io
+import os
+import tempfile
+
+from psycopg2 import sql
+
+from catalog import schema_catalog
+from db_pool import DB_NAME, connection_manager
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:  # Parquet необязателен
+    pyarrow = None
+
+# Сколько строк загружается одной командой COPY (и одной транзакцией)
+BATCH_SIZE = 10000
+# Порядок загрузки по умолчанию: сначала таблицы, на которые ссылаются внешние ключи
+TABLE_ORDER = ['users', 'tutors', 'subjects', 'sessions', 'enrollments', 'payments', 'reviews']
+
+
+class ImportReport:
+    def __init__(self, table):
+        self.table = table
+        self.rows_loaded = 0
+        self.batches = 0
+        self.errors = []
+
+    def add_error(self, batch_number, first_line, last_line, message):
+        self.errors.append((batch_number, first_line, last_line, message))
+
+    def summary(self):
+        lines = [f"{self.table}: загружено строк {self.rows_loaded}, пакетов {self.batches}, ошибок {len(self.errors)}"]
+        for batch_number, first_line, last_line, message in self.errors:
+            lines.append(f"  пакет {batch_number} (строки {first_line}-{last_line}): {message.strip()}")
+        return "\n".join(lines)
+
+
+def table_load_order(tables=None):
+    # Топологическая сортировка таблиц по внешним ключам (родители раньше детей)
+    dependencies = schema_catalog.dependencies()
+    wanted = set(dependencies)
+    if tables is not None:
+        wanted &= set(t.lower() for t in tables)
+    # Внутри одного уровня сохраняем привычный порядок TABLE_ORDER
+    pending = sorted(wanted, key=lambda t: (TABLE_ORDER.index(t) if t in TABLE_ORDER else len(TABLE_ORDER), t))
+    ordered = []
+    while pending:
+        ready = [t for t in pending if not (dependencies.get(t, set()) & set(pending)) - {t}]
+        if not ready:
+            # Цикл внешних ключей: оставшиеся таблицы грузим как есть
+            ready = pending[:1]
+        for t in ready:
+            ordered.append(t)
+            pending.remove(t)
+    return ordered
+
+
+def _copy_batch(connection, copy_query, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(copy_query, buffer)
+
+
+def _sync_sequences(connection, table, columns):
+    # COPY с явными id не двигает последовательности SERIAL: без setval следующий INSERT
+    # получил бы id, который уже занят загруженной строкой
+    with connection.cursor() as cursor:
+        for column in columns:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(sql.SQL("SELECT setval(%s, GREATEST((SELECT max({}) FROM {}), 1))").format(
+                    sql.Identifier(column), sql.Identifier(table)), (sequence,))
+    connection.commit()
+
+
+def _import_rows(connection, table, header, rows, column_mapping=None, batch_size=BATCH_SIZE,
+                 stop_on_error=False, progress=None, first_line=2):
+    # Общая часть импорта CSV и Parquet: rows - итератор списков значений в порядке header
+    table = table.lower()
+    report = ImportReport(table)
+    if not schema_catalog.has_table(table):
+        raise ValueError(f"Таблица {table} не найдена")
+    # Вычисляемые колонки (например, Sessions.period) есть в экспорте, но при импорте пропускаются
+    target_columns = [column.name for column in schema_catalog.columns(table) if not column.is_generated]
+
+    column_mapping = {k: v.lower() for k, v in (column_mapping or {}).items()}
+    # Колонки файла, которые есть в таблице (с учетом переименования), остальные пропускаются
+    selected = []
+    for index, name in enumerate(header):
+        target = column_mapping.get(name, name.lower())
+        if target in target_columns:
+            selected.append((index, target))
+    if not selected:
+        raise ValueError(f"Ни одна колонка файла не соответствует колонкам таблицы {table}")
+
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(sql.Identifier(target) for _, target in selected)
+    ).as_string(connection)
+
+    batch = []
+    line = first_line
+    batch_start = line
+
+    def flush():
+        report.batches += 1
+        try:
+            _copy_batch(connection, copy_query, batch)
+            connection.commit()
+            report.rows_loaded += len(batch)
+        except Exception as e:
+            connection.rollback()
+            report.add_error(report.batches, batch_start, line - 1, str(e))
+            if stop_on_error:
+                raise
+        if progress:
+            progress(f"{table}: загружено строк {report.rows_loaded}")
+
+    try:
+        for row in rows:
+            batch.append([row[index] if index < len(row) else None for index, _ in selected])
+            line += 1
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+                batch_start = line
+        if batch:
+            flush()
+    finally:
+        # Пакеты до ошибки уже зафиксированы, поэтому последовательности сдвигаются и при stop_on_error
+        if report.rows_loaded:
+            _sync_sequences(connection, table, [target for _, target in selected])
+    return report
+
+
+def import_csv(connection, table, path, column_mapping=None, batch_size=BATCH_SIZE,
+               delimiter=',', stop_on_error=False, progress=None):
+    # Файл читается построчно, в памяти держится не больше одного пакета
+    previous_autocommit = connection.autocommit
+    connection.autocommit = False
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            header = next(reader, None)
+            if header is None:
+                return ImportReport(table.lower())
+            return _import_rows(connection, table, header, reader, column_mapping, batch_size,
+                                stop_on_error, progress)
+    finally:
+        connection.rollback()
+        connection.autocommit = previous_autocommit
+
+
+def import_parquet(connection, table, path, column_mapping=None, batch_size=BATCH_SIZE,
+                   stop_on_error=False, progress=None):
+    _require_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    header = parquet_file.schema_arrow.names
+
+    def rows():
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            columns = [column.to_pylist() for column in record_batch.columns]
+            yield from zip(*columns)
+
+    previous_autocommit = connection.autocommit
+    connection.autocommit = False
+    try:
+        return _import_rows(connection, table, header, rows(), column_mapping, batch_size,
+                            stop_on_error, progress, first_line=1)
+    finally:
+        connection.rollback()
+        connection.autocommit = previous_autocommit
+
+
+def export_csv(connection, table, path, columns=None, delimiter=','):
+    # COPY TO STDOUT пишет данные в файл по мере получения, без промежуточного списка строк
+    query = sql.SQL("COPY (SELECT {} FROM {}) TO STDOUT WITH (FORMAT csv, HEADER, DELIMITER {})").format(
+        sql.SQL(', ').join(sql.Identifier(c.lower()) for c in columns) if columns else sql.SQL('*'),
+        sql.Identifier(table.lower()),
+        sql.Literal(delimiter)
+    )
+    with open(path, 'w', newline='', encoding='utf-8') as f, connection.cursor() as cursor:
+        cursor.copy_expert(query.as_string(connection), f)
+        return cursor.rowcount
+
+
+def export_parquet(connection, table, path, batch_size=BATCH_SIZE):
+    # CSV из COPY читается потоково через pyarrow и записывается в Parquet блоками
+    _require_pyarrow()
+    with tempfile.TemporaryFile('w+b') as spool:
+        export_query = sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(table.lower()))
+        with connection.cursor() as cursor:
+            cursor.copy_expert(export_query.as_string(connection), spool)
+        spool.seek(0)
+
+        reader = pyarrow.csv.open_csv(
+            spool,
+            read_options=pyarrow.csv.ReadOptions(block_size=1 << 22),
+            convert_options=pyarrow.csv.ConvertOptions(strings_can_be_null=True)
+        )
+        rows = 0
+        with pyarrow.parquet.ParquetWriter(path, reader.schema) as writer:
+            for record_batch in reader:
+                writer.write_batch(record_batch)
+                rows += record_batch.num_rows
+        return rows
+
+
+def import_directory(connection, directory, batch_size=BATCH_SIZE, stop_on_error=False, progress=None):
+    # Загружает файлы <таблица>.csv / <таблица>.parquet в порядке внешних ключей
+    files = {}
+    for name in os.listdir(directory):
+        base, ext = os.path.splitext(name)
+        if ext.lower() in ('.csv', '.parquet'):
+            files[base.lower()] = os.path.join(directory, name)
+
+    reports = []
+    for table in table_load_order(files):
+        path = files[table]
+        if progress:
+            progress(f"Импорт {os.path.basename(path)} в {table}...")
+        if path.lower().endswith('.parquet'):
+            reports.append(import_parquet(connection, table, path, batch_size=batch_size,
+                                          stop_on_error=stop_on_error, progress=progress))
+        else:
+            reports.append(import_csv(connection, table, path, batch_size=batch_size,
+                                      stop_on_error=stop_on_error, progress=progress))
+    return reports
+
+
+def export_directory(connection, directory, file_format='csv', progress=None):
+    os.makedirs(directory, exist_ok=True)
+    exported = {}
+    for table in table_load_order():
+        path = os.path.join(directory, f"{table}.{file_format}")
+        if progress:
+            progress(f"Экспорт {table}...")
+        if file_format == 'parquet':
+            exported[table] = export_parquet(connection, table, path)
+        else:
+            exported[table] = export_csv(connection, table, path)
+    return exported
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Для работы с Parquet установите пакет pyarrow")
+
+
+def _parse_mapping(items):
+    mapping = {}
+    for item in items or []:
+        source, _, target = item.partition('=')
+        if not target:
+            raise argparse.ArgumentTypeError(f"Неверное сопоставление колонок: {item} (ожидается файл=таблица)")
+        mapping[source] = target
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Массовый импорт и экспорт таблиц базы {DB_NAME} через COPY")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Загрузить CSV или Parquet в таблицу")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--table', required=True)
+    import_parser.add_argument('--map', action='append', metavar='FILE_COLUMN=TABLE_COLUMN')
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    import_parser.add_argument('--delimiter', default=',')
+    import_parser.add_argument('--stop-on-error', action='store_true')
+
+    export_parser = subparsers.add_parser('export', help="Выгрузить таблицу в CSV или Parquet")
+    export_parser.add_argument('table')
+    export_parser.add_argument('--output', required=True)
+    export_parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+
+    import_dir_parser = subparsers.add_parser('import-dir', help="Загрузить все <таблица>.csv из каталога")
+    import_dir_parser.add_argument('directory')
+    import_dir_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    import_dir_parser.add_argument('--stop-on-error', action='store_true')
+
+    export_dir_parser = subparsers.add_parser('export-dir', help="Выгрузить все таблицы в каталог")
+    export_dir_parser.add_argument('directory')
+    export_dir_parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+
+    args = parser.parse_args(argv)
+    try:
+        with connection_manager.connection() as connection:
+            if args.command == 'import':
+                mapping = _parse_mapping(args.map)
+                if args.path.lower().endswith('.parquet'):
+                    report = import_parquet(connection, args.table, args.path, mapping, args.batch_size,
+                                            args.stop_on_error, print)
+                else:
+                    report = import_csv(connection, args.table, args.path, mapping, args.batch_size,
+                                        args.delimiter, args.stop_on_error, print)
+                print(report.summary())
+            elif args.command == 'export':
+                if args.format == 'parquet':
+                    rows = export_parquet(connection, args.table, args.output)
+                else:
+                    rows = export_csv(connection, args.table, args.output)
+                print(f"Выгружено строк: {rows}")
+            elif args.command == 'import-dir':
+                for report in import_directory(connection, args.directory, args.batch_size,
+                                               args.stop_on_error, print):
+                    print(report.summary())
+            elif args.command == 'export-dir':
+                for table, rows in export_directory(connection, args.directory, args.format, print).items():
+                    print(f"{table}: выгружено строк {rows}")
+    except Exception as e:
+        print('Ошибка при массовой загрузке/выгрузке:', e)
+        return 1
+    finally:
+        connection_manager.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
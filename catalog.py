@@ -0,0 +1,157 @@
+import itertools
+import threading
+
+from db_pool import DB_NAME, connection_manager
+
+# Канал, в который событийный триггер из миграции 0007 сообщает об изменении схемы
+CATALOG_CHANNEL = 'schema_changed'
+
+# Все таблицы, представления, колонки, типы, первичные и внешние ключи схемы public одним запросом.
+# Для колонок первичного ключа - их номер в ключе (ключ бывает составным, например (id, дата))
+CATALOG_QUERY = """
+    SELECT c.relname,
+           c.relkind,
+           a.attname,
+           format_type(a.atttypid, NULL),
+           a.attnotnull,
+           a.atthasdef OR a.attidentity <> '',
+           a.attgenerated <> '',
+           array_position(pk.conkey, a.attnum),
+           fk.ref_table,
+           fk.ref_column
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_constraint pk ON pk.conrelid = c.oid AND pk.contype = 'p'
+    LEFT JOIN LATERAL (
+        SELECT rc.relname AS ref_table, ra.attname AS ref_column
+        FROM pg_constraint f
+        JOIN pg_class rc ON rc.oid = f.confrelid
+        JOIN pg_attribute ra ON ra.attrelid = f.confrelid AND ra.attnum = f.confkey[1]
+        WHERE f.conrelid = c.oid AND f.contype = 'f'
+          AND array_length(f.conkey, 1) = 1 AND f.conkey[1] = a.attnum
+        LIMIT 1
+    ) fk ON TRUE
+    WHERE n.nspname = 'public'
+      AND c.relkind IN ('r', 'p', 'v', 'm')
+      AND NOT c.relispartition
+    ORDER BY c.relname, a.attnum
+"""
+
+# Версии каталогов (SchemaCatalog.version)
+_versions = itertools.count(1)
+
+
+class Column:
+    def __init__(self, name, data_type, not_null, has_default, primary_key_position, references, is_generated=False):
+        self.name = name
+        self.data_type = data_type
+        self.not_null = not_null
+        self.has_default = has_default
+        # Вычисляемая колонка (GENERATED ALWAYS AS ... STORED): значение не вставляется
+        self.is_generated = is_generated
+        # Номер колонки в первичном ключе (с 1) или None
+        self.primary_key_position = primary_key_position
+        # (таблица, колонка), на которую ссылается внешний ключ, или None
+        self.references = references
+
+
+class SchemaCatalog:
+    """Кэш метаданных схемы в памяти процесса.
+
+    Загружается одним запросом при первом обращении (или явно через load) и
+    сбрасывается через invalidate, например по уведомлению CATALOG_CHANNEL.
+    """
+
+    def __init__(self, dbname=DB_NAME):
+        self.dbname = dbname
+        # Меняется при каждом сбросе: по ней statements.py узнает, что подготовленные запросы устарели.
+        # Номера общие для всех каталогов, поэтому новый каталог той же базы (service.py) тоже отличается
+        self.version = next(_versions)
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def load(self, connection=None):
+        if connection is None:
+            with connection_manager.connection(self.dbname) as connection:
+                return self.load(connection)
+
+        with connection.cursor() as cursor:
+            cursor.execute(CATALOG_QUERY)
+            rows = cursor.fetchall()
+        return self.load_rows(rows)
+
+    def load_rows(self, rows):
+        # Разбирает результат CATALOG_QUERY, выполненного любым драйвером (например, в service.py)
+        tables = {}
+        for table, kind, name, data_type, not_null, has_default, is_generated, pk_position, ref_table, ref_column in rows:
+            columns = tables.setdefault(table, {'kind': kind, 'columns': []})['columns']
+            references = (ref_table, ref_column) if ref_table else None
+            columns.append(Column(name, data_type, not_null, has_default, pk_position, references, is_generated))
+
+        with self._lock:
+            self._tables = tables
+        return self
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._tables = None
+            self.version = next(_versions)
+
+    def _get_tables(self):
+        with self._lock:
+            tables = self._tables
+        if tables is None:
+            self.load()
+            with self._lock:
+                tables = self._tables
+        return tables
+
+    def _table(self, table):
+        return self._get_tables().get(table.lower())
+
+    def has_table(self, table):
+        return self._table(table) is not None
+
+    def tables(self, include_views=True):
+        # Материализованные представления (отчеты) в список таблиц не входят
+        return sorted(name for name, info in self._get_tables().items()
+                      if info['kind'] != 'm' and (include_views or info['kind'] != 'v'))
+
+    def materialized_views(self):
+        return sorted(name for name, info in self._get_tables().items() if info['kind'] == 'm')
+
+    def columns(self, table):
+        info = self._table(table)
+        return list(info['columns']) if info else []
+
+    def column_names(self, table):
+        return [column.name for column in self.columns(table)]
+
+    def column_types(self, table):
+        return {column.name: column.data_type for column in self.columns(table)}
+
+    def insertable_columns(self, table):
+        # Как get_columns в procedures.sql: без колонок с меткой времени и вычисляемых колонок
+        return [column.name for column in self.columns(table)
+                if not column.data_type.startswith('timestamp') and not column.is_generated]
+
+    def has_column(self, table, column):
+        return column in self.column_types(table)
+
+    def primary_key(self, table):
+        # Колонки первичного ключа в порядке ключа; пустой кортеж, если ключа нет
+        key = sorted((column.primary_key_position, column.name) for column in self.columns(table)
+                     if column.primary_key_position is not None)
+        return tuple(name for _, name in key)
+
+    def foreign_keys(self, table):
+        return {column.name: column.references for column in self.columns(table) if column.references}
+
+    def dependencies(self):
+        # Таблица -> множество таблиц, на которые она ссылается
+        return {table: {ref_table for ref_table, _ in self.foreign_keys(table).values() if ref_table != table}
+                for table in self.tables(include_views=False)}
+
+
+schema_catalog = SchemaCatalog()
@@ -0,0 +1 @@
+# Корень проекта попадает в sys.path: тесты импортируют модули верхнего уровня (service, gui, ...)
@@ -0,0 +1,260 @@
+import argparse
+import datetime
+import io
+import random
+import time
+
+from psycopg2 import sql
+
+from db_pool import DB_NAME, connection_manager
+
+# Соотношения размеров таблиц относительно числа пользователей
+SESSIONS_PER_USER = 0.5
+MAX_STUDENTS_PER_SESSION = 4
+REVIEW_PROBABILITY = 0.4
+SUBJECT_COUNT = 120
+
+FIRST_NAMES = ['Александр', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга',
+               'Андрей', 'Наталья', 'Алексей', 'Татьяна', 'Максим', 'Екатерина', 'Павел', 'Юлия']
+SURNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+            'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов', 'Егоров']
+SUBJECTS = ['Математика', 'Физика', 'Химия', 'Биология', 'История', 'Литература', 'Русский язык',
+            'Английский язык', 'Информатика', 'География', 'Обществознание', 'Немецкий язык']
+LEVELS = ['beginner', 'intermediate', 'advanced']
+DURATIONS = [45, 60, 90, 120]
+DURATION_WEIGHTS = [20, 50, 25, 5]
+PAYMENT_METHODS = ['credit_card', 'paypal', 'bank_transfer']
+PAYMENT_METHOD_WEIGHTS = [70, 20, 10]
+# Оценки смещены к высоким, как обычно бывает в отзывах
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [5, 7, 15, 33, 40]
+COMMENTS = ['Отличное занятие', 'Все понятно объяснил', 'Хотелось бы больше практики',
+            'Занятие прошло хорошо', 'Слишком быстро', 'Очень полезно', 'Рекомендую', None]
+
+START_DATE = datetime.date(2023, 1, 1)
+DAYS_RANGE = 730
+# Рабочий день репетитора (минуты от полуночи) и перерыв между занятиями: занятия одного
+# репетитора не пересекаются (ограничение sessions_tutor_period_excl из миграции 0008)
+DAY_START = 8 * 60
+DAY_END = 22 * 60
+SESSION_BREAK = 15
+
+
+class CopyStream(io.TextIOBase):
+    """Файлоподобный объект для copy_expert: строки формата COPY text создаются по мере чтения."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                break
+            line = '\t'.join(_copy_value(value) for value in row) + '\n'
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+class SchoolDataGenerator:
+    """Детерминированный генератор данных для схемы online_school.
+
+    Роль пользователя и параметры каждого занятия вычисляются из seed и идентификатора,
+    поэтому связанные таблицы генерируются потоками без хранения ключей в памяти.
+    """
+
+    def __init__(self, users=10000, seed=42):
+        if users < 100:
+            raise ValueError("Нужно не меньше 100 пользователей")
+        self.users = users
+        self.seed = seed
+        # Каждый десятый пользователь - репетитор, каждый десятый со сдвигом 1 - родитель
+        self.tutors = users // 10
+        self.sessions = int(users * SESSIONS_PER_USER)
+        self.subjects = SUBJECT_COUNT
+
+    @staticmethod
+    def role(user_id):
+        remainder = user_id % 10
+        if remainder == 0:
+            return 'tutor'
+        if remainder == 1:
+            return 'parent'
+        return 'student'
+
+    def random_student(self, rng):
+        while True:
+            user_id = rng.randrange(10, self.users + 1)
+            if self.role(user_id) == 'student':
+                return user_id
+
+    def _session_rng(self, session_id):
+        return random.Random(self.seed * 1000003 + session_id)
+
+    def session_info(self, session_id):
+        rng = self._session_rng(session_id)
+        # Популярность репетиторов и предметов распределена неравномерно (закон Парето)
+        tutor_id = int(rng.paretovariate(1.2)) * 7919 % self.tutors + 1
+        subject_id = int(rng.paretovariate(1.5)) * 31 % self.subjects + 1
+        session_date = START_DATE + datetime.timedelta(days=rng.randrange(DAYS_RANGE))
+        duration = rng.choices(DURATIONS, DURATION_WEIGHTS)[0]
+        students = [self.random_student(rng) for _ in range(rng.randint(1, MAX_STUDENTS_PER_SESSION))]
+        return rng, tutor_id, subject_id, session_date, duration, students
+
+    def users_rows(self):
+        rng = random.Random(self.seed)
+        for user_id in range(1, self.users + 1):
+            yield (user_id, rng.choice(FIRST_NAMES), rng.choice(SURNAMES), f"user{user_id}@example.com",
+                   f"hash{rng.getrandbits(64):016x}", self.role(user_id))
+
+    def tutors_rows(self):
+        rng = random.Random(self.seed + 1)
+        for tutor_id in range(1, self.tutors + 1):
+            bio = f"Предмет: {rng.choice(SUBJECTS)}. Стаж преподавания: {rng.randint(1, 30)}"
+            yield (tutor_id, tutor_id * 10, bio)
+
+    def subjects_rows(self):
+        for subject_id in range(1, self.subjects + 1):
+            title = f"{SUBJECTS[(subject_id - 1) % len(SUBJECTS)]} {(subject_id - 1) // len(SUBJECTS) + 1}"
+            yield (subject_id, title, LEVELS[subject_id % len(LEVELS)])
+
+    def sessions_rows(self):
+        # Занятия репетитора за день идут подряд; если день занят, занятие переходит следующему репетитору
+        busy_until = {}
+        for session_id in range(1, self.sessions + 1):
+            _, tutor_id, subject_id, session_date, duration, _ = self.session_info(session_id)
+            while busy_until.get((tutor_id, session_date), DAY_START) + duration > DAY_END:
+                tutor_id = tutor_id % self.tutors + 1
+            start = busy_until.get((tutor_id, session_date), DAY_START)
+            busy_until[(tutor_id, session_date)] = start + duration + SESSION_BREAK
+            yield (session_id, tutor_id, subject_id, session_date, datetime.time(start // 60, start % 60), duration)
+
+    def enrollments_rows(self):
+        enrollment_id = 0
+        for session_id in range(1, self.sessions + 1):
+            _, _, _, session_date, _, students = self.session_info(session_id)
+            for student_id in students:
+                enrollment_id += 1
+                enrolled_at = datetime.datetime.combine(session_date, datetime.time(9)) - datetime.timedelta(days=3)
+                yield (enrollment_id, session_id, student_id, enrolled_at)
+
+    def payments_rows(self):
+        payment_id = 0
+        for session_id in range(1, self.sessions + 1):
+            rng, tutor_id, _, session_date, duration, students = self.session_info(session_id)
+            # Ставка репетитора за час: логнормальное распределение вокруг ~1500
+            hourly_rate = random.Random(self.seed * 7 + tutor_id).lognormvariate(7.3, 0.35)
+            for _ in students:
+                payment_id += 1
+                paid_at = datetime.datetime.combine(session_date, datetime.time(rng.randrange(8, 22)))
+                method = rng.choices(PAYMENT_METHODS, PAYMENT_METHOD_WEIGHTS)[0]
+                yield (payment_id, session_id, round(hourly_rate * duration / 60, 2), paid_at, method)
+
+    def reviews_rows(self):
+        review_id = 0
+        for session_id in range(1, self.sessions + 1):
+            _, _, _, session_date, _, students = self.session_info(session_id)
+            review_rng = random.Random(self.seed * 13 + session_id)
+            for student_id in students:
+                if review_rng.random() >= REVIEW_PROBABILITY:
+                    continue
+                review_id += 1
+                reviewed_at = datetime.datetime.combine(session_date, datetime.time(20)) + \
+                    datetime.timedelta(days=review_rng.randrange(7))
+                yield (review_id, session_id, student_id, review_rng.choices(RATINGS, RATING_WEIGHTS)[0],
+                       review_rng.choice(COMMENTS), reviewed_at)
+
+    def tables(self):
+        # Порядок загрузки соответствует внешним ключам
+        return [
+            ('users', ['user_id', 'name', 'surname', 'email', 'password', 'role'], self.users_rows),
+            ('tutors', ['tutor_id', 'user_id', 'bio'], self.tutors_rows),
+            ('subjects', ['subject_id', 'title', 'level'], self.subjects_rows),
+            ('sessions', ['session_id', 'tutor_id', 'subject_id', 'session_date', 'start_time', 'duration'],
+             self.sessions_rows),
+            ('enrollments', ['enrollment_id', 'session_id', 'student_id', 'enrollment_date'],
+             self.enrollments_rows),
+            ('payments', ['payment_id', 'session_id', 'amount', 'payment_date', 'payment_method'],
+             self.payments_rows),
+            ('reviews', ['review_id', 'session_id', 'student_id', 'rating', 'comment', 'review_date'],
+             self.reviews_rows),
+        ]
+
+
+def load(connection, generator, truncate=True, progress=print):
+    # Загружает сгенерированные данные через COPY; возвращает {таблица: число строк}
+    tables = generator.tables()
+    counts = {}
+    with connection.cursor() as cursor:
+        if truncate:
+            cursor.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+                sql.SQL(', ').join(sql.Identifier(table) for table, _, _ in tables)))
+
+        # Секции за весь период данных создаются заранее, иначе строки попадут в секции по умолчанию
+        cursor.execute("CALL create_partitions(%s, %s)", (START_DATE - datetime.timedelta(days=7),
+                                                         START_DATE + datetime.timedelta(days=DAYS_RANGE + 7)))
+
+        for table, columns, rows in tables:
+            started = time.perf_counter()
+            stream = CopyStream(rows())
+            copy_query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+                sql.Identifier(table), sql.SQL(', ').join(sql.Identifier(c) for c in columns))
+            cursor.copy_expert(copy_query.as_string(connection), stream)
+            counts[table] = stream.count
+            if progress:
+                progress(f"{table}: {stream.count} строк за {time.perf_counter() - started:.1f} с")
+
+        # Идентификаторы заданы явно, поэтому сдвигаем последовательности SERIAL
+        for table, columns, _ in tables:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, columns[0]))
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(sql.SQL("SELECT setval(%s, GREATEST((SELECT max({}) FROM {}), 1))").format(
+                    sql.Identifier(columns[0]), sql.Identifier(table)), (sequence,))
+        cursor.execute("ANALYZE")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Генерация тестовых данных для базы {DB_NAME}")
+    parser.add_argument('--users', type=int, default=10000,
+                        help="Число пользователей; остальные таблицы масштабируются от него")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-truncate', action='store_true', help="Не очищать таблицы перед загрузкой")
+    args = parser.parse_args(argv)
+
+    try:
+        with connection_manager.connection() as connection:
+            counts = load(connection, SchoolDataGenerator(args.users, args.seed), not args.no_truncate)
+        print(f"Всего загружено строк: {sum(counts.values())}")
+    except Exception as e:
+        print('Ошибка при генерации данных:', e)
+        return 1
+    finally:
+        connection_manager.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
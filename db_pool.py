@@ -0,0 +1,150 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from instrumentation import InstrumentedCursor, query_log
+
+# Параметры подключения к базе данных
+DB_NAME = "online_school"
+SERVER_DB_NAME = "postgres"
+DB_USER = "user_name"  # Замените на вашего пользователя
+DB_PASSWORD = "password"  # Замените на ваш пароль
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+# Ограничения размера пула для каждой базы данных
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 8
+# Сколько ждать свободное соединение, прежде чем сообщить об ошибке (секунды)
+POOL_TIMEOUT = 30
+# Соединение, которое простаивало дольше этого времени, проверяется запросом SELECT 1
+HEALTH_CHECK_INTERVAL = 30
+
+
+class ConnectionManager:
+    """Пулы соединений (по одному на базу данных), общие для всех окон и main.App.
+
+    Соединения выдаются через getconn/putconn или контекстный менеджер connection().
+    При выдаче соединение проверяется: закрытые и "зависшие" соединения заменяются новыми.
+    """
+
+    def __init__(self, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE, timeout=POOL_TIMEOUT, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+        self._pools = {}
+        self._slots = {}
+        self._owners = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self, dbname):
+        with self._lock:
+            if dbname not in self._pools:
+                self._pools[dbname] = pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, dbname=dbname, **self.connect_kwargs
+                )
+                # Семафор ограничивает число выданных соединений и позволяет подождать свободное
+                self._slots[dbname] = threading.BoundedSemaphore(self.maxconn)
+            return self._pools[dbname], self._slots[dbname]
+
+    def getconn(self, dbname=DB_NAME, autocommit=True, readonly=False):
+        connection_pool, slots = self._get_pool(dbname)
+        if not slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(f"Нет свободных соединений с базой данных {dbname}")
+
+        try:
+            connection = self._checkout_healthy(connection_pool)
+            connection.autocommit = autocommit
+            if bool(connection.readonly) != readonly:
+                connection.readonly = readonly
+        except Exception:
+            slots.release()
+            raise
+
+        with self._lock:
+            self._owners[id(connection)] = dbname
+        return connection
+
+    def _checkout_healthy(self, connection_pool):
+        # Одна попытка заменить сломанное соединение новым
+        for _ in range(2):
+            connection = connection_pool.getconn()
+            if self._is_healthy(connection):
+                return connection
+            connection_pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError("Не удалось получить рабочее соединение из пула")
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        last_used = self._last_used.get(id(connection))
+        if last_used is not None and time.monotonic() - last_used < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def putconn(self, connection):
+        with self._lock:
+            dbname = self._owners.pop(id(connection), None)
+            connection_pool = self._pools.get(dbname)
+            slots = self._slots.get(dbname)
+        if connection_pool is None:
+            # Пул уже закрыт (например, база данных была удалена)
+            if not connection.closed:
+                connection.close()
+            return
+
+        try:
+            if not connection.closed and not connection.autocommit:
+                try:
+                    connection.rollback()
+                except Exception:
+                    connection.close()
+            if connection.closed:
+                self._last_used.pop(id(connection), None)
+            else:
+                self._last_used[id(connection)] = time.monotonic()
+            connection_pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            slots.release()
+
+    @contextmanager
+    def connection(self, dbname=DB_NAME, autocommit=True, readonly=False):
+        connection = self.getconn(dbname, autocommit=autocommit, readonly=readonly)
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def close_database(self, dbname):
+        # Закрывает все соединения с базой, например перед DROP DATABASE
+        with self._lock:
+            connection_pool = self._pools.pop(dbname, None)
+            self._slots.pop(dbname, None)
+        if connection_pool is not None:
+            connection_pool.closeall()
+
+    def closeall(self):
+        with self._lock:
+            dbnames = list(self._pools)
+        for dbname in dbnames:
+            self.close_database(dbname)
+
+
+# Все курсоры соединений пула записывают выполненные запросы в instrumentation.query_log
+connection_manager = ConnectionManager(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                                       cursor_factory=InstrumentedCursor)
+# Планы медленных запросов снимаются на отдельном соединении из того же пула
+query_log.connection_factory = connection_manager.connection
@@ -1,12 +1,27 @@
-import psycopg2
 from PyQt5 import QtWidgets, QtCore
+from psycopg2 import sql
+import datetime
 import sys
 
-DB_NAME = "online_school"
-DB_USER = "user_name"
-DB_PASSWORD = "password"
-DB_HOST = "localhost"
-DB_PORT = "5432"
+import bulk_io
+import reports
+import schema_migrations
+import search
+from catalog import CATALOG_CHANNEL, schema_catalog
+from db_pool import DB_NAME, connection_manager
+from instrumentation import query_log
+from notifications import TABLE_CHANGES_CHANNEL, NotificationListener
+from service import BULK_DELETE_BATCH_SIZE, BULK_DELETE_PAUSE, close_runner
+from table_api import FIRST, NEXT, PREVIOUS, TableBrowser
+from result_cache import load_result, result_cache
+from table_model import ColumnarProxyModel, ColumnarTableModel, RowTableModel
+from workers import DbTask, call_service, service_task, start_background_task, start_task
+
+
+def browse_task(browser, direction, page=None):
+    # Страница через DatabaseService; TableBrowser окна хранит только сортировку и фильтры
+    return service_task('browse', browser.table, direction, page, order_by=browser.order_by,
+                        descending=browser.descending, filters=browser.filters, key=browser.key)
 
 class DatabaseApp(QtWidgets.QMainWindow):
     def __init__(self):
@@ -24,13 +39,13 @@ class DatabaseApp(QtWidgets.QMainWindow):
         self.layout = QtWidgets.QVBoxLayout(self.central_widget)
         self.layout.setAlignment(QtCore.Qt.AlignCenter)
 
-        self.create_db_button = QtWidgets.QPushButton("Создать базу данных")
+        self.create_db_button = QtWidgets.QPushButton("Создать или обновить базу данных")
         self.delete_db_button = QtWidgets.QPushButton("Удалить базу данных")
         self.connect_db_button = QtWidgets.QPushButton("Подключиться к базе данных")
 
-        self.create_db_button.setFixedWidth(200)
-        self.delete_db_button.setFixedWidth(200)
-        self.connect_db_button.setFixedWidth(200)
+        self.create_db_button.setFixedWidth(260)
+        self.delete_db_button.setFixedWidth(260)
+        self.connect_db_button.setFixedWidth(260)
 
         self.layout.addWidget(self.create_db_button)
         self.layout.addWidget(self.delete_db_button)
@@ -40,103 +55,72 @@ class DatabaseApp(QtWidgets.QMainWindow):
         self.delete_db_button.clicked.connect(self.delete_database)
         self.connect_db_button.clicked.connect(self.go_to_database)
 
-    def connect_to_server(self):
-        try:
-            if self.connection:
-                self.connection.close()
-            self.connection = psycopg2.connect(
-                dbname="postgres",
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST
-            )
-            self.connection.autocommit = True
-            self.cursor = self.connection.cursor()
-        except Exception as e:
-            self.show_error(f"Ошибка при подключении к серверу: {e}")
+    def use_connection(self, dbname):
+        # Берем соединение из общего пула вместо нового подключения на каждое нажатие
+        self.release_connection()
+        self.connection = connection_manager.getconn(dbname)
+        self.cursor = self.connection.cursor()
 
-    def load_procedures(self):
-        try:
-            self.cursor.execute("SELECT current_database();")
-            current_db = self.cursor.fetchone()[0]
-            print(f"Процедуры загружаются в базу данных: {current_db}")
-
-            with open('procedures.sql', 'r', encoding='utf-8') as file:
-                sql = file.read()
-                self.cursor.execute(sql)
-                print("Процедуры успешно загружены!")
-        except Exception as e:
-            self.show_error(f"Ошибка при загрузке хранимых процедур: {e}")
+    def release_connection(self):
+        if self.connection:
+            connection_manager.putconn(self.connection)
+        self.connection = None
+        self.cursor = None
 
     def create_database(self):
-        self.connect_to_server()
-        if not self.cursor:
-            return
-        try:
-            # Создание базы данных выполняется напрямую в Python, а не через хранимую процедуру
-            self.cursor.execute(f"DROP DATABASE IF EXISTS {DB_NAME};")
-            self.cursor.execute(f"CREATE DATABASE {DB_NAME};")
-            self.connect_to_database()
-            self.create_tables()
-            self.load_procedures()
-            self.show_message("Успех", f"База данных {DB_NAME} успешно создана.")
-        except Exception as e:
-            self.show_error(f"Ошибка при создании базы данных: {e}")
-
-    def create_tables(self):
+        self.release_connection()
+        task = DbTask(self._create_database_task)
+        start_task(self, task, f"Создание базы данных {DB_NAME}...", self._on_database_created,
+                   lambda message: self.show_error(f"Ошибка при создании базы данных: {message}"))
+
+    def _create_database_task(self, task):
+        # Существующая база не пересоздается: применяются только недостающие миграции, данные сохраняются
+        call_service(task, 'create_database', DB_NAME, progress=task.report)
+        task.check_cancelled()
+        applied = call_service(task, 'migrate', DB_NAME, progress=task.report)
+        return connection_manager.getconn(DB_NAME), applied
+
+    def _on_database_created(self, result):
+        connection, applied = result
+        self.release_connection()
+        self.connection = connection
+        self.cursor = connection.cursor()
+        schema_catalog.invalidate()
+        if applied:
+            self.show_message("Успех", f"База данных {DB_NAME} готова. Применены миграции:\n" + "\n".join(applied))
+        else:
+            self.show_message("Успех", f"База данных {DB_NAME} уже в актуальном состоянии.")
+
+    def validate_migrations(self):
+        # Файлы миграций проверяются при запуске, до любых действий с базой
         try:
-            with open('setup_db.sql') as f:
-                sql_commands = f.read()
-            self.cursor.execute(sql_commands)
-            print('Таблицы успешно созданы!')
-
-        except Exception as e:
-            print('Возникла ошибка при создании таблиц:', e)
+            schema_migrations.load_migrations()
+        except ValueError as e:
+            self.show_error(str(e))
 
     def delete_database(self):
-        self.connect_to_server()
-        if not self.cursor:
-            return
-        try:
-            # Удаление базы данных выполняется напрямую в Python, а не через хранимую процедуру
-            self.cursor.execute(f"""
-                SELECT pg_terminate_backend(pg_stat_activity.pid)
-                FROM pg_stat_activity
-                WHERE pg_stat_activity.datname = '{DB_NAME}' AND pid <> pg_backend_pid();
-            """)
-            self.cursor.execute(f"DROP DATABASE IF EXISTS {DB_NAME};")
-            self.show_message("Успех", f"База данных {DB_NAME} успешно удалена.")
-        except Exception as e:
-            self.show_error(f"Ошибка при удалении базы данных: {e}")
+        self.release_connection()
+        connection_manager.close_database(DB_NAME)
+        task = service_task('delete_database', DB_NAME)
+        start_task(self, task, f"Удаление базы данных {DB_NAME}...", self._on_database_deleted,
+                   lambda message: self.show_error(f"Ошибка при удалении базы данных: {message}"))
+
+    def _on_database_deleted(self, _):
+        schema_catalog.invalidate()
+        self.show_message("Успех", f"База данных {DB_NAME} успешно удалена.")
 
     def connect_to_database(self):
         try:
-            if self.connection:
-                self.connection.close()
-            self.connection = psycopg2.connect(
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST
-            )
-            self.connection.autocommit = True
-            self.cursor = self.connection.cursor()
+            self.use_connection(DB_NAME)
             # Не загружаем процедуры и таблицы, если они уже есть
         except Exception as e:
             self.show_error(f"Ошибка при подключении к базе данных: {e}")
 
     def go_to_database(self):
         try:
-            if self.connection:
-                self.connection.close()
-            self.connection = psycopg2.connect(
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST
-            )
-            self.connection.autocommit = True
-            self.cursor = self.connection.cursor()
+            self.use_connection(DB_NAME)
+            # Метаданные всех таблиц загружаются один раз при подключении
+            schema_catalog.load(self.connection)
             self.show_tables_window()
         except Exception as e:
             self.show_error(f"Ошибка при подключении к базе данных: {e}")
@@ -180,28 +164,98 @@ class TablesWindow(QtWidgets.QMainWindow):
         self.view_table_button = QtWidgets.QPushButton("Просмотреть содержимое")
         self.clear_table_button = QtWidgets.QPushButton("Очистить таблицу")
         self.clear_all_tables_button = QtWidgets.QPushButton("Очистить все таблицы")
+        self.import_table_button = QtWidgets.QPushButton("Импорт из файла")
+        self.export_table_button = QtWidgets.QPushButton("Экспорт в файл")
+        self.import_directory_button = QtWidgets.QPushButton("Импорт всех таблиц из папки")
+        self.save_snapshot_button = QtWidgets.QPushButton("Сохранить снимок базы")
+        self.restore_snapshot_button = QtWidgets.QPushButton("Восстановить из снимка")
+        self.reports_button = QtWidgets.QPushButton("Отчеты")
+        self.diagnostics_button = QtWidgets.QPushButton("Диагностика запросов")
+        self.availability_button = QtWidgets.QPushButton("Свободные репетиторы")
 
         self.layout.addWidget(self.view_table_button)
         self.layout.addWidget(self.clear_table_button)
         self.layout.addWidget(self.clear_all_tables_button)
+        self.layout.addWidget(self.import_table_button)
+        self.layout.addWidget(self.export_table_button)
+        self.layout.addWidget(self.import_directory_button)
+        self.layout.addWidget(self.save_snapshot_button)
+        self.layout.addWidget(self.restore_snapshot_button)
+        self.layout.addWidget(self.reports_button)
+        self.layout.addWidget(self.diagnostics_button)
+        self.layout.addWidget(self.availability_button)
 
         self.view_table_button.clicked.connect(self.view_table_content)
         self.clear_table_button.clicked.connect(self.clear_table)
         self.clear_all_tables_button.clicked.connect(self.clear_all_tables)
+        self.import_table_button.clicked.connect(self.import_table)
+        self.export_table_button.clicked.connect(self.export_table)
+        self.import_directory_button.clicked.connect(self.import_directory)
+        self.save_snapshot_button.clicked.connect(self.save_snapshot)
+        self.restore_snapshot_button.clicked.connect(self.restore_snapshot)
+        self.reports_button.clicked.connect(self.open_reports_window)
+        self.diagnostics_button.clicked.connect(self.open_diagnostics_window)
+        self.availability_button.clicked.connect(self.open_availability_dialog)
+
+        self.subscribe()
+        self.load_tables()
+
+    def subscribe(self):
+        # Отчеты обновляются в фоне, пока открыто окно работы с базой
+        self.report_scheduler = ReportRefreshScheduler(self)
+
+        # Событийный триггер сообщает об изменении схемы, после чего кэш каталога сбрасывается;
+        # изменения строк сбрасывают результаты таблиц в кэше анализа в памяти (result_cache)
+        try:
+            self.catalog_listener = NotificationListener([CATALOG_CHANNEL, TABLE_CHANGES_CHANNEL], self)
+            self.catalog_listener.notification.connect(self.on_notification)
+        except Exception as e:
+            self.catalog_listener = None
+            print('Не удалось подписаться на изменения схемы:', e)
+
+    def release_database(self):
+        # Перед копированием или заменой базы закрываем все свои соединения с ней
+        self.report_scheduler.close()
+        self.report_scheduler.deleteLater()
+        if self.catalog_listener is not None:
+            self.catalog_listener.close()
+            self.catalog_listener = None
+        self.connection = None
+        self.cursor = None
+        connection_manager.close_database(DB_NAME)
 
+    def reconnect(self):
+        schema_catalog.invalidate()
+        try:
+            self.connection = connection_manager.getconn(DB_NAME)
+            self.cursor = self.connection.cursor()
+            self.subscribe()
+        except Exception as e:
+            self.show_error(f"Ошибка при подключении к базе данных: {e}")
+            return
         self.load_tables()
 
     def load_tables(self):
         try:
             self.tables_list.clear()
-            self.cursor.execute("SELECT * FROM load_tables_proc();")
-            tables = self.cursor.fetchall()
-
-            for table in tables:
-                self.tables_list.addItem(table[0])
+            for table in schema_catalog.tables():
+                self.tables_list.addItem(table)
         except Exception as e:
             self.show_error(f"Ошибка при загрузке таблиц: {e}")
 
+    def on_notification(self, channel, payload):
+        if channel == TABLE_CHANGES_CHANNEL:
+            if isinstance(payload, dict) and payload.get('table'):
+                result_cache.invalidate(payload['table'])
+            return
+        self.on_schema_changed(channel, payload)
+
+    def on_schema_changed(self, channel, payload):
+        schema_catalog.invalidate()
+        result_cache.clear()
+        if self.isVisible():
+            self.load_tables()
+
     def view_table_content(self):
         selected_table = self.tables_list.currentItem()
         if not selected_table:
@@ -218,23 +272,634 @@ class TablesWindow(QtWidgets.QMainWindow):
         self.table_content_window.show()
         self.close()  # Закрываем текущий виджет при открытии нового
 
+    def open_reports_window(self):
+        try:
+            self.reports_window = ReportsWindow(self, self.report_scheduler)
+            self.reports_window.show()
+            self.close()
+        except Exception as e:
+            self.show_error(f"Ошибка при открытии отчетов: {e}")
+
+    def open_diagnostics_window(self):
+        # Окно диагностики открывается рядом, не закрывая список таблиц
+        if getattr(self, 'diagnostics_window', None) is None:
+            self.diagnostics_window = DiagnosticsWindow()
+        self.diagnostics_window.show()
+        self.diagnostics_window.raise_()
+
+    def open_availability_dialog(self):
+        AvailabilityDialog(self).exec_()
+
     def clear_table(self):
         selected_table = self.tables_list.currentItem()
         if not selected_table:
             self.show_error("Выберите таблицу для очистки.")
             return
-        try:
-            table_name = selected_table.text()
-            self.cursor.execute(f"CALL clear_table_proc('{table_name}');")
-            self.show_message("Успех", f"Таблица {table_name} успешно очищена.")
-        except Exception as e:
-            self.show_error(f"Ошибка при очистке таблицы: {e}")
+        table_name = selected_table.text()
+        task = service_task('clear_table', table_name)
+        start_task(self, task, f"Очистка таблицы {table_name}...",
+                   lambda _: self.show_message("Успех", f"Таблица {table_name} успешно очищена."),
+                   lambda message: self.show_error(f"Ошибка при очистке таблицы: {message}"))
 
     def clear_all_tables(self):
+        task = service_task('clear_all_tables')
+        start_task(self, task, "Очистка всех таблиц...", None,
+                   lambda message: self.show_error(f"Ошибка при очистке всех таблиц: {message}"))
+
+    def save_snapshot(self):
+        name, ok = QtWidgets.QInputDialog.getText(self, "Снимок базы", "Имя снимка (латиница, цифры, _):")
+        if not ok or not name.strip():
+            return
+        self.release_database()
+        task = service_task('create_snapshot', name, DB_NAME)
+        task.signals.finished.connect(self.reconnect)
+        start_task(self, task, f"Сохранение снимка {name}...",
+                   lambda _: self.show_message("Успех", f"Снимок {name} сохранен."),
+                   lambda message: self.show_error(f"Ошибка при сохранении снимка: {message}"))
+
+    def restore_snapshot(self):
+        task = service_task('list_snapshots', DB_NAME)
+        start_task(self, task, "Загрузка списка снимков...", self._choose_snapshot,
+                   lambda message: self.show_error(f"Ошибка при загрузке списка снимков: {message}"))
+
+    def _choose_snapshot(self, snapshots):
+        if not snapshots:
+            self.show_message("Снимки", "Сохраненных снимков нет.")
+            return
+        items = [f"{name} ({created_at or 'время неизвестно'}, {size / 1024 / 1024:.1f} МБ)"
+                 for name, size, created_at in snapshots]
+        item, ok = QtWidgets.QInputDialog.getItem(
+            self, "Восстановление", "Текущие данные будут заменены данными снимка:", items, 0, False)
+        if not ok:
+            return
+        name = snapshots[items.index(item)][0]
+        self.release_database()
+        task = DbTask(self._restore_snapshot_task, name)
+        task.signals.finished.connect(self.reconnect)
+        start_task(self, task, f"Восстановление из снимка {name}...",
+                   lambda _: self.show_message("Успех", f"База данных восстановлена из снимка {name}."),
+                   lambda message: self.show_error(f"Ошибка при восстановлении из снимка: {message}"))
+
+    def _restore_snapshot_task(self, task, name):
+        call_service(task, 'restore_snapshot', name, DB_NAME, progress=task.report)
+        # Снимок мог быть сделан до последних миграций
+        return call_service(task, 'migrate', DB_NAME, progress=task.report)
+
+    def import_table(self):
+        selected_table = self.tables_list.currentItem()
+        if not selected_table:
+            self.show_error("Выберите таблицу для импорта.")
+            return
+        table_name = selected_table.text()
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, f"Импорт в таблицу {table_name}", "", "CSV (*.csv);;Parquet (*.parquet)")
+        if not path:
+            return
+        task = DbTask(self._import_task, [(table_name, path)])
+        start_task(self, task, f"Импорт в таблицу {table_name}...", self._show_import_reports,
+                   lambda message: self.show_error(f"Ошибка при импорте: {message}"))
+
+    def import_directory(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Папка с файлами <таблица>.csv")
+        if not directory:
+            return
+        task = DbTask(self._import_task, None, directory)
+        start_task(self, task, "Импорт таблиц...", self._show_import_reports,
+                   lambda message: self.show_error(f"Ошибка при импорте: {message}"))
+
+    def _import_task(self, task, files, directory=None):
+        def progress(message):
+            task.report(message)
+            task.check_cancelled()
+
+        with connection_manager.connection() as connection:
+            task.use_connection(connection)
+            if directory is not None:
+                return bulk_io.import_directory(connection, directory, progress=progress)
+            reports = []
+            for table_name, path in files:
+                if path.lower().endswith('.parquet'):
+                    reports.append(bulk_io.import_parquet(connection, table_name, path, progress=progress))
+                else:
+                    reports.append(bulk_io.import_csv(connection, table_name, path, progress=progress))
+            return reports
+
+    def _show_import_reports(self, reports):
+        text = "\n".join(report.summary() for report in reports) or "Нет файлов для импорта."
+        if any(report.errors for report in reports):
+            self.show_error(f"Импорт завершен с ошибками:\n{text}")
+        else:
+            self.show_message("Успех", text)
+
+    def export_table(self):
+        selected_table = self.tables_list.currentItem()
+        if not selected_table:
+            self.show_error("Выберите таблицу для экспорта.")
+            return
+        table_name = selected_table.text()
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, f"Экспорт таблицы {table_name}", f"{table_name}.csv", "CSV (*.csv);;Parquet (*.parquet)")
+        if not path:
+            return
+        task = DbTask(self._export_task, table_name, path)
+        start_task(self, task, f"Экспорт таблицы {table_name}...",
+                   lambda rows: self.show_message("Успех", f"Выгружено строк: {rows}"),
+                   lambda message: self.show_error(f"Ошибка при экспорте: {message}"))
+
+    def _export_task(self, task, table_name, path):
+        with connection_manager.connection() as connection:
+            task.use_connection(connection)
+            if path.lower().endswith('.parquet'):
+                return bulk_io.export_parquet(connection, table_name, path)
+            return bulk_io.export_csv(connection, table_name, path)
+
+    def show_message(self, title, message):
+        msg_box = QtWidgets.QMessageBox(self)
+        msg_box.setWindowTitle(title)
+        msg_box.setText(message)
+        msg_box.exec_()
+
+    def show_error(self, message):
+        error_box = QtWidgets.QMessageBox(self)
+        error_box.setIcon(QtWidgets.QMessageBox.Critical)
+        error_box.setWindowTitle("Ошибка")
+        error_box.setText(message)
+        error_box.exec_()
+
+class DiagnosticsWindow(QtWidgets.QMainWindow):
+    """Самые медленные, самые частые и завершившиеся ошибкой запросы из instrumentation.query_log."""
+
+    # Как часто перечитывать журнал, пока окно открыто (мс)
+    REFRESH_INTERVAL = 2000
+
+    def __init__(self):
+        super().__init__()
+        self.items = {}
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Диагностика запросов")
+        self.setGeometry(150, 150, 1000, 700)
+
+        self.central_widget = QtWidgets.QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.layout = QtWidgets.QVBoxLayout(self.central_widget)
+
+        self.settings_layout = QtWidgets.QHBoxLayout()
+        self.threshold_field = QtWidgets.QDoubleSpinBox(self)
+        self.threshold_field.setRange(0, 3600)
+        self.threshold_field.setDecimals(3)
+        self.threshold_field.setSuffix(" с")
+        self.threshold_field.setSpecialValueText("не снимать")
+        self.threshold_field.setValue(query_log.threshold or 0)
+        self.refresh_button = QtWidgets.QPushButton("Обновить", self)
+        self.clear_button = QtWidgets.QPushButton("Очистить", self)
+        self.settings_layout.addWidget(QtWidgets.QLabel("Снимать план для запросов дольше:"))
+        self.settings_layout.addWidget(self.threshold_field)
+        self.settings_layout.addStretch()
+        self.settings_layout.addWidget(self.refresh_button)
+        self.settings_layout.addWidget(self.clear_button)
+        self.layout.addLayout(self.settings_layout)
+
+        self.tabs = QtWidgets.QTabWidget(self)
+        self.slow_table = self._create_table(["Время", "мс", "Строк", "План", "Запрос"])
+        self.frequent_table = self._create_table(["Вызовов", "Всего мс", "Среднее мс", "Макс. мс", "Ошибок", "Запрос"])
+        self.errors_table = self._create_table(["Время", "мс", "Ошибка", "Запрос"])
+        self.tabs.addTab(self.slow_table, "Самые медленные")
+        self.tabs.addTab(self.frequent_table, "Самые частые")
+        self.tabs.addTab(self.errors_table, "Ошибки")
+        self.layout.addWidget(self.tabs, 3)
+
+        self.details = QtWidgets.QPlainTextEdit(self)
+        self.details.setReadOnly(True)
+        self.details.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.layout.addWidget(self.details, 2)
+
+        self.threshold_field.valueChanged.connect(lambda value: query_log.configure(threshold=value))
+        self.refresh_button.clicked.connect(self.refresh)
+        self.clear_button.clicked.connect(self.clear)
+        for table in (self.slow_table, self.frequent_table, self.errors_table):
+            table.itemSelectionChanged.connect(lambda table=table: self.show_details(table))
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def _create_table(self, headers):
+        table = QtWidgets.QTableWidget(0, len(headers), self)
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        table.horizontalHeader().setStretchLastSection(True)
+        return table
+
+    def _fill_table(self, table, rows, items):
+        # Выделение сохраняется по номеру строки, чтобы автообновление не сбрасывало подробности
+        selected = table.currentRow()
+        table.blockSignals(True)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                text = " ".join(str(value).split()) if value is not None else ""
+                table.setItem(row, column, QtWidgets.QTableWidgetItem(text))
+        if 0 <= selected < len(rows):
+            table.selectRow(selected)
+        table.blockSignals(False)
+        self.items[table] = items
+
+    def refresh(self):
+        slowest = query_log.slowest()
+        self._fill_table(self.slow_table, [
+            (f"{record.started_at:%H:%M:%S}", f"{record.duration * 1000:.1f}", record.rows,
+             "да" if record.plan else "", record.statement)
+            for record in slowest
+        ], slowest)
+
+        frequent = query_log.most_frequent()
+        self._fill_table(self.frequent_table, [
+            (stats.calls, f"{stats.total * 1000:.1f}", f"{stats.mean * 1000:.2f}", f"{stats.max * 1000:.1f}",
+             stats.errors, stats.fingerprint)
+            for stats in frequent
+        ], [stats.slowest for stats in frequent])
+
+        errors = query_log.errors()
+        self._fill_table(self.errors_table, [
+            (f"{record.started_at:%H:%M:%S}", f"{record.duration * 1000:.1f}", record.error, record.statement)
+            for record in errors
+        ], errors)
+
+    def show_details(self, table):
+        row = table.currentRow()
+        items = self.items.get(table, [])
+        if not 0 <= row < len(items) or items[row] is None:
+            self.details.clear()
+            return
+        record = items[row]
+        parts = [f"{record.started_at:%Y-%m-%d %H:%M:%S}  {record.dbname}  {record.duration * 1000:.1f} мс",
+                 record.statement]
+        if record.params:
+            parts.append(f"Параметры: {record.params}")
+        if record.error:
+            parts.append(f"Ошибка: {record.error}")
+        parts.append(record.plan or "План не снимался (запрос быстрее порога, не поддерживает EXPLAIN или план еще снимается).")
+        self.details.setPlainText("\n\n".join(parts))
+
+    def clear(self):
+        query_log.clear()
+        self.details.clear()
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(self.REFRESH_INTERVAL)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+class AvailabilityDialog(QtWidgets.QDialog):
+    """Поиск свободных репетиторов предмета на заданное время и запись на занятие."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.initUI()
+        self.load_subjects()
+
+    def initUI(self):
+        self.setWindowTitle("Свободные репетиторы")
+        self.setGeometry(150, 150, 700, 500)
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.form_layout = QtWidgets.QFormLayout()
+        self.subject_selector = QtWidgets.QComboBox(self)
+        self.start_field = QtWidgets.QDateTimeEdit(self)
+        self.start_field.setCalendarPopup(True)
+        self.start_field.setDisplayFormat("yyyy-MM-dd HH:mm")
+        # Ближайший целый час
+        now = QtCore.QDateTime.currentDateTime()
+        self.start_field.setDateTime(now.addSecs(3600 - now.time().minute() * 60 - now.time().second()))
+        self.duration_field = QtWidgets.QSpinBox(self)
+        self.duration_field.setRange(15, 480)
+        self.duration_field.setSingleStep(15)
+        self.duration_field.setValue(60)
+        self.duration_field.setSuffix(" мин")
+        self.form_layout.addRow("Предмет:", self.subject_selector)
+        self.form_layout.addRow("Начало:", self.start_field)
+        self.form_layout.addRow("Длительность:", self.duration_field)
+        self.layout.addLayout(self.form_layout)
+
+        self.search_button = QtWidgets.QPushButton("Найти", self)
+        self.layout.addWidget(self.search_button)
+
+        self.results_table = QtWidgets.QTableWidget(0, 4, self)
+        self.results_table.setHorizontalHeaderLabels(["ID", "Репетитор", "Рейтинг", "Отзывов"])
+        self.results_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.results_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.results_table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.results_table.horizontalHeader().setStretchLastSection(True)
+        self.layout.addWidget(self.results_table)
+
+        self.buttons_layout = QtWidgets.QHBoxLayout()
+        self.book_button = QtWidgets.QPushButton("Записать на занятие", self)
+        self.close_button = QtWidgets.QPushButton("Закрыть", self)
+        self.buttons_layout.addWidget(self.book_button)
+        self.buttons_layout.addWidget(self.close_button)
+        self.layout.addLayout(self.buttons_layout)
+
+        self.search_button.clicked.connect(self.find_tutors)
+        self.book_button.clicked.connect(self.book_session)
+        self.close_button.clicked.connect(self.reject)
+
+    def load_subjects(self):
+        task = service_task('list_subjects')
+        start_background_task(self, task, self._on_subjects_loaded,
+                              lambda message: self.show_error(f"Ошибка при загрузке предметов: {message}"))
+
+    def _on_subjects_loaded(self, subjects):
+        self.subject_selector.clear()
+        for subject_id, title, level in subjects:
+            self.subject_selector.addItem(f"{title} ({level})", subject_id)
+
+    def _request(self):
+        # Параметры поиска: (subject_id, начало, длительность) или None, если предмет не выбран
+        subject_id = self.subject_selector.currentData()
+        if subject_id is None:
+            self.show_error("Выберите предмет.")
+            return None
+        return subject_id, self.start_field.dateTime().toPyDateTime().replace(second=0, microsecond=0), \
+            self.duration_field.value()
+
+    def find_tutors(self):
+        request = self._request()
+        if request is None:
+            return
+        task = service_task('available_tutors', *request)
+        start_task(self, task, "Поиск свободных репетиторов...", self._on_tutors_found,
+                   lambda message: self.show_error(f"Ошибка при поиске репетиторов: {message}"))
+
+    def _on_tutors_found(self, rows):
+        self.results_table.setRowCount(len(rows))
+        for row, (tutor_id, name, rating, review_count) in enumerate(rows):
+            values = [tutor_id, name, f"{rating:.2f}" if rating is not None else "", review_count]
+            for column, value in enumerate(values):
+                self.results_table.setItem(row, column, QtWidgets.QTableWidgetItem(str(value)))
+        if not rows:
+            self.show_message("Поиск", "Свободных репетиторов на это время нет.")
+
+    def book_session(self):
+        row = self.results_table.currentRow()
+        if row < 0:
+            self.show_error("Выберите репетитора.")
+            return
+        request = self._request()
+        if request is None:
+            return
+        tutor_id = int(self.results_table.item(row, 0).text())
+        subject_id, starts_at, duration = request
+        task = service_task('book_session', tutor_id, subject_id, starts_at, duration)
+        start_task(self, task, "Запись на занятие...", self._on_booked,
+                   lambda message: self.show_error(f"Не удалось записать на занятие: {message}"))
+
+    def _on_booked(self, session_id):
+        self.show_message("Успех", f"Занятие {session_id} записано.")
+        # Репетитор больше не свободен в это время
+        self.find_tutors()
+
+    def show_message(self, title, message):
+        msg_box = QtWidgets.QMessageBox(self)
+        msg_box.setWindowTitle(title)
+        msg_box.setText(message)
+        msg_box.exec_()
+
+    def show_error(self, message):
+        error_box = QtWidgets.QMessageBox(self)
+        error_box.setIcon(QtWidgets.QMessageBox.Critical)
+        error_box.setWindowTitle("Ошибка")
+        error_box.setText(message)
+        error_box.exec_()
+
+
+class ReportRefreshScheduler(QtCore.QObject):
+    """Обновляет отчеты (материализованные представления), когда меняются их исходные таблицы.
+
+    Изменения приходят через NOTIFY table_changes. Обновление запускается в фоне через
+    reports.REFRESH_DELAY секунд после первого изменения и затрагивает только устаревшие отчеты.
+    """
+
+    refreshed = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.dirty = set()
+        self.running = False
+        self.last_refresh = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.refresh)
         try:
-            self.cursor.execute('CALL clear_all_tables_proc();')
+            self.listener = NotificationListener([TABLE_CHANGES_CHANNEL], self)
+            self.listener.notification.connect(self.on_table_changed)
         except Exception as e:
-            self.show_error(f"Ошибка при очистке всех таблиц: {e}")
+            self.listener = None
+            print('Не удалось подписаться на изменения таблиц для отчетов:', e)
+
+    def on_table_changed(self, channel, payload):
+        if not isinstance(payload, dict):
+            return
+        views = reports.dependent_reports([payload.get('table') or ''])
+        if views:
+            self.schedule(views)
+
+    def schedule(self, views, delay=reports.REFRESH_DELAY):
+        self.dirty.update(views)
+        # Таймер не перезапускается, иначе при постоянной записи отчеты не обновятся никогда
+        if not self.running and not self.timer.isActive():
+            self.timer.start(int(delay * 1000))
+
+    def refresh(self):
+        if self.running or not self.dirty:
+            return
+        views, self.dirty = self.dirty, set()
+        self.running = True
+        task = DbTask(self.refresh_task, views)
+        start_background_task(self, task, self._on_refreshed,
+                              lambda message: self._on_refresh_failed(message, views))
+        task.signals.finished.connect(self._on_finished)
+
+    def refresh_task(self, task, views):
+        with connection_manager.connection() as connection:
+            task.use_connection(connection)
+            return reports.refresh_reports(connection, views, progress=lambda message: task.report(message))
+
+    def _on_refreshed(self, timings):
+        self.last_refresh = datetime.datetime.now()
+        self.refreshed.emit(list(timings))
+
+    def _on_refresh_failed(self, message, views):
+        print('Ошибка при обновлении отчетов:', message)
+        self.dirty.update(views)
+
+    def _on_finished(self):
+        self.running = False
+        if self.dirty:
+            self.timer.start(reports.REFRESH_DELAY * 1000)
+
+    def close(self):
+        self.timer.stop()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+class ReportsWindow(QtWidgets.QMainWindow):
+    def __init__(self, parent_window, scheduler):
+        super().__init__()
+        self.parent_window = parent_window
+        self.scheduler = scheduler
+        self.report = None
+        self.browser = None
+        self.page = None
+        self.model = RowTableModel(self)
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Отчеты")
+        self.setGeometry(100, 100, 800, 600)
+
+        self.central_widget = QtWidgets.QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.layout = QtWidgets.QVBoxLayout(self.central_widget)
+
+        self.report_layout = QtWidgets.QHBoxLayout()
+        self.report_selector = QtWidgets.QComboBox(self)
+        for report in reports.REPORTS:
+            self.report_selector.addItem(report.title, report.view)
+        self.refresh_button = QtWidgets.QPushButton("Обновить отчет", self)
+        self.refresh_label = QtWidgets.QLabel(self)
+        self.report_layout.addWidget(QtWidgets.QLabel("Отчет:"))
+        self.report_layout.addWidget(self.report_selector)
+        self.report_layout.addWidget(self.refresh_button)
+        self.report_layout.addWidget(self.refresh_label)
+        self.layout.addLayout(self.report_layout)
+
+        self.table_view = QtWidgets.QTableView(self)
+        self.table_view.setModel(self.model)
+        self.table_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.layout.addWidget(self.table_view)
+
+        header = self.table_view.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self.sort_by_column)
+
+        self.page_layout = QtWidgets.QHBoxLayout()
+        self.previous_page_button = QtWidgets.QPushButton("< Предыдущая", self)
+        self.next_page_button = QtWidgets.QPushButton("Следующая >", self)
+        self.page_label = QtWidgets.QLabel(self)
+        self.page_layout.addWidget(self.previous_page_button)
+        self.page_layout.addWidget(self.page_label)
+        self.page_layout.addWidget(self.next_page_button)
+        self.layout.addLayout(self.page_layout)
+
+        self.back_button = QtWidgets.QPushButton("Назад к таблицам")
+        self.layout.addWidget(self.back_button)
+
+        self.report_selector.currentIndexChanged.connect(self.select_report)
+        self.refresh_button.clicked.connect(self.refresh_report)
+        self.previous_page_button.clicked.connect(self.show_previous_page)
+        self.next_page_button.clicked.connect(self.show_next_page)
+        self.back_button.clicked.connect(self.back_to_tables)
+        self.scheduler.refreshed.connect(self.on_reports_refreshed)
+
+        self._update_refresh_label()
+        self.select_report(self.report_selector.currentIndex())
+
+    def select_report(self, index):
+        if index < 0:
+            return
+        self.report = reports.get_report(self.report_selector.itemData(index))
+        self.browser = TableBrowser(self.report.view, key=self.report.key)
+        self.browser.set_order(self.report.order_by, self.report.descending)
+        self.page = None
+        self.model.set_result([], [])
+        self.table_view.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self.show_page(FIRST)
+
+    def show_page(self, direction, page=None):
+        start_task(self, browse_task(self.browser, direction, page), f"Загрузка отчета {self.report.title}...",
+                   self._on_page_loaded, lambda message: self.show_error(f"Ошибка при загрузке отчета: {message}"))
+
+    def _on_page_loaded(self, page):
+        self.page = page
+        self.model.set_result(page.columns, page.rows)
+        self._update_page_controls()
+
+    def _update_page_controls(self):
+        self.previous_page_button.setEnabled(self.page is not None and self.page.has_previous)
+        self.next_page_button.setEnabled(self.page is not None and self.page.has_next)
+        self.page_label.setText(f"Страница {self.page.number}" if self.page is not None else "")
+
+    def _update_refresh_label(self):
+        if self.scheduler.last_refresh is None:
+            self.refresh_label.setText("")
+        else:
+            self.refresh_label.setText(f"Обновлено в {self.scheduler.last_refresh:%H:%M:%S}")
+
+    def show_next_page(self):
+        if self.page is not None and self.page.has_next:
+            self.show_page(NEXT, self.page)
+
+    def show_previous_page(self):
+        if self.page is not None and self.page.has_previous:
+            self.show_page(PREVIOUS, self.page)
+
+    def sort_by_column(self, section):
+        column = self.model.headerData(section, QtCore.Qt.Horizontal)
+        if column is None or self.browser is None:
+            return
+        # Повторный клик по той же колонке меняет направление сортировки
+        current = self.browser.order_by or self.browser.key[0]
+        descending = column == current and not self.browser.descending
+        self.browser.set_order(column, descending)
+        self.table_view.horizontalHeader().setSortIndicator(
+            section, QtCore.Qt.DescendingOrder if descending else QtCore.Qt.AscendingOrder)
+        self.show_page(FIRST)
+
+    def refresh_report(self):
+        if self.report is None:
+            return
+        view = self.report.view
+        self.scheduler.dirty.discard(view)
+        task = DbTask(self.scheduler.refresh_task, [view])
+        start_task(self, task, f"Обновление отчета {self.report.title}...",
+                   self._on_report_refreshed,
+                   lambda message: self.show_error(f"Ошибка при обновлении отчета: {message}"))
+
+    def _on_report_refreshed(self, timings):
+        self.scheduler.last_refresh = datetime.datetime.now()
+        self._update_refresh_label()
+        self.show_page(FIRST)
+
+    def on_reports_refreshed(self, views):
+        self._update_refresh_label()
+        # Первая страница перечитывается сразу; на дальних страницах позиция не сбрасывается
+        if self.report is not None and self.report.view in views and (self.page is None or self.page.number == 1):
+            task = browse_task(self.browser, FIRST)
+            start_background_task(self, task, self._on_page_loaded,
+                                  lambda message: print('Ошибка при обновлении отчета:', message))
+
+    def back_to_tables(self):
+        self.parent_window.show()
+        self.close()
+
+    def closeEvent(self, event):
+        for task in list(getattr(self, 'active_tasks', ())):
+            task.cancel()
+        try:
+            self.scheduler.refreshed.disconnect(self.on_reports_refreshed)
+        except TypeError:
+            pass
+        super().closeEvent(event)
 
     def show_message(self, title, message):
         msg_box = QtWidgets.QMessageBox(self)
@@ -256,7 +921,34 @@ class TableContentWindow(QtWidgets.QMainWindow):
         self.cursor = connection.cursor()
         self.table_name = table_name
         self.parent_window = parent_window
-        self.primary_key_column = None
+        # Первичный ключ и типы колонок берутся из кэша каталога, без запросов к серверу
+        self.primary_key = schema_catalog.primary_key(table_name)
+        self.column_types = schema_catalog.column_types(table_name)
+        # Таблицы с первичным ключом просматриваются постранично через DatabaseService,
+        # отношения без ключа (созданные вручную представления) читаются целиком
+        self.browser = TableBrowser(table_name) if self.primary_key else None
+        self.page = None
+        # Изменения строк (свои и чужие) приходят через NOTIFY и применяются к странице точечно
+        self.change_listener = None
+        try:
+            self.change_listener = NotificationListener([TABLE_CHANGES_CHANNEL], self)
+            self.change_listener.notification.connect(self.on_table_changed)
+        except Exception as e:
+            print('Не удалось подписаться на изменения таблицы:', e)
+        # Условия поиска текущего результата: по ним же строится результат для анализа в памяти
+        self.search_filters = []
+        # Анализ в памяти: весь результат загружается в колоночный кэш, сортировка,
+        # фильтры и статистика считаются локально
+        self.local_mode = False
+        self.local_model = ColumnarTableModel(self)
+        self.local_proxy = ColumnarProxyModel(self)
+        self.local_proxy.setSourceModel(self.local_model)
+        # Серия изменений таблицы дает одну перезагрузку результата в памяти
+        self.local_reload_timer = QtCore.QTimer(self)
+        self.local_reload_timer.setSingleShot(True)
+        self.local_reload_timer.setInterval(1000)
+        self.local_reload_timer.timeout.connect(lambda: self.load_local_result(background=True))
+        self.model = RowTableModel(self)
         self.initUI()
 
     def initUI(self):
@@ -269,21 +961,66 @@ class TableContentWindow(QtWidgets.QMainWindow):
 
         self.search_layout = QtWidgets.QHBoxLayout()
         self.search_field = QtWidgets.QLineEdit(self)
+        self.search_field.setToolTip("Дата: 2024-03-05, месяц 2024-03, год 2024 или диапазон 2024-03-01..2024-03-31")
         self.search_button = QtWidgets.QPushButton("Поиск", self)
         self.delete_found_button = QtWidgets.QPushButton("Удалить найденные", self)
         self.search_column_selector = QtWidgets.QComboBox(self)
+        self.search_mode_selector = QtWidgets.QComboBox(self)
+        for mode, title in search.SEARCH_MODES:
+            self.search_mode_selector.addItem(title, mode)
+        self.search_column_selector.addItems(schema_catalog.column_names(self.table_name))
 
         self.search_layout.addWidget(QtWidgets.QLabel("Поиск по:"))
         self.search_layout.addWidget(self.search_column_selector)
+        self.search_layout.addWidget(self.search_mode_selector)
         self.search_layout.addWidget(self.search_field)
         self.search_layout.addWidget(self.search_button)
         self.search_layout.addWidget(self.delete_found_button)
 
         self.layout.addLayout(self.search_layout)
 
-        self.table_view = QtWidgets.QTableWidget(self)
+        self.table_view = QtWidgets.QTableView(self)
+        self.table_view.setModel(self.model)
+        self.table_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.layout.addWidget(self.table_view)
 
+        header = self.table_view.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(self.browser is not None)
+        header.setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        if self.browser is not None:
+            header.sectionClicked.connect(self.sort_by_column)
+
+        self.page_layout = QtWidgets.QHBoxLayout()
+        self.previous_page_button = QtWidgets.QPushButton("< Предыдущая", self)
+        self.next_page_button = QtWidgets.QPushButton("Следующая >", self)
+        self.page_label = QtWidgets.QLabel(self)
+        self.page_layout.addWidget(self.previous_page_button)
+        self.page_layout.addWidget(self.page_label)
+        self.page_layout.addWidget(self.next_page_button)
+        self.layout.addLayout(self.page_layout)
+        self.previous_page_button.clicked.connect(self.show_previous_page)
+        self.next_page_button.clicked.connect(self.show_next_page)
+
+        self.local_layout = QtWidgets.QHBoxLayout()
+        self.local_button = QtWidgets.QPushButton("Анализ в памяти", self)
+        self.local_button.setCheckable(True)
+        self.local_button.setToolTip("Загрузить текущий результат целиком: сортировка, уточняющий поиск "
+                                     "и статистика без запросов к базе")
+        self.stats_button = QtWidgets.QPushButton("Статистика колонки", self)
+        self.reset_filters_button = QtWidgets.QPushButton("Сбросить фильтры", self)
+        self.local_label = QtWidgets.QLabel(self)
+        self.local_layout.addWidget(self.local_button)
+        self.local_layout.addWidget(self.stats_button)
+        self.local_layout.addWidget(self.reset_filters_button)
+        self.local_layout.addWidget(self.local_label)
+        self.layout.addLayout(self.local_layout)
+        self.local_button.toggled.connect(self.set_local_mode)
+        self.stats_button.clicked.connect(self.show_column_statistics)
+        self.reset_filters_button.clicked.connect(self.reset_local_filters)
+        self.local_proxy.modelReset.connect(self._update_local_label)
+        self._update_page_controls()
+
         self.load_table_content()
 
         # Кнопки
@@ -302,28 +1039,74 @@ class TableContentWindow(QtWidgets.QMainWindow):
         self.delete_found_button.clicked.connect(self.delete_found_records)
 
     def load_table_content(self):
-        try:
-            self.cursor.execute(f"SELECT * FROM {self.table_name}")
-            rows = self.cursor.fetchall()
-            columns = [desc[0] for desc in self.cursor.description]
-
-            self.table_view.setColumnCount(len(columns))
-            self.table_view.setRowCount(len(rows))
-            self.table_view.setHorizontalHeaderLabels(columns)
-
-            for row_idx, row in enumerate(rows):
-                for col_idx, value in enumerate(row):
-                    self.table_view.setItem(row_idx, col_idx, QtWidgets.QTableWidgetItem(str(value)))
-
-            self.search_column_selector.clear()
-            self.search_column_selector.addItems(columns)
-
-            self.cursor.execute("SELECT get_primary_key_column(%s)", (self.table_name,))
-            result = self.cursor.fetchone()
-            self.primary_key_column = result[0] if result else None
+        self.search_filters = []
+        if self.local_mode:
+            self.local_proxy.clear_filters()
+            self.load_local_result()
+            return
+        if self.browser is not None:
+            # Перезагрузка сбрасывает поиск, но сохраняет сортировку
+            self.browser.set_filters([])
+            self.show_page(FIRST)
+            return
 
-        except Exception as e:
-            self.show_error(f"Ошибка при загрузке содержимого таблицы: {e}")
+        query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(self.table_name))
+        task = DbTask(self._rows_task, query, None)
+        start_task(self, task, f"Загрузка таблицы {self.table_name}...",
+                   lambda result: self.model.set_result(*result),
+                   lambda message: self.show_error(f"Ошибка при загрузке содержимого таблицы: {message}"))
+
+    def _rows_task(self, task, query, params):
+        with connection_manager.connection() as connection:
+            task.use_connection(connection)
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return [desc[0] for desc in cursor.description], cursor.fetchall()
+
+    def show_page(self, direction, page=None):
+        start_task(self, browse_task(self.browser, direction, page), f"Загрузка таблицы {self.table_name}...",
+                   self._on_page_loaded,
+                   lambda message: self.show_error(f"Ошибка при загрузке содержимого таблицы: {message}"))
+
+    def _on_page_loaded(self, page):
+        self.page = page
+        self.model.set_result(page.columns, page.rows)
+        self._update_page_controls()
+
+    def _update_page_controls(self):
+        paged = self.browser is not None and self.page is not None and not self.local_mode
+        self.previous_page_button.setVisible(self.browser is not None and not self.local_mode)
+        self.next_page_button.setVisible(self.browser is not None and not self.local_mode)
+        self.page_label.setVisible(self.browser is not None and not self.local_mode)
+        self.stats_button.setVisible(self.local_mode)
+        self.reset_filters_button.setVisible(self.local_mode)
+        self.local_label.setVisible(self.local_mode)
+        self.previous_page_button.setEnabled(paged and self.page.has_previous)
+        self.next_page_button.setEnabled(paged and self.page.has_next)
+        if paged:
+            self.page_label.setText(f"Страница {self.page.number}")
+
+    def show_next_page(self):
+        if self.page is not None and self.page.has_next:
+            self.show_page(NEXT, self.page)
+
+    def show_previous_page(self):
+        if self.page is not None and self.page.has_previous:
+            self.show_page(PREVIOUS, self.page)
+
+    def sort_by_column(self, section):
+        if self.local_mode:
+            # В памяти сортирует представление (setSortingEnabled -> ColumnarProxyModel.sort)
+            return
+        column = self.model.headerData(section, QtCore.Qt.Horizontal)
+        if column is None:
+            return
+        header = self.table_view.horizontalHeader()
+        # Повторный клик по той же колонке меняет направление сортировки
+        descending = column == (self.browser.order_by or self.primary_key[0]) and not self.browser.descending
+        self.browser.set_order(column, descending)
+        header.setSortIndicator(section, QtCore.Qt.DescendingOrder if descending else QtCore.Qt.AscendingOrder)
+        self.show_page(FIRST)
 
     def search_table(self):
         search_text = self.search_field.text()
@@ -333,17 +1116,115 @@ class TableContentWindow(QtWidgets.QMainWindow):
             self.show_error("Введите текст для поиска и выберите колонку.")
             return
 
+        search_mode = self.search_mode_selector.currentData()
+        if self.local_mode:
+            # Каждый поиск в памяти уточняет текущий результат
+            if self.local_model.result is None:
+                return
+            try:
+                self.local_proxy.add_filter(search_column, search_text, search_mode)
+            except ValueError as e:
+                self.show_error(f"Ошибка при выполнении поиска: {e}")
+            return
+
+        self.search_filters = [(search_column, search_text, search_mode)]
+        if self.browser is not None:
+            try:
+                self.browser.set_filters(self.search_filters)
+            except ValueError as e:
+                self.show_error(f"Ошибка при выполнении поиска: {e}")
+                return
+            self.show_page(FIRST)
+            return
+
+        # Условие подбирается по типу колонки, чтобы поиск шел по индексу (триграммному или B-tree)
+        condition, params = search.search_condition(
+            search_column, self.column_types.get(search_column), search_text, search_mode)
+        query = sql.SQL("SELECT * FROM {} WHERE {}").format(sql.Identifier(self.table_name), condition)
+        task = DbTask(self._rows_task, query, params)
+        start_task(self, task, "Поиск...", lambda result: self.model.set_result(*result),
+                   lambda message: self.show_error(f"Ошибка при выполнении поиска: {message}"))
+
+    def set_local_mode(self, enabled):
+        self.local_mode = enabled
+        self.local_reload_timer.stop()
+        header = self.table_view.horizontalHeader()
+        if enabled:
+            self.local_proxy.clear_filters()
+            self.table_view.setModel(self.local_proxy)
+            header.setSortIndicatorShown(True)
+            self.table_view.setSortingEnabled(True)
+            self.load_local_result()
+        else:
+            self.table_view.setSortingEnabled(False)
+            self.table_view.setModel(self.model)
+            header.setSortIndicatorShown(self.browser is not None)
+            header.setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+            self.local_model.set_result(None)
+            if self.browser is not None:
+                self.browser.set_order()
+                self.show_page(FIRST)
+        self._update_page_controls()
+
+    def load_local_result(self, background=False):
+        key = result_cache.key(self.table_name, self.search_filters)
+        result = result_cache.get(key)
+        if result is not None:
+            self.local_model.set_result(result)
+            return
+        task = DbTask(self._local_result_task, key, list(self.search_filters))
+        if background:
+            # Перезагрузка после изменений: фильтры и сортировка представления сохраняются
+            start_background_task(self, task, self._on_local_result, self._on_local_result_failed)
+        else:
+            start_task(self, task, f"Загрузка {self.table_name} в память...", self._on_local_result,
+                       self._on_local_result_failed)
+
+    def _on_local_result(self, result):
+        if self.local_mode:
+            self.local_model.set_result(result)
+
+    def _local_result_task(self, task, key, filters):
+        generation = result_cache.generation(self.table_name)
+        with connection_manager.connection() as connection:
+            task.use_connection(connection)
+            result = load_result(connection, self.table_name, filters, self.column_types)
+        # Если таблица изменилась во время загрузки, результат не кэшируется
+        result_cache.put(key, result, generation)
+        return result
+
+    def _on_local_result_failed(self, message):
+        self.show_error(f"Ошибка при загрузке в память: {message}")
+        if self.local_model.result is None:
+            self.local_button.setChecked(False)
+
+    def _update_local_label(self):
+        result = self.local_model.result
+        if result is None:
+            self.local_label.setText("")
+            return
+        text = f"Строк: {self.local_proxy.rowCount()} из {result.row_count}"
+        if self.local_proxy.filters:
+            text += ", фильтры: " + "; ".join(f"{column} ~ {value}" for column, value, _ in self.local_proxy.filters)
+        self.local_label.setText(text)
+
+    def reset_local_filters(self):
+        self.local_proxy.clear_filters()
+
+    def show_column_statistics(self):
+        column = self.search_column_selector.currentText()
+        if not column or self.local_model.result is None:
+            return
         try:
-            query = f"SELECT * FROM {self.table_name} WHERE {search_column}::text ILIKE %s"
-            self.cursor.execute(query, (f"%{search_text}%",))
-            rows = self.cursor.fetchall()
-
-            self.table_view.setRowCount(len(rows))
-            for row_idx, row in enumerate(rows):
-                for col_idx, value in enumerate(row):
-                    self.table_view.setItem(row_idx, col_idx, QtWidgets.QTableWidgetItem(str(value)))
-        except Exception as e:
-            self.show_error(f"Ошибка при выполнении поиска: {e}")
+            stats = self.local_proxy.statistics(column)
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        lines = [f"Значений: {stats['count']}", f"Пустых: {stats['nulls']}",
+                 f"Минимум: {stats['min']}", f"Максимум: {stats['max']}"]
+        if stats['sum'] is not None:
+            lines += [f"Сумма: {stats['sum']}", f"Среднее: {stats['avg']:.4f}"]
+        self.show_message(f"Статистика: {column}", "\n".join(lines))
 
     def delete_found_records(self):
         search_text = self.search_field.text()
@@ -353,37 +1234,116 @@ class TableContentWindow(QtWidgets.QMainWindow):
             self.show_error("Введите текст для поиска и выберите колонку.")
             return
 
-        try:
-            self.cursor.execute("CALL delete_records_by_condition_proc(%s, %s, %s)",
-                                (self.table_name, search_column, search_text))
-            self.connection.commit()
+        search_mode = search.resolve_mode(self.column_types.get(search_column),
+                                          self.search_mode_selector.currentData())
+        condition = (self.table_name, search_column, search_text, search_mode)
+        # Сначала только подсчет: сколько строк удалится, включая каскадное удаление в дочерних таблицах
+        task = service_task('delete_impact', *condition)
+        start_task(self, task, "Подсчет удаляемых записей...",
+                   lambda impact: self._confirm_bulk_delete(condition, impact),
+                   lambda message: self.show_error(f"Ошибка при подсчете удаляемых записей: {message}"))
+
+    def _confirm_bulk_delete(self, condition, impact):
+        if not impact[0][1]:
+            self.show_message("Удаление", "Нет записей, подходящих под условие.")
+            return
+        lines = [f"{table}: {count}" for table, count in impact if count]
+        batch_size, ok = QtWidgets.QInputDialog.getInt(
+            self, "Удаление найденных записей",
+            "Будет удалено записей (с учетом каскадного удаления):\n" + "\n".join(lines) +
+            "\n\nЗаписей в одной пачке:", BULK_DELETE_BATCH_SIZE, 1, 1000000)
+        if not ok:
+            return
+        pause, ok = QtWidgets.QInputDialog.getDouble(
+            self, "Удаление найденных записей", "Пауза между пачками, секунд:", BULK_DELETE_PAUSE, 0, 60, 2)
+        if not ok:
+            return
 
-            self.load_table_content()
-            self.show_message("Успех", "Найденные записи успешно удалены.")
-        except Exception as e:
-            self.show_error(f"Ошибка при удалении найденных записей: {e}")
+        # Пачки фиксируются по отдельности: после отмены удаленное остается удаленным,
+        # а повторное удаление с тем же условием (и после перезапуска) продолжит с места остановки
+        task = DbTask(lambda task: call_service(task, 'bulk_delete', *condition, batch_size=batch_size,
+                                                pause=pause, progress=task.report))
+        task.signals.cancelled.connect(self.refresh_after_change)
+        start_task(self, task, "Удаление найденных записей...",
+                   lambda count: self._after_delete(f"Удалено записей: {count}"),
+                   lambda message: self.show_error(f"Ошибка при удалении найденных записей: {message}"))
 
     def delete_record(self):
-        selected_items = self.table_view.selectedItems()
-        if not selected_items:
+        selected_indexes = self.table_view.selectionModel().selectedIndexes()
+        if not selected_indexes:
             self.show_error("Выберите запись для удаления.")
             return
 
-        if not self.primary_key_column:
+        if not self.primary_key:
             self.show_error("Не удалось определить первичный ключ для удаления.")
             return
 
-        try:
-            selected_row = selected_items[0].row()
-            primary_key_value = self.table_view.item(selected_row, 0).text()
-            self.cursor.execute("CALL delete_record_by_pk_proc(%s, %s, %s)",
-                                (self.table_name, self.primary_key_column, primary_key_value))
-            self.connection.commit()
-
+        selected_row = selected_indexes[0].row()
+        model = self.local_proxy if self.local_mode else self.model
+        values = model.row_values(selected_row)
+        # Составной ключ (например, у секционированных таблиц) передается целиком
+        key = tuple(values[model.column_index(column)] for column in self.primary_key)
+        task = service_task('delete_by_pk', self.table_name, [key])
+        start_task(self, task, "Удаление записи...",
+                   lambda _: self._after_delete("Запись успешно удалена."),
+                   lambda message: self.show_error(f"Ошибка при удалении записи: {message}"))
+
+    def _after_delete(self, message):
+        self.refresh_after_change()
+        self.show_message("Успех", message)
+
+    def refresh_after_change(self):
+        # Без подписки на уведомления остается только полная перезагрузка
+        if self.change_listener is None:
             self.load_table_content()
-            self.show_message("Успех", "Запись успешно удалена.")
-        except Exception as e:
-            self.show_error(f"Ошибка при удалении записи: {e}")
+
+    def on_table_changed(self, channel, payload):
+        if not isinstance(payload, dict) or payload.get('table') != self.table_name.lower():
+            return
+        result_cache.invalidate(self.table_name)
+        if self.local_mode:
+            self.local_reload_timer.start()
+            return
+        if self.page is None:
+            return
+
+        keys = payload.get('keys')
+        if keys is None:
+            # Слишком много строк или TRUNCATE: перечитываем первую страницу в фоне
+            task = browse_task(self.browser, FIRST)
+            start_background_task(self, task, self._on_page_loaded,
+                                  lambda message: print('Ошибка при обновлении таблицы:', message))
+            return
+
+        # Ключи из уведомления приводятся к типам колонок на сервере (даты в JSON - строки);
+        # после удаления строк среди изменившихся не будет, и останутся только их ключи
+        task = service_task('changed_rows', self.table_name, keys, self.browser.filters)
+        start_background_task(self, task, lambda result: self._apply_changed_rows(*result),
+                              lambda message: print('Ошибка при обновлении строк:', message))
+
+    def _apply_changed_rows(self, columns, rows, keys):
+        if self.page is None or columns != self.model.columns:
+            return
+        # Старые версии строк убираем, новые (если проходят фильтр) ставим на место по сортировке
+        self.model.remove_rows(self.model.find_rows(self.browser.key, keys))
+        for values in rows:
+            position = self._page_position(values)
+            if position is not None:
+                self.model.insert_row(position, values)
+
+    def _page_position(self, values):
+        rows = self.model.rows
+        columns = self.model.columns
+        if not rows:
+            return 0
+        if self.page.has_previous and self.browser.compare_rows(columns, values, rows[0]) < 0:
+            return None
+        if self.page.has_next and self.browser.compare_rows(columns, values, rows[-1]) > 0:
+            return None
+        for position, row in enumerate(rows):
+            if self.browser.compare_rows(columns, values, row) < 0:
+                return position
+        return len(rows)
 
     def add_record(self):
         dialog = AddRecordDialog(self, self.table_name)
@@ -393,6 +1353,16 @@ class TableContentWindow(QtWidgets.QMainWindow):
         self.parent_window.show()
         self.close()
 
+    def closeEvent(self, event):
+        self.local_reload_timer.stop()
+        for task in list(getattr(self, 'active_tasks', ())):
+            task.cancel()
+        QtCore.QThreadPool.globalInstance().waitForDone(2000)
+        if self.change_listener is not None:
+            self.change_listener.close()
+            self.change_listener = None
+        super().closeEvent(event)
+
     def show_message(self, title, message):
         msg_box = QtWidgets.QMessageBox(self)
         msg_box.setWindowTitle(title)
@@ -416,47 +1386,117 @@ class AddRecordDialog(QtWidgets.QDialog):
 
     def initUI(self):
         self.setWindowTitle(f"Добавить запись в таблицу: {self.table_name}")
-        self.setGeometry(100, 100, 400, 300)
+        self.setGeometry(100, 100, 600, 400)
 
-        self.layout = QtWidgets.QFormLayout(self)
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.tabs = QtWidgets.QTabWidget(self)
+        self.layout.addWidget(self.tabs)
 
         self.fields = {}
 
-        # Вызов функции
-        self.cursor.callproc('get_columns', (self.table_name,))
-
-        # Извлекаем результат выполнения функции
-        columns = [row[0] for row in self.cursor.fetchall()]
+        # Колонки без меток времени (как get_columns) из кэша каталога
+        self.columns = schema_catalog.insertable_columns(self.table_name)
 
-        for column in columns:
+        # Одна запись: форма с полем на каждую колонку
+        self.single_tab = QtWidgets.QWidget(self)
+        self.form_layout = QtWidgets.QFormLayout(self.single_tab)
+        for column in self.columns:
             self.fields[column] = QtWidgets.QLineEdit(self)
-            self.layout.addRow(f"{column}: ", self.fields[column])
-
+            self.form_layout.addRow(f"{column}: ", self.fields[column])
+        self.tabs.addTab(self.single_tab, "Одна запись")
+
+        # Несколько записей: таблица для ввода или вставки из буфера обмена (строки и табуляции)
+        self.batch_tab = QtWidgets.QWidget(self)
+        self.batch_layout = QtWidgets.QVBoxLayout(self.batch_tab)
+        self.batch_table = QtWidgets.QTableWidget(1, len(self.columns), self)
+        self.batch_table.setHorizontalHeaderLabels(self.columns)
+        self.batch_layout.addWidget(self.batch_table)
+
+        self.batch_buttons_layout = QtWidgets.QHBoxLayout()
+        self.add_row_button = QtWidgets.QPushButton("Добавить строку", self)
+        self.paste_button = QtWidgets.QPushButton("Вставить из буфера", self)
+        self.clear_rows_button = QtWidgets.QPushButton("Очистить", self)
+        self.batch_buttons_layout.addWidget(self.add_row_button)
+        self.batch_buttons_layout.addWidget(self.paste_button)
+        self.batch_buttons_layout.addWidget(self.clear_rows_button)
+        self.batch_layout.addLayout(self.batch_buttons_layout)
+        self.tabs.addTab(self.batch_tab, "Несколько записей")
+
+        self.add_row_button.clicked.connect(lambda: self.batch_table.insertRow(self.batch_table.rowCount()))
+        self.paste_button.clicked.connect(self.paste_from_clipboard)
+        self.clear_rows_button.clicked.connect(lambda: self.batch_table.setRowCount(0))
+
+        self.buttons_layout = QtWidgets.QHBoxLayout()
         self.submit_button = QtWidgets.QPushButton("Добавить", self)
         self.cancel_button = QtWidgets.QPushButton("Отмена", self)
-
-        self.layout.addRow(self.submit_button, self.cancel_button)
+        self.buttons_layout.addWidget(self.submit_button)
+        self.buttons_layout.addWidget(self.cancel_button)
+        self.layout.addLayout(self.buttons_layout)
 
         self.submit_button.clicked.connect(self.submit_record)
         self.cancel_button.clicked.connect(self.reject)
 
+    def paste_from_clipboard(self):
+        text = QtWidgets.QApplication.clipboard().text()
+        lines = [line for line in text.splitlines() if line.strip()]
+        if not lines:
+            return
+
+        # Если первая строка - заголовок с именами колонок, используем его порядок
+        header = lines[0].split('\t')
+        if all(name in self.columns for name in header):
+            order = [self.columns.index(name) for name in header]
+            lines = lines[1:]
+        else:
+            order = list(range(len(self.columns)))
+
+        start = self.batch_table.rowCount()
+        # Пустые строки таблицы в конце заполняем в первую очередь
+        while start > 0 and self._row_values(start - 1) is None:
+            start -= 1
+        self.batch_table.setRowCount(start + len(lines))
+        for row, line in enumerate(lines, start):
+            for value, column in zip(line.split('\t'), order):
+                self.batch_table.setItem(row, column, QtWidgets.QTableWidgetItem(value))
+
+    def _row_values(self, row):
+        values = []
+        for column in range(len(self.columns)):
+            item = self.batch_table.item(row, column)
+            text = item.text() if item else ''
+            # Пустое поле - NULL (или значение по умолчанию, если колонка пуста во всех строках)
+            values.append(text if text != '' else None)
+        if all(value is None for value in values):
+            return None
+        return values
+
     def submit_record(self):
-        try:
-            column_names = list(self.fields.keys())
-            column_values = [self.fields[col].text() for col in column_names]
-
-            # Формируем SQL-запрос для вызова хранимой процедуры
-            self.cursor.execute(
-                "CALL add_record_to_table(%s, %s, %s)",
-                (self.table_name, column_names, column_values)
-            )
-            self.connection.commit()
-
-            self.accept()
-            self.parent().load_table_content()
+        if self.tabs.currentWidget() is self.batch_tab:
+            rows = [values for values in map(self._row_values, range(self.batch_table.rowCount())) if values]
+        else:
+            rows = [[self.fields[col].text() or None for col in self.columns]]
+        if not rows:
+            self.show_error("Нет данных для добавления.")
+            return
+
+        # Вся пачка вставляется в одной транзакции
+        task = service_task('add_records', self.table_name, self.columns, rows)
+        start_task(self, task, f"Добавление записей: {len(rows)}...", lambda _: self._on_inserted(len(rows)),
+                   lambda message: self.show_error(f"Ошибка при добавлении записи: {message}"))
+
+    def _on_inserted(self, count):
+        self.accept()
+        self.parent().refresh_after_change()
+        if count == 1:
             self.parent().show_message("Успех", "Запись успешно добавлена!")
-        except Exception as e:
-            self.show_error(f"Ошибка при добавлении записи: {e}")
+        else:
+            self.parent().show_message("Успех", f"Добавлено записей: {count}")
+
+    def show_message(self, title, message):
+        msg_box = QtWidgets.QMessageBox(self)
+        msg_box.setWindowTitle(title)
+        msg_box.setText(message)
+        msg_box.exec_()
 
     def show_error(self, message):
         error_box = QtWidgets.QMessageBox(self)
@@ -465,9 +1505,12 @@ class AddRecordDialog(QtWidgets.QDialog):
         error_box.setText(message)
         error_box.exec_()
 
-
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     window = DatabaseApp()
     window.show()
-    sys.exit(app.exec_())
+    window.validate_migrations()
+    exit_code = app.exec_()
+    close_runner()
+    connection_manager.closeall()
+    sys.exit(exit_code)
@@ -0,0 +1,241 @@
+import collections
+import datetime
+import json
+import queue
+import re
+import threading
+import time
+
+from psycopg2 import extensions, sql
+
+# Сколько последних запросов хранится в памяти
+RING_SIZE = 2000
+# Для запросов дольше этого времени (секунды) автоматически снимается план; None - не снимать
+SLOW_QUERY_THRESHOLD = 0.5
+# Файл журнала запросов (JSON Lines); None - журнал только в памяти
+QUERY_LOG_PATH = None
+# Сколько символов текста запроса и параметров сохранять
+MAX_STATEMENT_LENGTH = 4000
+MAX_PARAMS_LENGTH = 500
+
+# Для каких команд снимается план. Только EXPLAIN без ANALYZE: запрос не выполняется повторно,
+# поэтому побочные эффекты (pg_terminate_backend, setval, изменения) не повторяются.
+# EXECUTE (statements.py) не объясняется: готовый запрос есть только на исходном соединении.
+EXPLAIN_STATEMENTS = {'select', 'with', 'values', 'table', 'insert', 'update', 'delete', 'merge'}
+# Сколько запросов может ждать снятия плана; остальные записываются без плана
+EXPLAIN_QUEUE_SIZE = 100
+
+
+class QueryRecord:
+    def __init__(self, statement, params, duration, rows, error=None, plan=None, dbname=None):
+        self.started_at = datetime.datetime.now()
+        self.statement = statement
+        self.params = params
+        self.duration = duration
+        self.rows = rows
+        self.error = error
+        self.plan = plan
+        self.dbname = dbname
+        self.fingerprint = fingerprint(statement)
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at.isoformat(timespec='milliseconds'),
+            'dbname': self.dbname,
+            'statement': self.statement,
+            'params': self.params,
+            'duration_ms': round(self.duration * 1000, 3),
+            'rows': self.rows,
+            'error': self.error,
+            'plan': self.plan,
+        }
+
+
+class QueryStats:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Самый медленный вызов с планом, если план снимался
+        self.slowest = None
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+
+def fingerprint(statement):
+    # Текст запроса без значений: одинаковые запросы с разными литералами группируются вместе
+    text = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    text = re.sub(r"\b\d+(?:\.\d+)?\b", "?", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    # Многострочные VALUES (execute_values) сворачиваются до одной строки
+    return re.sub(r"(\([?, :\w]*\))(?:, \1)+", r"\1, ...", text)
+
+
+def statement_text(query, cursor):
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    if isinstance(query, bytes):
+        query = query.decode(extensions.encodings.get(cursor.connection.encoding, 'utf-8'), 'replace')
+    return str(query)
+
+
+class QueryLog:
+    """Кольцевой буфер выполненных запросов и статистика по ним (общие для всех соединений пула)."""
+
+    def __init__(self, size=RING_SIZE, threshold=SLOW_QUERY_THRESHOLD, log_path=QUERY_LOG_PATH):
+        self.records = collections.deque(maxlen=size)
+        self.stats = {}
+        self.threshold = threshold
+        self.log_path = log_path
+        # Функция dbname -> контекстный менеджер соединения; задается в db_pool
+        self.connection_factory = None
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(EXPLAIN_QUEUE_SIZE)
+        self._explain_thread = None
+
+    def configure(self, threshold=None, log_path=None):
+        with self._lock:
+            if threshold is not None:
+                self.threshold = threshold if threshold > 0 else None
+            if log_path is not None:
+                self.log_path = log_path or None
+
+    def should_explain(self, duration):
+        return self.threshold is not None and self.connection_factory is not None and duration >= self.threshold
+
+    def record(self, record, explain_statement=None, explain_params=None):
+        # explain_statement - полный текст медленного запроса (explain_params - его параметры):
+        # план снимается в фоне, а запись попадает в файл журнала, когда план готов
+        with self._lock:
+            self.records.append(record)
+            stats = self.stats.get(record.fingerprint)
+            if stats is None:
+                stats = self.stats[record.fingerprint] = QueryStats(record.fingerprint)
+            stats.calls += 1
+            stats.total += record.duration
+            if record.error is not None:
+                stats.errors += 1
+            if record.duration >= stats.max:
+                stats.max = record.duration
+                stats.slowest = record
+
+        if explain_statement is not None and self._request_plan(record, explain_statement, explain_params):
+            return
+        self._write(record)
+
+    def _write(self, record):
+        with self._lock:
+            log_path = self.log_path
+        if log_path:
+            try:
+                with self._lock, open(log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record.to_dict(), ensure_ascii=False, default=str) + '\n')
+            except OSError as e:
+                print('Не удалось записать журнал запросов:', e)
+
+    def _request_plan(self, record, statement, params=None):
+        words = statement.split(None, 1)
+        if not words or words[0].lower() not in EXPLAIN_STATEMENTS or ';' in statement:
+            # Несколько команд в одном вызове не объясняются
+            return False
+        with self._lock:
+            if self._explain_thread is None:
+                self._explain_thread = threading.Thread(target=self._explain_worker, name='query-explain',
+                                                        daemon=True)
+                self._explain_thread.start()
+        try:
+            self._explain_queue.put_nowait((record, statement, params))
+        except queue.Full:
+            return False
+        return True
+
+    def _explain_worker(self):
+        # План снимается на отдельном соединении, поэтому запрос вызывающего кода не ждет EXPLAIN
+        while True:
+            record, statement, params = self._explain_queue.get()
+            try:
+                record.plan = self._explain(record.dbname, statement, params)
+            except Exception as e:
+                record.plan = f"Не удалось получить план: {e}"
+            self._write(record)
+
+    def _explain(self, dbname, statement, params=None):
+        with self.connection_factory(dbname) as connection:
+            # Обычный курсор: сам EXPLAIN в журнал не попадает
+            with connection.cursor(cursor_factory=extensions.cursor) as cursor:
+                cursor.execute("EXPLAIN " + statement, params)
+                return "\n".join(row[0] for row in cursor.fetchall())
+
+    def recent(self, limit=None):
+        with self._lock:
+            records = list(self.records)
+        records.reverse()
+        return records[:limit] if limit else records
+
+    def slowest(self, limit=50):
+        return sorted(self.recent(), key=lambda record: record.duration, reverse=True)[:limit]
+
+    def errors(self, limit=50):
+        return [record for record in self.recent() if record.error is not None][:limit]
+
+    def most_frequent(self, limit=50):
+        with self._lock:
+            stats = list(self.stats.values())
+        return sorted(stats, key=lambda item: (item.calls, item.total), reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self.stats.clear()
+
+
+query_log = QueryLog()
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Курсор, который записывает каждый запрос в query_log: текст, параметры, время, строки, ошибки.
+
+    Подключается в db_pool через cursor_factory, поэтому работает для всех соединений пула.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception as e:
+            self._record(query, vars, time.perf_counter() - started, error=e)
+            raise
+        self._record(query, vars, time.perf_counter() - started)
+        return result
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            result = super().copy_expert(sql, file, size)
+        except Exception as e:
+            self._record(sql, None, time.perf_counter() - started, error=e)
+            raise
+        self._record(sql, None, time.perf_counter() - started)
+        return result
+
+    def _record(self, query, vars, duration, error=None):
+        try:
+            statement = statement_text(query, self)
+            explain_statement = None
+            if error is None and self.name is None and query_log.should_explain(duration):
+                # self.query - текст с подставленными параметрами; EXPLAIN выполнит фоновый поток
+                explain_statement = statement_text(self.query or b'', self).strip().rstrip(';').strip()
+            params = repr(vars)[:MAX_PARAMS_LENGTH] if vars is not None else None
+            query_log.record(QueryRecord(
+                statement[:MAX_STATEMENT_LENGTH], params, duration,
+                self.rowcount if error is None else None,
+                str(error).strip() if error is not None else None,
+                None, self.connection.info.dbname
+            ), explain_statement)
+        except Exception as e:
+            # Сбой журнала не должен ломать сам запрос
+            print('Ошибка журнала запросов:', e)
@@ -1,64 +1,134 @@
-import psycopg2
+import argparse
+import asyncio
 
-# Параметры подключения к базе данных
-DB_NAME = "online_school"
-DB_USER = "user_name"  # Замените на вашего пользователя
-DB_PASSWORD = "password"  # Замените на ваш пароль
-DB_HOST = "localhost"
-DB_PORT = "5432"
+from db_pool import DB_NAME
+from instrumentation import query_log
+from service import DatabaseService
 
 
 class App:
     def __init__(self):
-        try:
-            self.connection = psycopg2.connect(dbname="postgres", user=DB_USER,password=DB_PASSWORD,host=DB_HOST)
-            self.connection.autocommit = True  # Включаем autocommit
-            self.cur = self.connection.cursor()
-            print('Успешное подключение к БД')
-        except Exception as e:
-            print('Ошибка при подключении базы данных:', e)
+        # Все операции выполняет асинхронный сервис (service.py), App только выводит результат
+        self.service = DatabaseService()
 
-    def create_db(self):
+    async def create_db(self):
+        # Существующая база не удаляется
         try:
-            # Удаляем базу данных, если она существует
-            self.cur.execute(f"DROP DATABASE IF EXISTS {DB_NAME};")
-            print(f"База данных {DB_NAME} успешно удалена (если существовала).")
-
-            # Создаем новую базу данных
-            self.cur.execute(f"CREATE DATABASE {DB_NAME};")
-            print(f"База данных {DB_NAME} успешно создана!")
-
-            self.close_connection()
-            self.connection = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST)
-            self.cur = self.connection.cursor()
-            print(f"Осуществлен вход в {DB_NAME}")
+            if await self.service.create_database(DB_NAME, progress=print):
+                print(f"База данных {DB_NAME} успешно создана!")
+            else:
+                print(f"База данных {DB_NAME} уже существует.")
         except Exception as e:
             print('Возникла ошибка при создании базы данных:', e)
 
-    def create_tables(self):
+    async def migrate(self):
+        # Применяются только миграции, которых еще нет в migrations.history
         try:
-            with open('setup_db.sql') as f:
-                sql_commands = f.read()
-            self.cur.execute(sql_commands)
-            print('Таблицы успешно созданы!')
+            applied = await self.service.migrate(DB_NAME, progress=print)
+            print(f"Применено миграций: {len(applied)}" if applied else "Схема базы актуальна.")
         except Exception as e:
-            print('Возникла ошибка при создании таблиц:', e)
+            print('Возникла ошибка при применении миграций:', e)
 
-    def close_connection(self):
-        self.cur.close()
-        self.connection.close()
-        print("Соединение закрыто.")
-
-    def check_tables(self):
-        self.cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
-        tables = self.cur.fetchall()
+    async def check_tables(self):
+        # Секции таблиц Payments, Enrollments и Reviews в каталог не входят
+        try:
+            tables = await self.service.list_tables(DB_NAME, include_views=False)
+            counts = await self.service.row_counts(tables, DB_NAME)
+        except Exception as e:
+            print('Возникла ошибка при чтении списка таблиц:', e)
+            return
         print("Существующие таблицы в базе данных:")
         for table in tables:
-            print(table[0])  # Выводим имя таблицы
-
-# Создание базы данных
-app = App()
-app.create_db()
-app.create_tables()
-app.check_tables()
-app.close_connection()
\ No newline at end of file
+            print(f"{table} ({counts[table]} строк)")
+
+    async def clear_all_tables(self):
+        try:
+            await self.service.clear_all_tables(DB_NAME)
+            print('Все таблицы очищены.')
+        except Exception as e:
+            print('Возникла ошибка при очистке таблиц:', e)
+
+    async def save_snapshot(self, name, replace=False):
+        try:
+            await self.service.create_snapshot(name, DB_NAME, replace, progress=print)
+            print(f"Снимок {name} сохранен.")
+        except Exception as e:
+            print('Возникла ошибка при сохранении снимка:', e)
+
+    async def restore_snapshot(self, name):
+        try:
+            await self.service.restore_snapshot(name, DB_NAME, progress=print)
+            print(f"База данных восстановлена из снимка {name}.")
+        except Exception as e:
+            print('Возникла ошибка при восстановлении из снимка:', e)
+            return False
+        return True
+
+    async def delete_snapshot(self, name):
+        try:
+            await self.service.delete_snapshot(name, DB_NAME)
+            print(f"Снимок {name} удален.")
+        except Exception as e:
+            print('Возникла ошибка при удалении снимка:', e)
+
+    async def list_snapshots(self):
+        try:
+            snapshots = await self.service.list_snapshots(DB_NAME)
+        except Exception as e:
+            print('Возникла ошибка при чтении списка снимков:', e)
+            return
+        print("Снимки базы данных:" if snapshots else "Снимков нет.")
+        for name, size, created_at in snapshots:
+            print(f"{name}  {created_at or ''}  {size / 1024 / 1024:.1f} МБ")
+
+    def print_slow_queries(self, limit=5):
+        print("Самые долгие запросы:")
+        for record in query_log.slowest(limit):
+            statement = " ".join(record.statement.split())[:100]
+            print(f"{record.duration * 1000:10.1f} мс  {statement}")
+
+    async def close(self):
+        await self.service.close()
+        print("Соединения закрыты.")
+
+
+async def run(args):
+    app = App()
+    try:
+        if args.restore:
+            # Снимок мог быть сделан до последних миграций
+            if await app.restore_snapshot(args.restore):
+                await app.migrate()
+        elif args.snapshot:
+            await app.save_snapshot(args.snapshot, args.replace)
+        elif args.delete_snapshot:
+            await app.delete_snapshot(args.delete_snapshot)
+        elif args.list_snapshots:
+            await app.list_snapshots()
+        elif args.clear:
+            await app.clear_all_tables()
+        else:
+            # Создание базы данных
+            await app.create_db()
+            await app.migrate()
+        await app.check_tables()
+        app.print_slow_queries()
+    finally:
+        await app.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Создание и обслуживание базы {DB_NAME}")
+    parser.add_argument('--snapshot', metavar='NAME', help="Сохранить текущую базу как снимок")
+    parser.add_argument('--replace', action='store_true', help="Перезаписать существующий снимок")
+    parser.add_argument('--restore', metavar='NAME', help="Заменить базу копией снимка")
+    parser.add_argument('--delete-snapshot', metavar='NAME', help="Удалить снимок")
+    parser.add_argument('--list-snapshots', action='store_true', help="Показать сохраненные снимки")
+    parser.add_argument('--clear', action='store_true', help="Очистить все таблицы одной командой TRUNCATE")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
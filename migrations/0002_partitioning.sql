@@ -0,0 +1,258 @@
+-- Payments, Enrollments и Reviews секционируются по месяцам даты (см. maintain_partitions ниже).
+-- Ключ секционирования обязан входить в первичный ключ, поэтому ключ составной (id, дата),
+-- но строку по-прежнему однозначно определяет id из SERIAL.
+-- Существующая таблица переименовывается, ее строки сразу раскладываются по секциям своих месяцев,
+-- а последовательность id переходит к новой таблице. Даты NULL (раньше допускались) заменяются
+-- текущим временем: ключ секционирования не может быть пустым.
+
+-- Создает секцию таблицы за месяц p_month. Если строки этого месяца уже лежат в секции
+-- по умолчанию, они переносятся в новую таблицу, которая затем подключается как секция.
+CREATE OR REPLACE PROCEDURE create_month_partition(p_table TEXT, p_month DATE)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_name TEXT := lower(p_table);
+    partition_name TEXT := format('%s_%s', lower(p_table), to_char(p_month, 'YYYY_MM'));
+    default_name TEXT := lower(p_table) || '_default';
+    month_start DATE := date_trunc('month', p_month)::date;
+    month_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+    key_column TEXT;
+    has_rows BOOLEAN := FALSE;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT a.attname
+    INTO key_column
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = table_name::regclass;
+
+    IF to_regclass(default_name) IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %1$I WHERE %2$I >= %3$L AND %2$I < %4$L)',
+                       default_name, key_column, month_start, month_end)
+        INTO has_rows;
+    END IF;
+
+    IF NOT has_rows THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, table_name, month_start, month_end);
+    ELSE
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                       partition_name, table_name);
+        EXECUTE format('WITH moved AS (DELETE FROM %1$I WHERE %2$I >= %3$L AND %2$I < %4$L RETURNING *)
+                        INSERT INTO %5$I SELECT * FROM moved',
+                       default_name, key_column, month_start, month_end, partition_name);
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       table_name, partition_name, month_start, month_end);
+    END IF;
+    RAISE NOTICE 'Создана секция %', partition_name;
+END;
+$$;
+
+-- Создает помесячные секции всех секционированных таблиц за период
+CREATE OR REPLACE PROCEDURE create_partitions(p_from DATE, p_to DATE)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_record RECORD;
+    month_start DATE;
+BEGIN
+    FOR table_record IN
+        SELECT c.relname AS table_name
+        FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND pt.partstrat = 'r'
+    LOOP
+        FOR month_start IN
+            SELECT generate_series(date_trunc('month', p_from), p_to, INTERVAL '1 month')::date
+        LOOP
+            CALL create_month_partition(table_record.table_name, month_start);
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
+-- Отключает (и по умолчанию удаляет) секции старше p_retention_months месяцев.
+-- Это операция над метаданными: строки не удаляются по одной и триггеры не срабатывают,
+-- поэтому рейтинги пересчитываются, а клиенты получают уведомление как после TRUNCATE.
+CREATE OR REPLACE PROCEDURE drop_expired_partitions(
+    p_table TEXT,
+    p_retention_months INT,
+    p_detach_only BOOLEAN DEFAULT FALSE
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_name TEXT := lower(p_table);
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_retention_months))::date;
+    partition_record RECORD;
+    removed INTEGER := 0;
+BEGIN
+    FOR partition_record IN
+        SELECT c.relname AS partition_name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = table_name::regclass
+          AND CASE WHEN c.relname ~ '_\d{4}_\d{2}$'
+                   THEN to_date(right(c.relname, 7), 'YYYY_MM') < cutoff
+                   ELSE FALSE END
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', table_name, partition_record.partition_name);
+        IF p_detach_only THEN
+            RAISE NOTICE 'Секция % отключена', partition_record.partition_name;
+        ELSE
+            EXECUTE format('DROP TABLE %I', partition_record.partition_name);
+            RAISE NOTICE 'Секция % удалена', partition_record.partition_name;
+        END IF;
+        removed := removed + 1;
+    END LOOP;
+
+    IF removed > 0 THEN
+        IF table_name = 'reviews' THEN
+            CALL rebuild_tutor_ratings();
+        END IF;
+        PERFORM pg_notify('table_changes', json_build_object(
+            'table', table_name, 'op', 'TRUNCATE', 'keys', NULL)::text);
+    END IF;
+END;
+$$;
+
+-- Обслуживание секций: разносит строки из секций по умолчанию по месяцам, заранее создает
+-- секции на p_months_ahead месяцев вперед и, если задан срок хранения, убирает старые секции
+CREATE OR REPLACE PROCEDURE maintain_partitions(
+    p_months_ahead INT DEFAULT 3,
+    p_retention_months INT DEFAULT NULL,
+    p_detach_only BOOLEAN DEFAULT FALSE
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_record RECORD;
+    month_start DATE;
+BEGIN
+    FOR table_record IN
+        SELECT c.relname AS table_name, a.attname AS key_column
+        FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+        WHERE n.nspname = 'public' AND pt.partstrat = 'r'
+    LOOP
+        IF to_regclass(table_record.table_name || '_default') IS NOT NULL THEN
+            FOR month_start IN EXECUTE format('SELECT DISTINCT date_trunc(''month'', %I)::date FROM %I',
+                                              table_record.key_column, table_record.table_name || '_default')
+            LOOP
+                CALL create_month_partition(table_record.table_name, month_start);
+            END LOOP;
+        END IF;
+
+        FOR month_start IN
+            SELECT generate_series(date_trunc('month', CURRENT_DATE),
+                                   date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead),
+                                   INTERVAL '1 month')::date
+        LOOP
+            CALL create_month_partition(table_record.table_name, month_start);
+        END LOOP;
+
+        IF p_retention_months IS NOT NULL THEN
+            CALL drop_expired_partitions(table_record.table_name, p_retention_months, p_detach_only);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE Payments RENAME TO payments_unpartitioned;
+ALTER INDEX payments_pkey RENAME TO payments_unpartitioned_pkey;
+
+CREATE TABLE Payments (
+    payment_id INTEGER NOT NULL DEFAULT nextval('payments_payment_id_seq'),
+    session_id INT NOT NULL REFERENCES Sessions(session_id) ON DELETE CASCADE,
+    amount DECIMAL(10, 2) NOT NULL,
+    payment_date  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    payment_method VARCHAR(15) CHECK (payment_method IN ('credit_card', 'paypal', 'bank_transfer')) NOT NULL,
+    PRIMARY KEY (payment_id, payment_date)
+) PARTITION BY RANGE (payment_date);
+
+CREATE TABLE Payments_default PARTITION OF Payments DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN SELECT DISTINCT date_trunc('month', payment_date)::date FROM payments_unpartitioned
+                       WHERE payment_date IS NOT NULL
+    LOOP
+        CALL create_month_partition('payments', month_start);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO Payments SELECT payment_id, session_id, amount, COALESCE(payment_date, CURRENT_TIMESTAMP), payment_method FROM payments_unpartitioned;
+ALTER SEQUENCE payments_payment_id_seq OWNED BY Payments.payment_id;
+DROP TABLE payments_unpartitioned;
+
+ALTER TABLE Enrollments RENAME TO enrollments_unpartitioned;
+ALTER INDEX enrollments_pkey RENAME TO enrollments_unpartitioned_pkey;
+
+CREATE TABLE Enrollments (
+    enrollment_id INTEGER NOT NULL DEFAULT nextval('enrollments_enrollment_id_seq'),
+    session_id INT NOT NULL REFERENCES Sessions(session_id) ON DELETE CASCADE,
+    student_id INT NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+    enrollment_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (enrollment_id, enrollment_date)
+) PARTITION BY RANGE (enrollment_date);
+
+CREATE TABLE Enrollments_default PARTITION OF Enrollments DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN SELECT DISTINCT date_trunc('month', enrollment_date)::date FROM enrollments_unpartitioned
+                       WHERE enrollment_date IS NOT NULL
+    LOOP
+        CALL create_month_partition('enrollments', month_start);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO Enrollments SELECT enrollment_id, session_id, student_id, COALESCE(enrollment_date, CURRENT_TIMESTAMP) FROM enrollments_unpartitioned;
+ALTER SEQUENCE enrollments_enrollment_id_seq OWNED BY Enrollments.enrollment_id;
+DROP TABLE enrollments_unpartitioned;
+
+ALTER TABLE Reviews RENAME TO reviews_unpartitioned;
+ALTER INDEX reviews_pkey RENAME TO reviews_unpartitioned_pkey;
+
+CREATE TABLE Reviews (
+    review_id INTEGER NOT NULL DEFAULT nextval('reviews_review_id_seq'),
+    session_id INT NOT NULL REFERENCES Sessions(session_id) ON DELETE CASCADE,
+    student_id INT NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+    rating INT CHECK (rating BETWEEN 1 AND 5),
+    comment TEXT,
+    review_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (review_id, review_date)
+) PARTITION BY RANGE (review_date);
+
+CREATE TABLE Reviews_default PARTITION OF Reviews DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN SELECT DISTINCT date_trunc('month', review_date)::date FROM reviews_unpartitioned
+                       WHERE review_date IS NOT NULL
+    LOOP
+        CALL create_month_partition('reviews', month_start);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO Reviews SELECT review_id, session_id, student_id, rating, comment, COALESCE(review_date, CURRENT_TIMESTAMP) FROM reviews_unpartitioned;
+ALTER SEQUENCE reviews_review_id_seq OWNED BY Reviews.review_id;
+DROP TABLE reviews_unpartitioned;
+
+CALL maintain_partitions();
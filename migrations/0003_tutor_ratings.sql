@@ -0,0 +1,130 @@
+-- Рейтинг репетитора обновляется приращениями триггерами уровня оператора вместо
+-- пересчета AVG по всем отзывам на каждую строку (строчный триггер начальной схемы)
+ALTER TABLE Tutors
+    ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN review_sum BIGINT NOT NULL DEFAULT 0;
+
+DROP TRIGGER IF EXISTS after_review_insert ON Reviews;
+
+-- Рейтинг репетитора хранится как review_sum / review_count и обновляется приращениями
+CREATE OR REPLACE PROCEDURE rebuild_tutor_ratings(p_tutor_ids INT[] DEFAULT NULL)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Полный пересчет агрегатов (всех репетиторов или только перечисленных)
+    UPDATE Tutors t
+    SET review_count = COALESCE(a.cnt, 0),
+        review_sum = COALESCE(a.total, 0),
+        rating = CASE WHEN COALESCE(a.cnt, 0) = 0 THEN 0 ELSE a.total::FLOAT / a.cnt END
+    FROM Tutors t2
+    LEFT JOIN (
+        SELECT s.tutor_id, COUNT(r.rating) AS cnt, SUM(r.rating) AS total
+        FROM Reviews r
+        JOIN Sessions s ON s.session_id = r.session_id
+        WHERE p_tutor_ids IS NULL OR s.tutor_id = ANY(p_tutor_ids)
+        GROUP BY s.tutor_id
+    ) a ON a.tutor_id = t2.tutor_id
+    WHERE t.tutor_id = t2.tutor_id
+      AND (p_tutor_ids IS NULL OR t.tutor_id = ANY(p_tutor_ids));
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION update_tutor_rating() RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    -- Изменения из таблиц переходов: +1 для новых отзывов, -1 для удаленных
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT session_id, rating, 1 AS sign FROM new_reviews';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT session_id, rating, -1 AS sign FROM old_reviews';
+    ELSE
+        changes := 'SELECT session_id, rating, 1 AS sign FROM new_reviews
+                    UNION ALL
+                    SELECT session_id, rating, -1 AS sign FROM old_reviews';
+    END IF;
+
+    -- Каждый затронутый репетитор обновляется один раз за оператор
+    EXECUTE format(
+        'UPDATE Tutors t
+         SET review_count = t.review_count + d.cnt,
+             review_sum = t.review_sum + d.total,
+             rating = CASE WHEN t.review_count + d.cnt = 0 THEN 0
+                           ELSE (t.review_sum + d.total)::FLOAT / (t.review_count + d.cnt) END
+         FROM (
+             SELECT s.tutor_id,
+                    COALESCE(SUM(c.sign) FILTER (WHERE c.rating IS NOT NULL), 0) AS cnt,
+                    COALESCE(SUM(c.sign * c.rating), 0) AS total
+             FROM (%s) c
+             JOIN Sessions s ON s.session_id = c.session_id
+             GROUP BY s.tutor_id
+         ) d
+         WHERE t.tutor_id = d.tutor_id AND (d.cnt <> 0 OR d.total <> 0)',
+        changes
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER after_review_insert
+AFTER INSERT ON Reviews
+REFERENCING NEW TABLE AS new_reviews
+FOR EACH STATEMENT EXECUTE FUNCTION update_tutor_rating();
+
+CREATE TRIGGER after_review_update
+AFTER UPDATE ON Reviews
+REFERENCING OLD TABLE AS old_reviews NEW TABLE AS new_reviews
+FOR EACH STATEMENT EXECUTE FUNCTION update_tutor_rating();
+
+CREATE TRIGGER after_review_delete
+AFTER DELETE ON Reviews
+REFERENCING OLD TABLE AS old_reviews
+FOR EACH STATEMENT EXECUTE FUNCTION update_tutor_rating();
+
+-- TRUNCATE (в том числе каскадный из clear_table_proc) удаляет все отзывы сразу
+CREATE OR REPLACE FUNCTION reset_tutor_ratings() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE Tutors
+    SET review_count = 0, review_sum = 0, rating = 0
+    WHERE review_count <> 0 OR review_sum <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER after_review_truncate
+AFTER TRUNCATE ON Reviews
+FOR EACH STATEMENT EXECUTE FUNCTION reset_tutor_ratings();
+
+-- При удалении занятия его отзывы удаляются каскадно уже без строки в Sessions,
+-- а при смене репетитора отзывы переходят к другому: пересчитываем затронутых репетиторов
+CREATE OR REPLACE FUNCTION rebuild_session_tutor_ratings() RETURNS TRIGGER AS $$
+DECLARE
+    tutor_ids INT[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT tutor_id) INTO tutor_ids FROM old_sessions;
+    ELSE
+        SELECT array_agg(DISTINCT o.tutor_id) || array_agg(DISTINCT n.tutor_id) INTO tutor_ids
+        FROM old_sessions o
+        JOIN new_sessions n ON n.session_id = o.session_id
+        WHERE n.tutor_id IS DISTINCT FROM o.tutor_id;
+    END IF;
+
+    IF tutor_ids IS NOT NULL THEN
+        CALL rebuild_tutor_ratings(tutor_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER after_session_delete
+AFTER DELETE ON Sessions
+REFERENCING OLD TABLE AS old_sessions
+FOR EACH STATEMENT EXECUTE FUNCTION rebuild_session_tutor_ratings();
+
+CREATE TRIGGER after_session_update
+AFTER UPDATE ON Sessions
+REFERENCING OLD TABLE AS old_sessions NEW TABLE AS new_sessions
+FOR EACH STATEMENT EXECUTE FUNCTION rebuild_session_tutor_ratings();
+
+CALL rebuild_tutor_ratings();
@@ -0,0 +1,18 @@
+-- Индексы внешних ключей: нужны триггеру рейтинга и каскадному удалению
+CREATE INDEX idx_sessions_tutor_id ON Sessions(tutor_id);
+CREATE INDEX idx_enrollments_session_id ON Enrollments(session_id);
+CREATE INDEX idx_enrollments_student_id ON Enrollments(student_id);
+CREATE INDEX idx_reviews_session_id ON Reviews(session_id);
+CREATE INDEX idx_reviews_student_id ON Reviews(student_id);
+CREATE INDEX idx_payments_session_id ON Payments(session_id);
+
+-- Триграммные индексы для поиска подстроки (ILIKE '%...%') по текстовым колонкам
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX idx_users_name_trgm ON Users USING GIN (name gin_trgm_ops);
+CREATE INDEX idx_users_surname_trgm ON Users USING GIN (surname gin_trgm_ops);
+CREATE INDEX idx_users_email_trgm ON Users USING GIN (email gin_trgm_ops);
+CREATE INDEX idx_tutors_bio_trgm ON Tutors USING GIN (bio gin_trgm_ops);
+CREATE INDEX idx_subjects_title_trgm ON Subjects USING GIN (title gin_trgm_ops);
+CREATE INDEX idx_reviews_comment_trgm ON Reviews USING GIN (comment gin_trgm_ops);
+
@@ -0,0 +1,85 @@
+-- Уведомления об изменении строк для открытых окон просмотра (канал table_changes).
+-- Один NOTIFY на оператор: таблица, операция и первичные ключи затронутых строк.
+-- Полезная нагрузка pg_notify ограничена 8000 байтами, а при превышении падает сам оператор,
+-- вызвавший триггер, поэтому ключи передаются, только если их не больше 100 и уведомление
+-- короче 7500 байт; иначе keys = null и клиент перечитывает страницу целиком.
+CREATE OR REPLACE FUNCTION notify_row_changes() RETURNS TRIGGER AS $$
+DECLARE
+    pk_column TEXT := TG_ARGV[0];
+    max_keys CONSTANT INTEGER := 100;
+    max_payload CONSTANT INTEGER := 7500;
+    changed_keys JSON;
+    changed_count INTEGER;
+    source TEXT;
+    payload TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT %1$I AS pk FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        source := 'SELECT %1$I AS pk FROM old_rows';
+    ELSIF TG_OP = 'UPDATE' THEN
+        source := 'SELECT %1$I AS pk FROM new_rows UNION SELECT %1$I AS pk FROM old_rows';
+    END IF;
+
+    IF source IS NOT NULL THEN
+        EXECUTE format('SELECT count(*), json_agg(pk) FROM (' || source || ' LIMIT %2$s) s', pk_column, max_keys + 1)
+        INTO changed_count, changed_keys;
+        IF changed_count = 0 THEN
+            RETURN NULL;
+        END IF;
+        IF changed_count > max_keys THEN
+            changed_keys := NULL;
+        END IF;
+    END IF;
+
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', changed_keys)::text;
+    IF octet_length(payload) > max_payload THEN
+        -- Длинные текстовые ключи: уведомление без списка ключей всегда короткое
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', NULL)::text;
+    END IF;
+
+    PERFORM pg_notify('table_changes', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Создает триггеры уведомлений для всех таблиц схемы public с первичным ключом из одной колонки
+-- и для секционированных таблиц (триггеры на родительской таблице срабатывают для всех секций)
+CREATE OR REPLACE PROCEDURE install_change_notifications()
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_record RECORD;
+BEGIN
+    -- У секционированных таблиц ключ (id, дата): строку определяет первая колонка
+    FOR table_record IN
+        SELECT c.relname AS table_name, a.attname AS pk_column
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_constraint con ON con.conrelid = c.oid AND con.contype = 'p'
+                              AND (array_length(con.conkey, 1) = 1 OR c.relkind = 'p')
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = con.conkey[1]
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_insert ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_update ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_delete ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_truncate ON %I', table_record.table_name);
+        EXECUTE format('CREATE TRIGGER notify_insert AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%L)',
+                       table_record.table_name, table_record.pk_column);
+        EXECUTE format('CREATE TRIGGER notify_update AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%L)',
+                       table_record.table_name, table_record.pk_column);
+        EXECUTE format('CREATE TRIGGER notify_delete AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%L)',
+                       table_record.table_name, table_record.pk_column);
+        EXECUTE format('CREATE TRIGGER notify_truncate AFTER TRUNCATE ON %I
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%L)',
+                       table_record.table_name, table_record.pk_column);
+    END LOOP;
+END;
+$$;
+
+CALL install_change_notifications();
@@ -0,0 +1,64 @@
+-- Отчеты: материализованные представления с уникальными индексами.
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY (reports.py), которое
+-- не блокирует чтение отчета во время обновления и меняет только изменившиеся строки.
+CREATE MATERIALIZED VIEW report_tutor_subject_revenue AS
+SELECT s.tutor_id,
+       s.subject_id,
+       u.name || ' ' || u.surname AS tutor_name,
+       sub.title AS subject_title,
+       count(DISTINCT s.session_id) AS sessions_count,
+       count(p.payment_id) AS payments_count,
+       COALESCE(sum(p.amount), 0) AS revenue
+FROM Sessions s
+JOIN Tutors t ON t.tutor_id = s.tutor_id
+JOIN Users u ON u.user_id = t.user_id
+JOIN Subjects sub ON sub.subject_id = s.subject_id
+LEFT JOIN Payments p ON p.session_id = s.session_id
+GROUP BY s.tutor_id, s.subject_id, u.name, u.surname, sub.title;
+
+CREATE UNIQUE INDEX report_tutor_subject_revenue_key ON report_tutor_subject_revenue (tutor_id, subject_id);
+CREATE INDEX report_tutor_subject_revenue_revenue ON report_tutor_subject_revenue (revenue, tutor_id, subject_id);
+
+CREATE MATERIALIZED VIEW report_monthly_payments AS
+SELECT date_trunc('month', payment_date)::date AS month,
+       count(*) AS payments_count,
+       sum(amount) AS total_amount,
+       COALESCE(sum(amount) FILTER (WHERE payment_method = 'credit_card'), 0) AS credit_card_amount,
+       COALESCE(sum(amount) FILTER (WHERE payment_method = 'paypal'), 0) AS paypal_amount,
+       COALESCE(sum(amount) FILTER (WHERE payment_method = 'bank_transfer'), 0) AS bank_transfer_amount
+FROM Payments
+WHERE payment_date IS NOT NULL
+GROUP BY 1;
+
+CREATE UNIQUE INDEX report_monthly_payments_key ON report_monthly_payments (month);
+
+CREATE MATERIALIZED VIEW report_session_enrollments AS
+SELECT s.session_id,
+       s.session_date,
+       s.tutor_id,
+       s.subject_id,
+       count(e.enrollment_id) AS enrollment_count
+FROM Sessions s
+LEFT JOIN Enrollments e ON e.session_id = s.session_id
+GROUP BY s.session_id;
+
+CREATE UNIQUE INDEX report_session_enrollments_key ON report_session_enrollments (session_id);
+CREATE INDEX report_session_enrollments_count ON report_session_enrollments (enrollment_count, session_id);
+
+CREATE MATERIALIZED VIEW report_rating_distribution AS
+SELECT t.tutor_id,
+       count(r.review_id) AS review_count,
+       round(avg(r.rating), 2) AS average_rating,
+       count(r.review_id) FILTER (WHERE r.rating = 1) AS rating_1,
+       count(r.review_id) FILTER (WHERE r.rating = 2) AS rating_2,
+       count(r.review_id) FILTER (WHERE r.rating = 3) AS rating_3,
+       count(r.review_id) FILTER (WHERE r.rating = 4) AS rating_4,
+       count(r.review_id) FILTER (WHERE r.rating = 5) AS rating_5
+FROM Tutors t
+LEFT JOIN Sessions s ON s.tutor_id = t.tutor_id
+LEFT JOIN Reviews r ON r.session_id = s.session_id
+GROUP BY t.tutor_id;
+
+CREATE UNIQUE INDEX report_rating_distribution_key ON report_rating_distribution (tutor_id);
+CREATE INDEX report_rating_distribution_count ON report_rating_distribution (review_count, tutor_id);
+
@@ -0,0 +1,24 @@
+-- Уведомление клиентов об изменении схемы: кэш каталога (catalog.py) сбрасывается по NOTIFY
+CREATE OR REPLACE FUNCTION notify_schema_changed() RETURNS EVENT_TRIGGER AS $$
+BEGIN
+    -- Обновление отчетов схему не меняет, а выполняется часто
+    IF TG_TAG = 'REFRESH MATERIALIZED VIEW' THEN
+        RETURN;
+    END IF;
+    PERFORM pg_notify('schema_changed', json_build_object('tag', TG_TAG)::text);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Событийные триггеры может создать только суперпользователь; без них кэш сбрасывается вручную
+DO $$
+BEGIN
+    DROP EVENT TRIGGER IF EXISTS schema_changed_ddl;
+    DROP EVENT TRIGGER IF EXISTS schema_changed_drop;
+    CREATE EVENT TRIGGER schema_changed_ddl ON ddl_command_end
+        EXECUTE FUNCTION notify_schema_changed();
+    CREATE EVENT TRIGGER schema_changed_drop ON sql_drop
+        EXECUTE FUNCTION notify_schema_changed();
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'Недостаточно прав для событийных триггеров, уведомления об изменении схемы отключены';
+END;
+$$;
@@ -0,0 +1,81 @@
+-- Занятие как интервал времени: начало (session_date + start_time) и длительность в минутах.
+-- Ограничение-исключение на GiST-индексе (tutor_id, period) не дает записать репетитора
+-- на пересекающиеся занятия, а тот же индекс отвечает на вопрос "свободен ли репетитор".
+
+-- Оператор = для INTEGER в GiST-индексе
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Существующим занятиям назначается время начала: занятия репетитора за день идут подряд с 8:00
+DO $$
+DECLARE
+    overloaded RECORD;
+BEGIN
+    SELECT tutor_id, session_date, sum(duration) AS total INTO overloaded
+    FROM Sessions
+    GROUP BY tutor_id, session_date
+    HAVING sum(duration) > 16 * 60
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'У репетитора % занятия % длятся % мин - больше, чем помещается в день с 8:00',
+            overloaded.tutor_id, overloaded.session_date, overloaded.total;
+    END IF;
+END;
+$$;
+
+ALTER TABLE Sessions ADD COLUMN start_time TIME;
+
+UPDATE Sessions s
+SET start_time = TIME '08:00' + o.offset_minutes * INTERVAL '1 minute'
+FROM (
+    SELECT session_id,
+           COALESCE(sum(duration) OVER (PARTITION BY tutor_id, session_date ORDER BY session_id
+                                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS offset_minutes
+    FROM Sessions
+) o
+WHERE o.session_id = s.session_id;
+
+ALTER TABLE Sessions
+    ALTER COLUMN start_time SET DEFAULT TIME '09:00',
+    ALTER COLUMN start_time SET NOT NULL,
+    ADD CONSTRAINT sessions_duration_check CHECK (duration > 0),
+    ADD COLUMN period TSRANGE GENERATED ALWAYS AS (
+        tsrange(session_date + start_time, session_date + start_time + duration * INTERVAL '1 minute')
+    ) STORED;
+
+ALTER TABLE Sessions
+    ADD CONSTRAINT sessions_tutor_period_excl EXCLUDE USING GIST (tutor_id WITH =, period WITH &&);
+
+-- Предметы, которые ведет репетитор. Заполняется по занятиям и пополняется триггером,
+-- поэтому поиск репетиторов предмета не просматривает Sessions.
+CREATE TABLE TutorSubjects (
+    subject_id INT NOT NULL REFERENCES Subjects(subject_id) ON DELETE CASCADE,
+    tutor_id INT NOT NULL REFERENCES Tutors(tutor_id) ON DELETE CASCADE,
+    PRIMARY KEY (subject_id, tutor_id)
+);
+
+CREATE INDEX idx_tutorsubjects_tutor_id ON TutorSubjects(tutor_id);
+
+INSERT INTO TutorSubjects (subject_id, tutor_id)
+SELECT DISTINCT subject_id, tutor_id FROM Sessions;
+
+CREATE OR REPLACE FUNCTION add_tutor_subjects() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO TutorSubjects (subject_id, tutor_id)
+    SELECT DISTINCT subject_id, tutor_id FROM new_sessions
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER after_session_insert_subjects
+AFTER INSERT ON Sessions
+REFERENCING NEW TABLE AS new_sessions
+FOR EACH STATEMENT EXECUTE FUNCTION add_tutor_subjects();
+
+CREATE TRIGGER after_session_update_subjects
+AFTER UPDATE ON Sessions
+REFERENCING NEW TABLE AS new_sessions
+FOR EACH STATEMENT EXECUTE FUNCTION add_tutor_subjects();
+
+ANALYZE Sessions;
+ANALYZE TutorSubjects;
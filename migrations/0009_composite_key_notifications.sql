@@ -0,0 +1,91 @@
+-- Уведомления об изменении строк передают первичный ключ целиком: для составного ключа
+-- (секционированные таблицы, TutorSubjects) каждый ключ - JSON-массив значений колонок
+-- в порядке ключа. Раньше передавалась только первая колонка, а таблицы с составным
+-- несекционированным ключом уведомлений не получали.
+CREATE OR REPLACE FUNCTION notify_row_changes() RETURNS TRIGGER AS $$
+DECLARE
+    -- Аргументы триггера - колонки первичного ключа по порядку
+    key_sql TEXT;
+    max_keys CONSTANT INTEGER := 100;
+    max_payload CONSTANT INTEGER := 7500;
+    changed_keys JSON;
+    changed_count INTEGER;
+    source TEXT;
+    payload TEXT;
+BEGIN
+    SELECT string_agg(quote_ident(key_column), ', ') INTO key_sql FROM unnest(TG_ARGV) AS key_column;
+    IF TG_NARGS > 1 THEN
+        -- jsonb, а не json: для UNION нужна операция сравнения
+        key_sql := 'jsonb_build_array(' || key_sql || ')';
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        source := 'SELECT ' || key_sql || ' AS pk FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        source := 'SELECT ' || key_sql || ' AS pk FROM old_rows';
+    ELSIF TG_OP = 'UPDATE' THEN
+        source := 'SELECT ' || key_sql || ' AS pk FROM new_rows UNION SELECT ' || key_sql || ' AS pk FROM old_rows';
+    END IF;
+
+    IF source IS NOT NULL THEN
+        EXECUTE format('SELECT count(*), json_agg(pk) FROM (%s LIMIT %s) s', source, max_keys + 1)
+        INTO changed_count, changed_keys;
+        IF changed_count = 0 THEN
+            RETURN NULL;
+        END IF;
+        IF changed_count > max_keys THEN
+            changed_keys := NULL;
+        END IF;
+    END IF;
+
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', changed_keys)::text;
+    IF octet_length(payload) > max_payload THEN
+        -- Длинные текстовые ключи: уведомление без списка ключей всегда короткое
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', NULL)::text;
+    END IF;
+
+    PERFORM pg_notify('table_changes', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Создает триггеры уведомлений для всех таблиц схемы public с первичным ключом
+-- (у секционированных таблиц триггеры на родительской таблице срабатывают для всех секций)
+CREATE OR REPLACE PROCEDURE install_change_notifications()
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    table_record RECORD;
+BEGIN
+    FOR table_record IN
+        SELECT c.relname AS table_name,
+               (SELECT string_agg(quote_literal(a.attname), ', ' ORDER BY k.position)
+                FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, position)
+                JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum) AS key_columns
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_constraint con ON con.conrelid = c.oid AND con.contype = 'p'
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_insert ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_update ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_delete ON %I', table_record.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS notify_truncate ON %I', table_record.table_name);
+        EXECUTE format('CREATE TRIGGER notify_insert AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%s)',
+                       table_record.table_name, table_record.key_columns);
+        EXECUTE format('CREATE TRIGGER notify_update AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%s)',
+                       table_record.table_name, table_record.key_columns);
+        EXECUTE format('CREATE TRIGGER notify_delete AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%s)',
+                       table_record.table_name, table_record.key_columns);
+        EXECUTE format('CREATE TRIGGER notify_truncate AFTER TRUNCATE ON %I
+                        FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes(%s)',
+                       table_record.table_name, table_record.key_columns);
+    END LOOP;
+END;
+$$;
+
+CALL install_change_notifications();
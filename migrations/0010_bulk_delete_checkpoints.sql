@@ -0,0 +1,14 @@
+-- Место остановки прерванных удалений по условию (DatabaseService.bulk_delete): повторный вызов
+-- с тем же условием продолжает после последнего удаленного ключа, в том числе после перезапуска.
+-- Отдельная схема: служебная таблица не попадает в список таблиц приложения (схема public)
+CREATE SCHEMA IF NOT EXISTS maintenance;
+
+CREATE TABLE maintenance.bulk_delete_checkpoints (
+    table_name TEXT NOT NULL,
+    -- JSON-массив [колонка, значение, режим поиска]
+    condition TEXT NOT NULL,
+    -- Последний удаленный первичный ключ: значения колонок ключа текстом, по порядку ключа
+    last_key TEXT[] NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, condition)
+);
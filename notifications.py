@@ -0,0 +1,58 @@
+import json
+
+from PyQt5 import QtCore
+from psycopg2 import sql
+
+from db_pool import DB_NAME, connection_manager
+
+# Канал уведомлений об изменении строк (триггеры notify_row_changes из миграции 0005)
+TABLE_CHANGES_CHANNEL = 'table_changes'
+
+
+class NotificationListener(QtCore.QObject):
+    """Слушает каналы LISTEN/NOTIFY на отдельном соединении из пула.
+
+    Сокет соединения отслеживается QSocketNotifier, поэтому уведомления
+    обрабатываются в цикле событий Qt без опроса по таймеру.
+    """
+
+    notification = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, channels, parent=None, dbname=DB_NAME):
+        super().__init__(parent)
+        self.connection = connection_manager.getconn(dbname)
+        with self.connection.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+
+        self.notifier = QtCore.QSocketNotifier(self.connection.fileno(), QtCore.QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self._read_notifications)
+
+    def _read_notifications(self):
+        try:
+            self.connection.poll()
+        except Exception as e:
+            print('Ошибка при получении уведомлений:', e)
+            self.close()
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload) if notify.payload else None
+            except ValueError:
+                payload = notify.payload
+            self.notification.emit(notify.channel, payload)
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.notifier.setEnabled(False)
+        try:
+            if not self.connection.closed:
+                with self.connection.cursor() as cursor:
+                    cursor.execute("UNLISTEN *")
+        except Exception:
+            pass
+        connection_manager.putconn(self.connection)
+        self.connection = None
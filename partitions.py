@@ -0,0 +1,59 @@
+import argparse
+
+from db_pool import DB_NAME, connection_manager
+
+# На сколько месяцев вперед заранее создаются секции
+MONTHS_AHEAD = 3
+
+
+def maintain_partitions(connection, months_ahead=MONTHS_AHEAD, retention_months=None, detach_only=False):
+    # Вызывает maintain_partitions из миграции 0002; возвращает сообщения о созданных и удаленных секциях
+    del connection.notices[:]
+    with connection.cursor() as cursor:
+        cursor.execute("CALL maintain_partitions(%s, %s, %s)", (months_ahead, retention_months, detach_only))
+    return [notice.strip().split(':', 1)[-1].strip() for notice in connection.notices]
+
+
+def list_partitions(connection):
+    # (таблица, секция, границы, примерное число строк) для всех секционированных таблиц
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT parent.relname, child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = parent.relnamespace
+            WHERE n.nspname = 'public' AND parent.relkind = 'p'
+            ORDER BY parent.relname, child.relname
+        """)
+        return cursor.fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Обслуживание секций таблиц базы {DB_NAME} (например, по cron)")
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                        help="На сколько месяцев вперед создать секции")
+    parser.add_argument('--retention-months', type=int,
+                        help="Убрать секции старше указанного числа месяцев")
+    parser.add_argument('--detach', action='store_true',
+                        help="Старые секции только отключить (остаются отдельными таблицами), а не удалять")
+    parser.add_argument('--list', action='store_true', help="Показать существующие секции")
+    args = parser.parse_args(argv)
+
+    try:
+        with connection_manager.connection() as connection:
+            for message in maintain_partitions(connection, args.months_ahead, args.retention_months, args.detach):
+                print(message)
+            if args.list:
+                for table, partition, bounds, rows in list_partitions(connection):
+                    print(f"{table}: {partition} {bounds} (~{max(int(rows), 0)} строк)")
+    except Exception as e:
+        print('Ошибка при обслуживании секций:', e)
+        return 1
+    finally:
+        connection_manager.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
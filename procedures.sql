@@ -48,7 +48,7 @@ BEGIN
     query := format(
         'INSERT INTO %I (%s) VALUES (%s)',
         table_name,
-        array_to_string(column_names, ', '),
+        array_to_string(array(SELECT quote_ident(c) FROM unnest(column_names) c), ', '),
         array_to_string(
             array(SELECT quote_literal(v) FROM unnest(column_values) v),
             ', '
@@ -83,17 +83,24 @@ BEGIN
 END;
 $$;
 
+-- Все таблицы очищаются одной командой TRUNCATE: одна блокировка на набор таблиц вместо
+-- отдельного TRUNCATE ... CASCADE на каждую. Секции очищаются вместе с родительской таблицей,
+-- представления и отчеты (материализованные представления) не затрагиваются.
 CREATE OR REPLACE PROCEDURE clear_all_tables_proc()
 LANGUAGE plpgsql
 AS $$
 DECLARE
-    table_record RECORD;
+    table_list TEXT;
 BEGIN
-    FOR table_record IN
-        SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'
-    LOOP
-        EXECUTE 'CALL clear_table_proc(' || quote_literal(table_record.table_name) || ')';
-    END LOOP;
+    SELECT string_agg(format('%I', c.relname), ', ')
+    INTO table_list
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition;
+
+    IF table_list IS NOT NULL THEN
+        EXECUTE 'TRUNCATE TABLE ' || table_list || ' RESTART IDENTITY';
+    END IF;
 END;
 $$;
 
@@ -106,8 +113,9 @@ BEGIN
     SELECT a.attname
     INTO primary_key_column
     FROM pg_index i
+    -- У секционированных таблиц ключ составной (id, дата): берем первую колонку
     JOIN pg_attribute a ON a.attrelid = i.indrelid
-                        AND a.attnum = ANY(i.indkey)
+                        AND a.attnum = i.indkey[0]
     WHERE i.indrelid = table_name::regclass
       AND i.indisprimary;
 
@@ -115,10 +123,95 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Диапазон дат для поиска: '2024-03-05', '2024-03', '2024' или '2024-03-01..2024-03-31'.
+-- Конец диапазона не включается.
+CREATE OR REPLACE FUNCTION search_date_range(p_value TEXT, OUT range_start DATE, OUT range_end DATE)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    value TEXT := btrim(p_value);
+    first_range RECORD;
+    last_range RECORD;
+BEGIN
+    IF position('..' IN value) > 0 THEN
+        SELECT * INTO first_range FROM search_date_range(split_part(value, '..', 1));
+        SELECT * INTO last_range FROM search_date_range(split_part(value, '..', 2));
+        range_start := first_range.range_start;
+        range_end := last_range.range_end;
+    ELSIF value ~ '^\d{4}$' THEN
+        range_start := make_date(value::int, 1, 1);
+        range_end := range_start + INTERVAL '1 year';
+    ELSIF value ~ '^\d{4}-\d{1,2}$' THEN
+        range_start := to_date(value, 'YYYY-MM');
+        range_end := range_start + INTERVAL '1 month';
+    ELSE
+        range_start := value::date;
+        range_end := range_start + 1;
+    END IF;
+END;
+$$;
+
+-- Условие поиска, которое может использовать индекс колонки (см. search.py):
+-- текст ищется без приведения к text (триграммный GIN-индекс), числа и даты - точным совпадением
+CREATE OR REPLACE FUNCTION search_predicate(
+    p_table_name TEXT,
+    p_column_name TEXT,
+    p_search_value TEXT,
+    p_search_mode TEXT DEFAULT 'auto'
+) RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    column_type TEXT;
+    search_mode TEXT := p_search_mode;
+    bounds RECORD;
+BEGIN
+    SELECT c.data_type
+    INTO column_type
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public'
+      AND c.table_name = lower(p_table_name)
+      AND c.column_name = p_column_name;
+
+    IF column_type IS NULL THEN
+        RAISE EXCEPTION 'Колонка %.% не найдена', p_table_name, p_column_name;
+    END IF;
+
+    IF search_mode = 'auto' THEN
+        search_mode := CASE WHEN column_type IN ('text', 'character varying', 'character')
+                            THEN 'contains' ELSE 'exact' END;
+    END IF;
+
+    IF column_type IN ('text', 'character varying', 'character') THEN
+        RETURN CASE search_mode
+            WHEN 'exact' THEN format('%I = %L', p_column_name, p_search_value)
+            WHEN 'prefix' THEN format('%I ILIKE %L', p_column_name, p_search_value || '%')
+            ELSE format('%I ILIKE %L', p_column_name, '%' || p_search_value || '%')
+        END;
+    END IF;
+
+    IF search_mode = 'exact' THEN
+        IF column_type IN ('date', 'timestamp without time zone', 'timestamp with time zone') THEN
+            -- Диапазон с константными границами: работает индекс и отсечение секций
+            SELECT * INTO bounds FROM search_date_range(p_search_value);
+            RETURN format('%1$I >= %2$L AND %1$I < %3$L', p_column_name, bounds.range_start, bounds.range_end);
+        END IF;
+        RETURN format('%I = %L', p_column_name, p_search_value);
+    END IF;
+
+    RETURN format(
+        '%I::text ILIKE %L',
+        p_column_name,
+        CASE WHEN search_mode = 'prefix' THEN p_search_value || '%' ELSE '%' || p_search_value || '%' END
+    );
+END;
+$$;
+
 CREATE OR REPLACE PROCEDURE delete_records_by_condition_proc(
     table_name TEXT,
     search_column TEXT,
-    search_value TEXT
+    search_value TEXT,
+    search_mode TEXT DEFAULT 'contains'
 )
 LANGUAGE plpgsql
 AS $$
@@ -126,8 +219,8 @@ DECLARE
     query TEXT;
 BEGIN
     query := format(
-        'DELETE FROM %I WHERE %I::text ILIKE %L',
-        table_name, search_column, '%' || search_value || '%'
+        'DELETE FROM %I WHERE %s',
+        table_name, search_predicate(table_name, search_column, search_value, search_mode)
     );
 
     EXECUTE query;
@@ -161,6 +254,6 @@ BEGIN
     RETURN QUERY
     SELECT column_name::text
     FROM information_schema.columns
-    WHERE table_name = p_table_name AND data_type NOT LIKE 'timestamp%';
+    WHERE table_name = p_table_name AND data_type NOT LIKE 'timestamp%' AND is_generated = 'NEVER';
 END;
 $$;
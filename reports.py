@@ -0,0 +1,100 @@
+import argparse
+import time
+
+from psycopg2 import sql
+
+from db_pool import DB_NAME, connection_manager
+
+# Через сколько секунд после изменения исходных таблиц отчеты обновляются в фоне.
+# Серия изменений за это время дает одно обновление.
+REFRESH_DELAY = 30
+
+
+class Report:
+    def __init__(self, view, title, key, sources, order_by=None, descending=False):
+        self.view = view
+        self.title = title
+        # Колонки уникального индекса: по ним работают REFRESH CONCURRENTLY и постраничный просмотр
+        self.key = key
+        # Таблицы, при изменении которых отчет устаревает
+        self.sources = set(sources)
+        self.order_by = order_by
+        self.descending = descending
+
+
+# Материализованные представления из миграции 0006 (migrations/0006_reports.sql)
+REPORTS = [
+    Report('report_tutor_subject_revenue', "Доход репетиторов по предметам", ['tutor_id', 'subject_id'],
+           ['sessions', 'tutors', 'users', 'subjects', 'payments'], 'revenue', True),
+    Report('report_monthly_payments', "Платежи по месяцам", ['month'], ['payments'], 'month', True),
+    Report('report_session_enrollments', "Записи на занятия", ['session_id'],
+           ['sessions', 'enrollments'], 'enrollment_count', True),
+    Report('report_rating_distribution', "Распределение оценок репетиторов", ['tutor_id'],
+           ['tutors', 'sessions', 'reviews'], 'review_count', True),
+]
+
+
+def get_report(view):
+    for report in REPORTS:
+        if report.view == view:
+            return report
+    raise ValueError(f"Отчет {view} не найден")
+
+
+def dependent_reports(tables):
+    # Отчеты, которые устаревают при изменении указанных таблиц
+    tables = {table.lower() for table in tables}
+    return [report.view for report in REPORTS if report.sources & tables]
+
+
+def refresh_report(connection, view, concurrently=True):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relispopulated FROM pg_class WHERE oid = to_regclass(%s)", (view,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"Отчет {view} не найден в базе данных")
+        # CONCURRENTLY нельзя применить к представлению, которое еще ни разу не заполнялось
+        if concurrently and row[0]:
+            query = sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}")
+        else:
+            query = sql.SQL("REFRESH MATERIALIZED VIEW {}")
+        cursor.execute(query.format(sql.Identifier(view)))
+
+
+def refresh_reports(connection, views=None, concurrently=True, progress=None):
+    # Обновляет отчеты по одному (каждый в своей транзакции); возвращает {отчет: секунды}
+    timings = {}
+    for report in REPORTS:
+        if views is not None and report.view not in views:
+            continue
+        if progress:
+            progress(f"Обновление отчета: {report.title}...")
+        started = time.perf_counter()
+        refresh_report(connection, report.view, concurrently)
+        timings[report.view] = time.perf_counter() - started
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Обновление отчетов базы {DB_NAME} (например, по cron)")
+    parser.add_argument('--view', action='append', choices=[report.view for report in REPORTS],
+                        help="Обновить только указанный отчет")
+    parser.add_argument('--full', action='store_true',
+                        help="Обновлять без CONCURRENTLY (быстрее, но блокирует чтение отчета)")
+    args = parser.parse_args(argv)
+
+    try:
+        with connection_manager.connection() as connection:
+            timings = refresh_reports(connection, args.view, not args.full, progress=print)
+        for view, seconds in timings.items():
+            print(f"{view}: {seconds:.2f} с")
+    except Exception as e:
+        print('Ошибка при обновлении отчетов:', e)
+        return 1
+    finally:
+        connection_manager.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,291 @@
+import collections
+import datetime
+import threading
+
+from psycopg2 import sql
+
+import search
+
+try:
+    import numpy
+except ImportError:  # Без NumPy колонки хранятся списками, операции выполняются циклами Python
+    numpy = None
+
+# Сколько результатов (таблиц и поисков) хранится одновременно
+CACHE_MAX_RESULTS = 8
+# Общий объем кэша в ячейках (строки x колонки); при превышении вытесняются давно открытые результаты
+CACHE_MAX_CELLS = 5000000
+# Результат больше этого числа строк в память не загружается
+MAX_CACHED_ROWS = 200000
+
+# OID типов PostgreSQL (cursor.description.type_code) -> вид колонки
+COLUMN_KINDS = {
+    20: 'integer', 21: 'integer', 23: 'integer',
+    700: 'float', 701: 'float', 1700: 'float',
+    16: 'boolean',
+    1082: 'date', 1114: 'date', 1184: 'date',
+    25: 'text', 1042: 'text', 1043: 'text',
+}
+# Вид колонки -> вид по классификации search.column_kind (для режима поиска "Авто")
+SEARCH_KINDS = {'integer': 'numeric', 'float': 'numeric', 'date': 'date', 'text': 'text'}
+
+
+class Column:
+    def __init__(self, name, kind, values):
+        self.name = name
+        self.kind = kind
+        # Исходные значения для отображения там, где вектор их не повторяет (numeric, даты)
+        self.display = None
+        if numpy is None or kind not in ('integer', 'float', 'boolean', 'date'):
+            self.data = list(values)
+            self.nulls = [value is None for value in values]
+            return
+
+        self.nulls = numpy.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        if kind == 'integer':
+            self.data = numpy.array([0 if value is None else value for value in values], dtype=numpy.int64)
+        elif kind == 'float':
+            self.data = numpy.array([numpy.nan if value is None else float(value) for value in values],
+                                    dtype=numpy.float64)
+            self.display = list(values)
+        elif kind == 'boolean':
+            self.data = numpy.array([bool(value) for value in values], dtype=bool)
+        else:
+            self.data = numpy.array([_datetime64(value) for value in values], dtype='datetime64[us]')
+            self.display = list(values)
+
+    @property
+    def vectorized(self):
+        return numpy is not None and isinstance(self.data, numpy.ndarray)
+
+    def value(self, row):
+        if self.nulls[row]:
+            return None
+        if self.display is not None:
+            return self.display[row]
+        value = self.data[row]
+        if self.vectorized:
+            return value.item()
+        return value
+
+
+def _datetime64(value):
+    if value is None:
+        return numpy.datetime64('NaT')
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        # Моменты времени с часовым поясом сравниваются в UTC
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return numpy.datetime64(value, 'us')
+
+
+class ColumnarResult:
+    """Результат запроса, разложенный по колонкам: числа, даты и логические значения - массивы NumPy.
+
+    Сортировка, фильтры и статистика работают с векторами номеров строк (indices), поэтому
+    повторная сортировка или уточнение фильтра не обращаются к базе и не копируют строки.
+    """
+
+    def __init__(self, names, type_codes, rows):
+        self.names = list(names)
+        self.row_count = len(rows)
+        columns = list(zip(*rows)) if rows else [() for _ in self.names]
+        self.columns = [Column(name, COLUMN_KINDS.get(type_code, 'other'), values)
+                        for name, type_code, values in zip(self.names, type_codes, columns)]
+
+    @property
+    def cells(self):
+        return self.row_count * len(self.names)
+
+    def column(self, name):
+        try:
+            return self.columns[self.names.index(name)]
+        except ValueError:
+            raise ValueError(f"Колонка {name} не найдена")
+
+    def all_indices(self):
+        if numpy is not None:
+            return numpy.arange(self.row_count)
+        return list(range(self.row_count))
+
+    def row_values(self, row):
+        return tuple(column.value(row) for column in self.columns)
+
+    def sort_indices(self, name, descending=False, indices=None):
+        # Пустые значения всегда в конце, как NULLS LAST
+        column = self.column(name)
+        indices = self.all_indices() if indices is None else indices
+        if column.vectorized:
+            nulls = column.nulls[indices]
+            present = indices[~nulls]
+            keys = column.data[present]
+            if column.kind == 'date':
+                keys = keys.view(numpy.int64)
+            elif column.kind == 'boolean':
+                keys = keys.astype(numpy.int64)
+            order = numpy.argsort(-keys if descending else keys, kind='stable')
+            return numpy.concatenate([present[order], indices[nulls]])
+
+        present = [row for row in indices if not column.nulls[row]]
+        key = (lambda row: column.data[row]) if column.kind in SEARCH_KINDS else (lambda row: str(column.data[row]))
+        ordered = sorted(present, key=key, reverse=descending) + [row for row in indices if column.nulls[row]]
+        return numpy.array(ordered, dtype=numpy.int64) if numpy is not None else ordered
+
+    def filter_indices(self, name, value, mode=search.AUTO, indices=None):
+        """Номера строк из indices, которые нашел бы search.search_condition с теми же параметрами."""
+        column = self.column(name)
+        indices = self.all_indices() if indices is None else indices
+        kind = SEARCH_KINDS.get(column.kind, 'other')
+        mode = search.resolve_mode(kind if kind == 'text' else None, mode)
+
+        if mode == search.EXACT and kind in ('numeric', 'date'):
+            if kind == 'numeric':
+                try:
+                    number = float(value)
+                except ValueError:
+                    raise ValueError(f"Для колонки {name} нужно число: {value}")
+                if column.vectorized:
+                    keep = (column.data[indices] == number) & ~column.nulls[indices]
+                    return indices[keep]
+                return self._select(indices, lambda row: not column.nulls[row] and column.data[row] == number)
+
+            bounds = search.date_range(value)
+            if bounds is None:
+                raise ValueError(f"Не удалось разобрать дату: {value}")
+            if column.vectorized:
+                start, end = (numpy.datetime64(bound, 'us') for bound in bounds)
+                data = column.data[indices]
+                return indices[(data >= start) & (data < end)]
+            start, end = bounds
+            return self._select(indices, lambda row: not column.nulls[row]
+                                and start <= _as_date(column.data[row]) < end)
+
+        # Текстовое сравнение без учета регистра, как ILIKE (для нетекстовых колонок - как ::text ILIKE)
+        needle = value.lower()
+        if mode == search.EXACT:
+            return self._select(indices, lambda row: not column.nulls[row] and str(column.value(row)) == value)
+        if mode == search.PREFIX:
+            return self._select(indices, lambda row: not column.nulls[row]
+                                and str(column.value(row)).lower().startswith(needle))
+        return self._select(indices, lambda row: not column.nulls[row] and needle in str(column.value(row)).lower())
+
+    def _select(self, indices, predicate):
+        if numpy is not None:
+            keep = numpy.fromiter((predicate(row) for row in indices), dtype=bool, count=len(indices))
+            return numpy.asarray(indices)[keep]
+        return [row for row in indices if predicate(row)]
+
+    def statistics(self, name, indices=None):
+        # Количество, пустые значения, минимум и максимум; для чисел также сумма и среднее
+        column = self.column(name)
+        indices = self.all_indices() if indices is None else indices
+        stats = {'count': 0, 'nulls': 0, 'min': None, 'max': None, 'sum': None, 'avg': None}
+        if column.vectorized:
+            nulls = column.nulls[indices]
+            present = column.data[indices[~nulls]]
+            stats['nulls'] = int(nulls.sum())
+            stats['count'] = len(present)
+            if not len(present):
+                return stats
+            stats['min'] = present.min().item()
+            stats['max'] = present.max().item()
+            if column.kind in ('integer', 'float'):
+                stats['sum'] = present.sum().item()
+                stats['avg'] = present.mean().item()
+            return stats
+
+        present = [column.data[row] for row in indices if not column.nulls[row]]
+        stats['nulls'] = len(indices) - len(present)
+        stats['count'] = len(present)
+        if not present:
+            return stats
+        if column.kind not in SEARCH_KINDS:
+            present = [str(value) for value in present]
+        stats['min'] = min(present)
+        stats['max'] = max(present)
+        if column.kind in ('integer', 'float'):
+            stats['sum'] = sum(present)
+            stats['avg'] = stats['sum'] / len(present)
+        return stats
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def load_result(connection, table, filters=(), column_types=None, max_rows=MAX_CACHED_ROWS):
+    # Читает таблицу (с условиями поиска, как TableBrowser) в ColumnarResult
+    conditions = []
+    params = []
+    for column, value, mode in filters:
+        condition, condition_params = search.search_condition(column, (column_types or {}).get(column), value, mode)
+        conditions.append(sql.SQL("({})").format(condition))
+        params.extend(condition_params)
+    where = sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL("")
+    query = sql.SQL("SELECT * FROM {}{} LIMIT %s").format(sql.Identifier(table), where)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params + [max_rows + 1])
+        rows = cursor.fetchall()
+        description = cursor.description
+    if len(rows) > max_rows:
+        raise ValueError(f"Результат больше {max_rows} строк и не загружается в память; уточните поиск")
+    return ColumnarResult([column[0] for column in description], [column[1] for column in description], rows)
+
+
+class ResultCache:
+    """LRU-кэш колоночных результатов, общий для всех окон таблиц.
+
+    Ключ - (таблица, условия поиска). При изменении таблицы (уведомление table_changes)
+    все ее результаты удаляются; результат, загруженный во время изменения, не сохраняется.
+    """
+
+    def __init__(self, max_results=CACHE_MAX_RESULTS, max_cells=CACHE_MAX_CELLS):
+        self.max_results = max_results
+        self.max_cells = max_cells
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        # Меняется при clear(): сбрасывает и таблицы, которые еще ни разу не изменялись
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(table, filters=()):
+        return table.lower(), tuple(tuple(item) for item in filters)
+
+    def generation(self, table):
+        # Номер версии таблицы: запоминается перед загрузкой и передается в put
+        with self._lock:
+            return self._epoch, self._generations.get(table.lower(), 0)
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result, generation=None):
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[0], 0)):
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            cells = sum(entry.cells for entry in self._entries.values())
+            while len(self._entries) > 1 and (len(self._entries) > self.max_results or cells > self.max_cells):
+                _, evicted = self._entries.popitem(last=False)
+                cells -= evicted.cells
+
+    def invalidate(self, table):
+        table = table.lower()
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [key for key in self._entries if key[0] == table]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+
+result_cache = ResultCache()
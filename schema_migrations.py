@@ -0,0 +1,250 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import time
+
+from db_pool import DB_NAME, connection_manager
+
+# Версионные миграции: migrations/NNNN_описание.sql, применяются один раз по возрастанию версии
+MIGRATIONS_DIR = 'migrations'
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.sql$')
+# Скрипты только из CREATE OR REPLACE: выполняются заново, когда меняется их содержимое
+REPEATABLE_SCRIPTS = ['procedures.sql']
+# Версия, которой помечается база, созданная до появления миграций скриптом setup_db.sql:
+# 0001 - та же схема, а остальное (секционирование, триггеры, индексы, отчеты) применяется миграциями
+BASELINE_VERSION = 1
+# Ключ pg_advisory_lock: две программы не применяют миграции к одной базе одновременно
+MIGRATION_LOCK_ID = 5432001
+
+# История хранится вне схемы public, чтобы ее не видели каталог, clear_all_tables_proc и уведомления
+CREATE_HISTORY_TABLE = """
+    CREATE SCHEMA IF NOT EXISTS migrations;
+    CREATE TABLE IF NOT EXISTS migrations.history (
+        script TEXT PRIMARY KEY,
+        version INTEGER UNIQUE,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        execution_ms INTEGER NOT NULL DEFAULT 0
+    );
+"""
+HISTORY_EXISTS_QUERY = "SELECT to_regclass('migrations.history') IS NOT NULL"
+HISTORY_QUERY = "SELECT script, version, checksum FROM migrations.history"
+# Для базы без истории: есть ли уже таблицы начальной схемы
+BASELINE_QUERY = "SELECT to_regclass('public.users') IS NOT NULL"
+LOCK_QUERY = "SELECT pg_advisory_lock(%s)"
+UNLOCK_QUERY = "SELECT pg_advisory_unlock(%s)"
+RECORD_MIGRATION = """
+    INSERT INTO migrations.history (script, version, checksum, execution_ms)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (script) DO UPDATE
+    SET checksum = EXCLUDED.checksum, applied_at = CURRENT_TIMESTAMP, execution_ms = EXCLUDED.execution_ms
+"""
+
+
+class Migration:
+    def __init__(self, script, path, sql_text, version=None):
+        self.script = script
+        self.path = path
+        self.sql = sql_text
+        # None - повторяемый скрипт
+        self.version = version
+        self.checksum = checksum(sql_text)
+
+    @property
+    def repeatable(self):
+        return self.version is None
+
+    def __repr__(self):
+        return self.script
+
+
+def checksum(sql_text):
+    # Окончания строк не влияют на контрольную сумму (файл мог пройти через git на Windows)
+    return hashlib.sha256(sql_text.replace('\r\n', '\n').encode('utf-8')).hexdigest()
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        raise ValueError(f"Не удалось прочитать {path}: {e}")
+    if not text.strip():
+        raise ValueError(f"Файл {path} пуст")
+    return text
+
+
+def load_migrations(directory=MIGRATIONS_DIR, repeatable=REPEATABLE_SCRIPTS, root='.'):
+    """Читает и проверяет все SQL-файлы проекта; возвращает миграции в порядке применения.
+
+    Ошибка (ValueError), если имя миграции не по шаблону, версии повторяются или идут с пропуском,
+    файл пуст или не читается, а также если в корне проекта лежит SQL-файл, который никто не выполняет.
+    """
+    problems = []
+    migrations = []
+    versions = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.sql'))):
+        script = os.path.basename(path)
+        match = MIGRATION_FILE_PATTERN.match(script)
+        if match is None:
+            problems.append(f"{path}: имя должно быть вида 0001_описание.sql")
+            continue
+        version = int(match.group(1))
+        if version in versions:
+            problems.append(f"{path}: версия {version} уже занята файлом {versions[version]}")
+            continue
+        versions[version] = script
+        try:
+            migrations.append(Migration(script, path, _read(path), version))
+        except ValueError as e:
+            problems.append(str(e))
+
+    expected = list(range(1, len(versions) + 1))
+    if sorted(versions) != expected:
+        problems.append(f"Версии миграций должны идти подряд с 1, найдены: {sorted(versions)}")
+
+    for script in repeatable:
+        path = os.path.join(root, script)
+        try:
+            migrations.append(Migration(script, path, _read(path)))
+        except ValueError as e:
+            problems.append(str(e))
+
+    stray = sorted(set(os.path.basename(path) for path in glob.glob(os.path.join(root, '*.sql'))) - set(repeatable))
+    if stray:
+        problems.append(f"SQL-файлы вне миграций: {', '.join(stray)}")
+
+    if problems:
+        raise ValueError("Ошибки в файлах миграций:\n" + "\n".join(problems))
+    migrations.sort(key=lambda migration: (migration.repeatable, migration.version or 0))
+    return migrations
+
+
+def pending_migrations(migrations, history):
+    """Миграции, которые нужно применить, по истории {script: (version, checksum)}.
+
+    Ошибка (ValueError), если примененная миграция изменена, удалена или новая миграция
+    оказалась старше уже примененных (расхождение файлов и базы).
+    """
+    problems = []
+    by_script = {migration.script: migration for migration in migrations}
+    applied_versions = [version for version, _ in history.values() if version is not None]
+    latest = max(applied_versions, default=0)
+
+    for script, (version, applied_checksum) in sorted(history.items()):
+        migration = by_script.get(script)
+        if migration is None:
+            if version is not None:
+                problems.append(f"Миграция {script} применена, но файла больше нет")
+        elif not migration.repeatable and migration.checksum != applied_checksum:
+            problems.append(f"Миграция {script} изменена после применения; изменения вносятся новой миграцией")
+
+    pending = []
+    for migration in migrations:
+        applied = history.get(migration.script)
+        if migration.repeatable:
+            if applied is None or applied[1] != migration.checksum:
+                pending.append(migration)
+        elif applied is None:
+            if migration.version < latest:
+                problems.append(f"Миграция {migration.script} старше уже примененной версии {latest}")
+            pending.append(migration)
+
+    if problems:
+        raise ValueError("Схема базы расходится с файлами миграций:\n" + "\n".join(problems))
+    return pending
+
+
+def baseline_history(migrations):
+    # История базы, созданной до появления миграций: начальные миграции считаются примененными
+    return {migration.script: (migration.version, migration.checksum) for migration in migrations
+            if not migration.repeatable and migration.version <= BASELINE_VERSION}
+
+
+def read_history(cursor):
+    # {script: (version, checksum)}; None - истории нет, но таблицы уже есть (нужен baseline_history)
+    cursor.execute(HISTORY_EXISTS_QUERY)
+    if cursor.fetchone()[0]:
+        cursor.execute(HISTORY_QUERY)
+        history = {script: (version, applied_checksum) for script, version, applied_checksum in cursor.fetchall()}
+        if history:
+            return history
+    cursor.execute(BASELINE_QUERY)
+    return None if cursor.fetchone()[0] else {}
+
+
+def migrate(connection, migrations=None, progress=None):
+    """Применяет недостающие миграции, каждую в своей транзакции; возвращает список примененных.
+
+    connection - соединение без autocommit (psycopg2 или синхронный psycopg 3, их API курсора
+    здесь одинаковый). База, созданная до появления миграций,
+    помечается версией BASELINE_VERSION без выполнения скриптов.
+    """
+    if migrations is None:
+        migrations = load_migrations()
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_QUERY, (MIGRATION_LOCK_ID,))
+        try:
+            cursor.execute(CREATE_HISTORY_TABLE)
+            history = read_history(cursor)
+            if history is None:
+                history = baseline_history(migrations)
+                for script, (version, applied_checksum) in history.items():
+                    cursor.execute(RECORD_MIGRATION, (script, version, applied_checksum, 0))
+            connection.commit()
+
+            applied = []
+            for migration in pending_migrations(migrations, history):
+                if progress:
+                    progress(f"Применение миграции {migration.script}...")
+                started = time.perf_counter()
+                try:
+                    cursor.execute(migration.sql)
+                    cursor.execute(RECORD_MIGRATION, (migration.script, migration.version, migration.checksum,
+                                                      int((time.perf_counter() - started) * 1000)))
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    raise ValueError(f"Ошибка в миграции {migration.script}: {e}")
+                applied.append(migration.script)
+            return applied
+        finally:
+            connection.rollback()
+            cursor.execute(UNLOCK_QUERY, (MIGRATION_LOCK_ID,))
+            connection.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Миграции схемы базы {DB_NAME}")
+    parser.add_argument('--check', action='store_true',
+                        help="Только проверить файлы и показать недостающие миграции, ничего не применяя")
+    args = parser.parse_args(argv)
+
+    try:
+        migrations = load_migrations()
+        with connection_manager.connection(autocommit=False) as connection:
+            if args.check:
+                with connection.cursor() as cursor:
+                    history = read_history(cursor)
+                if history is None:
+                    history = baseline_history(migrations)
+                pending = pending_migrations(migrations, history)
+                for migration in pending:
+                    print(f"Не применена: {migration.script}")
+                if not pending:
+                    print("Схема базы актуальна.")
+            else:
+                applied = migrate(connection, migrations, progress=print)
+                print(f"Применено миграций: {len(applied)}" if applied else "Схема базы актуальна.")
+    except Exception as e:
+        print('Ошибка миграций:', e)
+        return 1
+    finally:
+        connection_manager.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
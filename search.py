@@ -0,0 +1,97 @@
+import datetime
+
+from psycopg2 import sql
+
+# Режимы поиска
+AUTO = 'auto'
+CONTAINS = 'contains'
+PREFIX = 'prefix'
+EXACT = 'exact'
+
+SEARCH_MODES = [
+    (AUTO, "Авто"),
+    (CONTAINS, "Содержит"),
+    (PREFIX, "Начинается с"),
+    (EXACT, "Точное совпадение"),
+]
+
+# Особые символы шаблона LIKE; в строке поиска экранируются (обратная косая черта - первой)
+LIKE_SPECIAL_CHARACTERS = ('\\', '%', '_')
+
+TEXT_TYPES = {'text', 'character varying', 'character'}
+NUMERIC_TYPES = {'smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision'}
+DATE_TYPES = {'date', 'timestamp without time zone', 'timestamp with time zone'}
+
+
+def column_kind(data_type):
+    if data_type in TEXT_TYPES:
+        return 'text'
+    if data_type in NUMERIC_TYPES:
+        return 'numeric'
+    if data_type in DATE_TYPES:
+        return 'date'
+    return 'other'
+
+
+def date_range(value):
+    # '2024-03-05', '2024-03', '2024' или '2024-03-01..2024-03-31' -> (начало, конец не включая);
+    # None, если формат не распознан (тогда строку разбирает сервер)
+    value = value.strip()
+    if '..' in value:
+        first, last = (date_range(part) for part in value.split('..', 1))
+        if first is None or last is None:
+            return None
+        return first[0], last[1]
+    for date_format in ('%Y-%m-%d', '%Y-%m', '%Y'):
+        try:
+            start = datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+        if date_format == '%Y-%m-%d':
+            return start, start + datetime.timedelta(days=1)
+        if date_format == '%Y-%m':
+            return start, (start + datetime.timedelta(days=32)).replace(day=1)
+        return start, start.replace(year=start.year + 1)
+    return None
+
+
+def like_pattern(value, mode):
+    # Шаблон ILIKE для подстроки или префикса: % и _ из строки поиска ищутся буквально
+    for character in LIKE_SPECIAL_CHARACTERS:
+        value = value.replace(character, '\\' + character)
+    return f"{value}%" if mode == PREFIX else f"%{value}%"
+
+
+def resolve_mode(data_type, mode=AUTO):
+    # Авто: подстрока для текста (триграммный GIN-индекс), точное совпадение для чисел и дат (B-tree)
+    if mode != AUTO:
+        return mode
+    return CONTAINS if column_kind(data_type) == 'text' else EXACT
+
+
+def search_condition(column, data_type, value, mode=AUTO, sql_module=sql):
+    # Возвращает условие WHERE (sql.Composed) и параметры к нему.
+    # Условия строятся так, чтобы их мог использовать индекс на колонке: без приведения к text.
+    # sql_module - модуль psycopg2.sql или psycopg.sql (асинхронный service.py), API у них одинаковый.
+    sql = sql_module
+    column_sql = sql.Identifier(column)
+    kind = column_kind(data_type)
+    mode = resolve_mode(data_type, mode)
+
+    if kind == 'text':
+        if mode == EXACT:
+            return sql.SQL("{} = %s").format(column_sql), (value,)
+        return sql.SQL("{} ILIKE %s").format(column_sql), (like_pattern(value, mode),)
+
+    if mode == EXACT:
+        if kind == 'date':
+            # Дата ищется как диапазон, чтобы работал индекс и по timestamp, а у секционированных
+            # таблиц планировщик отсекал секции за другие месяцы
+            bounds = date_range(value)
+            if bounds is not None:
+                return sql.SQL("{0} >= %s AND {0} < %s").format(column_sql), bounds
+            return sql.SQL("{0} >= %s::date AND {0} < %s::date + 1").format(column_sql), (value, value)
+        return sql.SQL("{} = %s").format(column_sql), (value,)
+
+    # Подстрока или префикс по нетекстовой колонке: индекс не используется
+    return sql.SQL("{}::text ILIKE %s").format(column_sql), (like_pattern(value, mode),)
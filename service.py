@@ -0,0 +1,771 @@
+import asyncio
+import datetime
+import json
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+import schema_migrations
+import search
+from catalog import CATALOG_CHANNEL, CATALOG_QUERY, SchemaCatalog
+from db_pool import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, SERVER_DB_NAME
+from instrumentation import MAX_PARAMS_LENGTH, MAX_STATEMENT_LENGTH, QueryRecord, query_log
+# Имя search внутри DatabaseService занято методом, поэтому режим по умолчанию импортируется отдельно
+from search import AUTO
+from statements import statement_cache
+from table_api import FIRST, TableBrowser, key_condition, key_values_query
+
+# Соединений в асинхронном пуле на одну базу: запросы всех клиентов делят их между собой
+SERVICE_POOL_SIZE = 4
+# Сколько запросов может выполняться одновременно; остальные ждут своей очереди
+MAX_CONCURRENT_REQUESTS = 64
+# Снимок базы - отдельная база-шаблон <база>__snapshot_<имя>
+SNAPSHOT_SEPARATOR = '__snapshot_'
+SNAPSHOT_NAME_PATTERN = re.compile(r'^[a-z0-9_]+$')
+# Предельная длина имени базы в PostgreSQL (NAMEDATALEN - 1)
+MAX_DATABASE_NAME_LENGTH = 63
+# Сколько строк удаляет одна пачка bulk_delete (дочерние строки удаляются каскадно вместе с ними)
+BULK_DELETE_BATCH_SIZE = 500
+# Пауза между пачками (секунды), чтобы массовое удаление не вытесняло остальную работу с базой
+BULK_DELETE_PAUSE = 0.05
+# Место остановки прерванного bulk_delete (миграция 0010): ключ - таблица и условие
+BULK_DELETE_CHECKPOINT_QUERY = """
+    SELECT last_key FROM maintenance.bulk_delete_checkpoints WHERE table_name = %s AND condition = %s
+"""
+CLEAR_BULK_DELETE_CHECKPOINT_QUERY = """
+    DELETE FROM maintenance.bulk_delete_checkpoints WHERE table_name = %s AND condition = %s
+"""
+# Сколько свободных репетиторов возвращает поиск по умолчанию
+AVAILABLE_TUTORS_LIMIT = 20
+
+# Репетиторы предмета без занятий, пересекающих интервал, по убыванию рейтинга. Проверка
+# занятости - поиск по GiST-индексу ограничения sessions_tutor_period_excl (tutor_id, period)
+AVAILABLE_TUTORS_QUERY = """
+    SELECT t.tutor_id, u.name || ' ' || u.surname AS tutor_name, t.rating, t.review_count
+    FROM TutorSubjects ts
+    JOIN Tutors t ON t.tutor_id = ts.tutor_id
+    JOIN Users u ON u.user_id = t.user_id
+    WHERE ts.subject_id = %(subject_id)s
+      AND NOT EXISTS (
+          SELECT 1 FROM Sessions s
+          WHERE s.tutor_id = ts.tutor_id AND s.period && tsrange(%(starts_at)s::timestamp, %(ends_at)s::timestamp)
+      )
+    ORDER BY t.rating DESC NULLS LAST, t.review_count DESC, t.tutor_id
+    LIMIT %(limit)s
+"""
+BOOK_SESSION_QUERY = """
+    INSERT INTO Sessions (tutor_id, subject_id, session_date, start_time, duration)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING session_id
+"""
+CONFLICTING_SESSION_QUERY = """
+    SELECT session_id, lower(period), upper(period) FROM Sessions
+    WHERE tutor_id = %s AND period && tsrange(%s::timestamp, %s::timestamp)
+    ORDER BY period
+    LIMIT 1
+"""
+
+# Внешние ключи из одной колонки с ON DELETE CASCADE: (дочерняя таблица, колонка, таблица, колонка)
+CASCADE_QUERY = """
+    SELECT child.relname, ca.attname, parent.relname, pa.attname
+    FROM pg_constraint f
+    JOIN pg_class child ON child.oid = f.conrelid
+    JOIN pg_class parent ON parent.oid = f.confrelid
+    JOIN pg_namespace n ON n.oid = child.relnamespace
+    JOIN pg_attribute ca ON ca.attrelid = f.conrelid AND ca.attnum = f.conkey[1]
+    JOIN pg_attribute pa ON pa.attrelid = f.confrelid AND pa.attnum = f.confkey[1]
+    WHERE f.contype = 'f' AND f.confdeltype = 'c' AND f.conparentid = 0
+      AND array_length(f.conkey, 1) = 1 AND n.nspname = 'public' AND NOT child.relispartition
+"""
+
+
+class QueryResult:
+    def __init__(self, columns, rows, rowcount):
+        self.columns = columns
+        self.rows = rows
+        self.rowcount = rowcount
+
+
+class DatabaseService:
+    """Асинхронный API операций с базой данных (asyncio, драйвер psycopg 3), не зависящий от интерфейса.
+
+    Все клиенты делят несколько соединений из AsyncConnectionPool на каждую базу, а число
+    одновременно выполняемых запросов ограничено семафором. Независимые запросы можно
+    отправить одним пакетом через pipeline(). Метаданные берутся из SchemaCatalog, который
+    заполняется запросом CATALOG_QUERY и сбрасывается по уведомлению CATALOG_CHANNEL.
+    """
+
+    def __init__(self, pool_size=SERVICE_POOL_SIZE, max_concurrency=MAX_CONCURRENT_REQUESTS, **connect_kwargs):
+        self.pool_size = pool_size
+        self.connect_kwargs = connect_kwargs or dict(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._pools = {}
+        self._catalogs = {}
+        self._watchers = {}
+        self._pools_lock = asyncio.Lock()
+
+    def _conninfo(self, dbname):
+        return make_conninfo(dbname=dbname, **self.connect_kwargs)
+
+    async def _get_pool(self, dbname):
+        async with self._pools_lock:
+            pool = self._pools.get(dbname)
+            if pool is None:
+                pool = AsyncConnectionPool(self._conninfo(dbname), min_size=1, max_size=self.pool_size,
+                                           kwargs={'autocommit': True}, open=False)
+                await pool.open()
+                self._pools[dbname] = pool
+                if dbname != SERVER_DB_NAME:
+                    self._watchers[dbname] = asyncio.create_task(self._watch_schema(dbname))
+            return pool
+
+    @asynccontextmanager
+    async def connection(self, dbname=DB_NAME):
+        async with self._limit:
+            pool = await self._get_pool(dbname)
+            async with pool.connection() as connection:
+                try:
+                    yield connection
+                except asyncio.CancelledError:
+                    # Отмена на стороне клиента прерывает и запрос на сервере
+                    connection.cancel()
+                    raise
+
+    async def _watch_schema(self, dbname):
+        # Отдельное соединение слушает CATALOG_CHANNEL и сбрасывает кэш метаданных базы
+        try:
+            async with await psycopg.AsyncConnection.connect(self._conninfo(dbname), autocommit=True) as connection:
+                await connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(CATALOG_CHANNEL)))
+                async for _ in connection.notifies():
+                    self._catalogs.pop(dbname, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print('Не удалось подписаться на изменения схемы:', e)
+
+    async def close_database(self, dbname):
+        # Закрывает соединения сервиса с базой, например перед DROP DATABASE
+        watcher = self._watchers.pop(dbname, None)
+        if watcher is not None:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+        pool = self._pools.pop(dbname, None)
+        if pool is not None:
+            await pool.close()
+        self._catalogs.pop(dbname, None)
+
+    async def close(self):
+        for dbname in list(self._pools):
+            await self.close_database(dbname)
+
+    def _statement_text(self, connection, query):
+        return query.as_string(connection) if isinstance(query, sql.Composable) else str(query)
+
+    def _record(self, connection, statement, params, started, rows=None, error=None, explain=None):
+        # Запросы сервиса попадают в тот же журнал, что и запросы пула psycopg2 (instrumentation.py).
+        # explain - пара (текст, параметры) для плана медленного запроса: EXPLAIN выполняет фоновый
+        # поток журнала, параметры подставляет psycopg2
+        duration = time.perf_counter() - started
+        explain_statement = explain_params = None
+        if explain is not None and error is None and query_log.should_explain(duration):
+            explain_statement, explain_params = explain
+            explain_statement = explain_statement.strip().rstrip(';').strip()
+        query_log.record(QueryRecord(
+            statement[:MAX_STATEMENT_LENGTH], repr(params)[:MAX_PARAMS_LENGTH] if params is not None else None,
+            duration, rows, str(error).strip() if error is not None else None,
+            None, connection.info.dbname
+        ), explain_statement, explain_params)
+
+    async def _execute(self, connection, query, params=None, fetch=False):
+        started = time.perf_counter()
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, params)
+                has_rows = cursor.description is not None
+                columns = [column.name for column in cursor.description] if has_rows else []
+                rows = await cursor.fetchall() if fetch and has_rows else []
+                result = QueryResult(columns, rows, cursor.rowcount)
+        except Exception as e:
+            self._record(connection, self._statement_text(connection, query), params, started, error=e)
+            raise
+        statement = self._statement_text(connection, query)
+        self._record(connection, statement, params, started, result.rowcount, explain=(statement, params))
+        return result
+
+    async def _execute_prepared(self, connection, operation, table, columns, query, params, catalog):
+        # Запрос к таблице через подготовленный на соединении план (statements.py); в журнал
+        # попадает исходный текст, а не EXECUTE
+        started = time.perf_counter()
+        statement = self._statement_text(connection, query)
+        try:
+            async with connection.cursor() as cursor:
+                await statement_cache.execute_async(cursor, operation, table, columns, query, params, catalog)
+                result = QueryResult([column.name for column in cursor.description], await cursor.fetchall(),
+                                     cursor.rowcount)
+        except Exception as e:
+            self._record(connection, statement, params, started, error=e)
+            raise
+        self._record(connection, statement, params, started, result.rowcount, explain=(statement, params))
+        return result
+
+    async def execute(self, query, params=None, dbname=DB_NAME, fetch=False):
+        async with self.connection(dbname) as connection:
+            return await self._execute(connection, query, params, fetch)
+
+    async def pipeline(self, statements, dbname=DB_NAME):
+        """Выполняет независимые запросы одним пакетом (pipeline mode) и возвращает их результаты.
+
+        Запросы уходят на сервер, не дожидаясь ответов на предыдущие, поэтому N запросов
+        стоят примерно одного сетевого обмена.
+        """
+        statements = list(statements)
+        async with self.connection(dbname) as connection:
+            text = ";\n".join(self._statement_text(connection, query) for query, _ in statements)
+            started = time.perf_counter()
+            cursors = []
+            try:
+                async with connection.pipeline():
+                    for query, params in statements:
+                        cursor = connection.cursor()
+                        await cursor.execute(query, params)
+                        cursors.append(cursor)
+                results = []
+                for cursor in cursors:
+                    has_rows = cursor.description is not None
+                    results.append(QueryResult(
+                        [column.name for column in cursor.description] if has_rows else [],
+                        await cursor.fetchall() if has_rows else [],
+                        cursor.rowcount
+                    ))
+                    await cursor.close()
+            except Exception as e:
+                self._record(connection, text, None, started, error=e)
+                raise
+            self._record(connection, text, None, started, sum(max(result.rowcount, 0) for result in results))
+        return results
+
+    async def catalog(self, dbname=DB_NAME):
+        catalog = self._catalogs.get(dbname)
+        if catalog is None:
+            result = await self.execute(CATALOG_QUERY, dbname=dbname, fetch=True)
+            catalog = self._catalogs[dbname] = SchemaCatalog(dbname).load_rows(result.rows)
+        return catalog
+
+    def invalidate_catalog(self, dbname=None):
+        if dbname is None:
+            self._catalogs.clear()
+        else:
+            self._catalogs.pop(dbname, None)
+
+    async def _table(self, table, dbname):
+        catalog = await self.catalog(dbname)
+        table = table.lower()
+        if not catalog.has_table(table):
+            raise ValueError(f"Таблица {table} не найдена")
+        return catalog, table
+
+    # Базы данных
+
+    async def create_database(self, dbname=DB_NAME, progress=None):
+        # Создает пустую базу данных, если ее еще нет; возвращает True, если база создана
+        if await self._database_exists(dbname):
+            return False
+        if progress:
+            progress("Создание базы данных...")
+        await self.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(dbname)), dbname=SERVER_DB_NAME)
+        return True
+
+    async def migrate(self, dbname=DB_NAME, progress=None):
+        """Применяет недостающие миграции; возвращает список примененных.
+
+        Выполняет schema_migrations.migrate (тот же код, что и у командной строки) на отдельном
+        синхронном соединении psycopg в потоке, чтобы не занимать цикл событий.
+        """
+        def run():
+            with psycopg.connect(self._conninfo(dbname)) as connection:
+                return schema_migrations.migrate(connection, progress=progress)
+
+        applied = await asyncio.to_thread(run)
+        self.invalidate_catalog(dbname)
+        return applied
+
+    async def delete_database(self, dbname=DB_NAME, progress=None):
+        if progress:
+            progress("Удаление старой базы данных...")
+        await self.terminate_sessions(dbname)
+        await self.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(dbname)),
+                           dbname=SERVER_DB_NAME)
+
+    async def terminate_sessions(self, dbname):
+        # Закрывает свои соединения и обрывает чужие: иначе базу нельзя удалить или скопировать
+        await self.close_database(dbname)
+        await self.execute("""
+            SELECT pg_terminate_backend(pid)
+            FROM pg_stat_activity
+            WHERE datname = %s AND pid <> pg_backend_pid()
+        """, (dbname,), dbname=SERVER_DB_NAME)
+
+    async def _database_exists(self, dbname):
+        result = await self.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,),
+                                    dbname=SERVER_DB_NAME, fetch=True)
+        return bool(result.rows)
+
+    # Снимки
+
+    def snapshot_database(self, name, dbname=DB_NAME):
+        name = name.strip().lower()
+        if not SNAPSHOT_NAME_PATTERN.match(name):
+            raise ValueError("Имя снимка может содержать только латинские буквы, цифры и _")
+        snapshot = dbname + SNAPSHOT_SEPARATOR + name
+        if len(snapshot.encode('utf-8')) > MAX_DATABASE_NAME_LENGTH:
+            raise ValueError(f"Слишком длинное имя снимка: {name}")
+        return snapshot
+
+    async def create_snapshot(self, name, dbname=DB_NAME, replace=False, progress=None):
+        """Сохраняет текущее состояние базы как базу-шаблон.
+
+        CREATE DATABASE ... TEMPLATE копирует файлы базы целиком, поэтому снимок создается
+        за время копирования на диске, а не загрузки строк. Сеансы базы при этом обрываются.
+        """
+        snapshot = self.snapshot_database(name, dbname)
+        if await self._database_exists(snapshot):
+            if not replace:
+                raise ValueError(f"Снимок {name} уже существует")
+            await self.delete_snapshot(name, dbname)
+        if progress:
+            progress(f"Сохранение снимка {name}...")
+        await self.terminate_sessions(dbname)
+        await self.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+            sql.Identifier(snapshot), sql.Identifier(dbname)), dbname=SERVER_DB_NAME)
+        # К снимку никто не подключается: иначе из него нельзя будет восстановить базу
+        await self.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false").format(
+            sql.Identifier(snapshot)), dbname=SERVER_DB_NAME)
+        await self.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(
+            sql.Identifier(snapshot), sql.Literal(datetime.datetime.now().isoformat(timespec='seconds'))),
+            dbname=SERVER_DB_NAME)
+
+    async def list_snapshots(self, dbname=DB_NAME):
+        # [(имя, размер в байтах, время создания)] снимков базы
+        prefix = dbname + SNAPSHOT_SEPARATOR
+        result = await self.execute("""
+            SELECT substr(datname, %s), pg_database_size(oid), shobj_description(oid, 'pg_database')
+            FROM pg_database
+            WHERE left(datname, %s) = %s
+            ORDER BY datname
+        """, (len(prefix) + 1, len(prefix), prefix), dbname=SERVER_DB_NAME, fetch=True)
+        return result.rows
+
+    async def restore_snapshot(self, name, dbname=DB_NAME, progress=None):
+        """Заменяет базу копией снимка.
+
+        Копия сначала создается под временным именем, поэтому при ошибке текущая база не теряется.
+        Схема снимка может быть старше файлов миграций: после восстановления нужен migrate().
+        """
+        snapshot = self.snapshot_database(name, dbname)
+        if not await self._database_exists(snapshot):
+            raise ValueError(f"Снимок {name} не найден")
+        restoring = (dbname + '__restoring')[:MAX_DATABASE_NAME_LENGTH]
+        if progress:
+            progress(f"Восстановление из снимка {name}...")
+        await self.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(restoring)),
+                           dbname=SERVER_DB_NAME)
+        await self.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+            sql.Identifier(restoring), sql.Identifier(snapshot)), dbname=SERVER_DB_NAME)
+        if progress:
+            progress("Замена базы данных...")
+        await self.delete_database(dbname)
+        await self.execute(sql.SQL("ALTER DATABASE {} RENAME TO {}").format(
+            sql.Identifier(restoring), sql.Identifier(dbname)), dbname=SERVER_DB_NAME)
+        self.invalidate_catalog(dbname)
+
+    async def delete_snapshot(self, name, dbname=DB_NAME):
+        snapshot = self.snapshot_database(name, dbname)
+        if not await self._database_exists(snapshot):
+            raise ValueError(f"Снимок {name} не найден")
+        # Базу-шаблон нельзя удалить, пока с нее не снят признак шаблона
+        await self.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE false").format(sql.Identifier(snapshot)),
+                           dbname=SERVER_DB_NAME)
+        await self.execute(sql.SQL("DROP DATABASE {}").format(sql.Identifier(snapshot)), dbname=SERVER_DB_NAME)
+
+    # Таблицы и записи
+
+    async def list_tables(self, dbname=DB_NAME, include_views=True):
+        return (await self.catalog(dbname)).tables(include_views)
+
+    async def row_counts(self, tables=None, dbname=DB_NAME):
+        # Число строк во всех таблицах одним пакетом запросов
+        if tables is None:
+            tables = await self.list_tables(dbname, include_views=False)
+        results = await self.pipeline(
+            [(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table)), None) for table in tables], dbname)
+        return {table: result.rows[0][0] for table, result in zip(tables, results)}
+
+    async def _browser(self, table, order_by, descending, filters, key, dbname):
+        catalog, table = await self._table(table, dbname)
+        browser = TableBrowser(table, key=key, catalog=catalog, sql_module=sql)
+        browser.set_order(order_by, descending)
+        browser.set_filters(filters)
+        return browser
+
+    async def browse(self, table, direction=FIRST, page=None, order_by=None, descending=False, filters=(),
+                     key=None, dbname=DB_NAME):
+        """Страница строк с пагинацией по ключу (TableBrowser из table_api.py).
+
+        direction - FIRST, NEXT или PREVIOUS относительно page; filters - список
+        (колонка, значение, режим поиска). Страницы одной формы выполняются по плану,
+        подготовленному на соединении (statement_cache).
+        """
+        browser = await self._browser(table, order_by, descending, filters, key, dbname)
+        operation, columns = browser.statement_key()
+        async with self.connection(dbname) as connection:
+            direction, query, params = browser.page_query(direction, page)
+            result = await self._execute_prepared(connection, operation, browser.table, columns, query, params,
+                                                  browser.catalog)
+            new_page = browser.make_page(direction, page, result.columns, result.rows)
+            if new_page is None:
+                direction, query, params = browser.page_query(FIRST)
+                result = await self._execute_prepared(connection, operation, browser.table, columns, query, params,
+                                                      browser.catalog)
+                new_page = browser.make_page(direction, None, result.columns, result.rows)
+        return new_page
+
+    async def search(self, table, column, value, mode=AUTO, direction=FIRST, page=None, dbname=DB_NAME):
+        return await self.browse(table, direction, page, filters=[(column, value, mode)], dbname=dbname)
+
+    async def changed_rows(self, table, keys, filters=(), dbname=DB_NAME):
+        """Строки с ключами из уведомления, которые проходят фильтры: (колонки, строки, ключи).
+
+        Ключи возвращаются кортежами значений с типами колонок (в уведомлении даты приходят
+        строками), чтобы клиент мог найти у себя старые версии строк.
+        """
+        browser = await self._browser(table, None, False, filters, None, dbname)
+        operation, columns = browser.statement_key('changed')
+        keys_query, keys_params = key_values_query(browser.key, browser.catalog.column_types(browser.table), keys, sql)
+        query, params = browser.rows_query(keys)
+        async with self.connection(dbname) as connection:
+            typed_keys = await self._execute_prepared(connection, 'changed_keys', browser.table, browser.key,
+                                                      keys_query, keys_params, browser.catalog)
+            rows = await self._execute_prepared(connection, operation, browser.table, columns, query, params,
+                                                browser.catalog)
+        return rows.columns, rows.rows, [tuple(key) for key in typed_keys.rows]
+
+    async def add_records(self, table, columns, rows, dbname=DB_NAME):
+        """Вставляет строки в одной транзакции и возвращает значения первичного ключа.
+
+        Значения приводятся к типам колонок из каталога. Колонки, пустые (None) во всех строках,
+        не передаются, чтобы сработали значения по умолчанию. Строки уходят пакетом (executemany
+        использует pipeline mode).
+        """
+        catalog, table = await self._table(table, dbname)
+        column_types = catalog.column_types(table)
+        unknown = [column for column in columns if column not in column_types]
+        if unknown:
+            raise ValueError(f"Колонки не найдены в таблице {table}: {', '.join(unknown)}")
+        if not rows:
+            return []
+
+        keep = [index for index in range(len(columns)) if any(row[index] is not None for row in rows)]
+        if not keep:
+            raise ValueError("Нет значений для вставки")
+        kept_columns = [columns[index] for index in keep]
+
+        primary_key = catalog.primary_key(table)
+        query = sql.SQL("INSERT INTO {} ({}) VALUES ({}){}").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(sql.Identifier(column) for column in kept_columns),
+            # Тип берется из pg_catalog (format_type), а не из пользовательского ввода
+            sql.SQL(", ").join(sql.SQL("%s::" + column_types[column]) for column in kept_columns),
+            sql.SQL(" RETURNING {}").format(sql.SQL(", ").join(sql.Identifier(column) for column in primary_key))
+            if primary_key else sql.SQL("")
+        )
+        values = [[row[index] for index in keep] for row in rows]
+
+        keys = []
+        async with self.connection(dbname) as connection:
+            started = time.perf_counter()
+            statement = self._statement_text(connection, query)
+            try:
+                async with connection.transaction():
+                    async with connection.cursor() as cursor:
+                        await cursor.executemany(query, values, returning=bool(primary_key))
+                        if primary_key:
+                            while True:
+                                row = await cursor.fetchone()
+                                keys.append(row if len(primary_key) > 1 else row[0])
+                                if not cursor.nextset():
+                                    break
+            except Exception as e:
+                self._record(connection, statement, f"{len(values)} строк", started, error=e)
+                raise
+            # План вставки снимается для первой строки пакета
+            self._record(connection, statement, f"{len(values)} строк", started, len(values),
+                         explain=(statement, values[0]))
+        return keys
+
+    async def delete_by_pk(self, table, keys, dbname=DB_NAME):
+        # Удаляет строки с указанными значениями первичного ключа (кортежи для составного ключа);
+        # возвращает число удаленных строк
+        catalog, table = await self._table(table, dbname)
+        primary_key = catalog.primary_key(table)
+        if not primary_key:
+            raise ValueError(f"Не удалось определить первичный ключ таблицы {table}")
+        condition, params = key_condition(primary_key, catalog.column_types(table), keys, sql)
+        query = sql.SQL("DELETE FROM {} WHERE {}").format(sql.Identifier(table), condition)
+        result = await self.execute(query, params, dbname)
+        return result.rowcount
+
+    async def _search_condition(self, table, column, value, mode, dbname):
+        catalog, table = await self._table(table, dbname)
+        column_types = catalog.column_types(table)
+        if column not in column_types:
+            raise ValueError(f"Колонка {column} не найдена в таблице {table}")
+        condition, params = search.search_condition(column, column_types[column], value, mode, sql_module=sql)
+        return catalog, table, condition, list(params)
+
+    async def delete_by_condition(self, table, column, value, mode=AUTO, dbname=DB_NAME):
+        # Удаляет строки, которые нашел бы search() с теми же параметрами, одной командой
+        _, table, condition, params = await self._search_condition(table, column, value, mode, dbname)
+        query = sql.SQL("DELETE FROM {} WHERE {}").format(sql.Identifier(table), condition)
+        result = await self.execute(query, params, dbname)
+        return result.rowcount
+
+    async def delete_impact(self, table, column, value, mode=AUTO, dbname=DB_NAME):
+        """Сколько строк удалит условие: [(таблица, строк)], первой идет сама таблица.
+
+        Учитываются дочерние таблицы со ссылками ON DELETE CASCADE по всем путям каскада
+        (например, отзывы удаляются и вместе с занятием, и вместе со студентом).
+        Все подсчеты отправляются одним пакетом.
+        """
+        _, table, condition, params = await self._search_condition(table, column, value, mode, dbname)
+        edges = (await self.execute(CASCADE_QUERY, dbname=dbname, fetch=True)).rows
+        conditions = {table: (condition, params)}
+        for child in _cascade_order(table, edges):
+            parts, child_params = [], []
+            for child_table, child_column, parent_table, parent_column in edges:
+                if child_table == child and parent_table in conditions and parent_table != child:
+                    parent_condition, parent_params = conditions[parent_table]
+                    parts.append(sql.SQL("{} IN (SELECT {} FROM {} WHERE {})").format(
+                        sql.Identifier(child_column), sql.Identifier(parent_column),
+                        sql.Identifier(parent_table), parent_condition))
+                    child_params += parent_params
+            conditions[child] = (sql.SQL(" OR ").join(parts), child_params)
+
+        results = await self.pipeline(
+            [(sql.SQL("SELECT count(*) FROM {} WHERE {}").format(sql.Identifier(name), condition), params)
+             for name, (condition, params) in conditions.items()], dbname)
+        return [(name, result.rows[0][0]) for name, result in zip(conditions, results)]
+
+    async def bulk_delete(self, table, column, value, mode=AUTO, batch_size=BULK_DELETE_BATCH_SIZE,
+                          pause=BULK_DELETE_PAUSE, dbname=DB_NAME, progress=None):
+        """Удаляет строки по условию пачками в порядке первичного ключа; возвращает число удаленных строк.
+
+        Каждая пачка - отдельная транзакция, поэтому блокировки (в том числе каскадные) и объем WAL
+        ограничены одной пачкой; между пачками - пауза pause секунд. Вместе с пачкой в таблице
+        maintenance.bulk_delete_checkpoints сохраняется последний удаленный ключ: после отмены,
+        ошибки или перезапуска повторный вызов с тем же условием продолжает с него, а затем
+        проходит условие с начала, чтобы удалить строки перед ключом, появившиеся после остановки.
+        """
+        if batch_size < 1:
+            raise ValueError("Размер пачки должен быть положительным")
+        if pause < 0:
+            raise ValueError("Пауза между пачками не может быть отрицательной")
+        catalog, table, condition, params = await self._search_condition(table, column, value, mode, dbname)
+        primary_key = catalog.primary_key(table)
+        if not primary_key:
+            raise ValueError(f"Не удалось определить первичный ключ таблицы {table}")
+        column_types = catalog.column_types(table)
+
+        # Составной ключ сравнивается как строка значений: (a, b) > (%s, %s). Сохраненный ключ
+        # хранится текстом и приводится к типам колонок на сервере
+        pk = sql.SQL("({})").format(sql.SQL(", ").join(sql.Identifier(column) for column in primary_key))
+        key_placeholders = sql.SQL("({})").format(sql.SQL(", ").join(
+            # Тип берется из pg_catalog (format_type), а не из пользовательского ввода
+            sql.SQL("%s::" + column_types[column]) for column in primary_key))
+        columns = sql.SQL(", ").join(sql.Identifier(column) for column in primary_key)
+        checkpoint = [table, json.dumps([column, value, mode], ensure_ascii=False, default=str)]
+        result = await self.execute(BULK_DELETE_CHECKPOINT_QUERY, checkpoint, dbname, fetch=True)
+        last_key = result.rows[0][0] if result.rows else None
+        resumed = last_key is not None
+
+        def batch_condition():
+            # Ключ после последней удаленной строки: поиск не проходит заново по уже удаленному началу
+            if last_key is None:
+                return sql.SQL("({})").format(condition), params
+            return sql.SQL("({}) AND {} > {}").format(condition, pk, key_placeholders), params + list(last_key)
+
+        total = (await self.execute(
+            sql.SQL("SELECT count(*) FROM {} WHERE {}").format(sql.Identifier(table), condition),
+            params, dbname, fetch=True)).rows[0][0]
+        deleted = 0
+        while deleted < total:
+            where, where_params = batch_condition()
+            # Пачка и место остановки фиксируются одной командой
+            query = sql.SQL("""
+                WITH deleted AS (
+                    DELETE FROM {table} WHERE {pk} IN
+                        (SELECT {columns} FROM {table} WHERE {where} ORDER BY {columns} LIMIT %s)
+                    RETURNING {columns}
+                ), checkpoint AS (
+                    INSERT INTO maintenance.bulk_delete_checkpoints (table_name, condition, last_key)
+                    SELECT %s, %s, ARRAY[{text_columns}] FROM deleted ORDER BY {descending} LIMIT 1
+                    ON CONFLICT (table_name, condition)
+                    DO UPDATE SET last_key = EXCLUDED.last_key, updated_at = CURRENT_TIMESTAMP
+                    RETURNING last_key
+                )
+                SELECT (SELECT count(*) FROM deleted), (SELECT last_key FROM checkpoint)
+            """).format(
+                table=sql.Identifier(table), pk=pk, where=where, columns=columns,
+                text_columns=sql.SQL(", ").join(sql.SQL("{}::text").format(sql.Identifier(column))
+                                                for column in primary_key),
+                descending=sql.SQL(", ").join(sql.SQL("{} DESC").format(sql.Identifier(column))
+                                              for column in primary_key))
+            count, key = (await self.execute(query, where_params + [batch_size] + checkpoint, dbname,
+                                             fetch=True)).rows[0]
+            if count:
+                deleted += count
+                last_key = key
+                if progress:
+                    progress(f"Удалено записей: {deleted} из {total}")
+            if count < batch_size:
+                if not resumed:
+                    break
+                # Хвост после сохраненного ключа удален; строки перед ним могли появиться после остановки
+                resumed = False
+                last_key = None
+                continue
+            await asyncio.sleep(pause)
+
+        await self.execute(CLEAR_BULK_DELETE_CHECKPOINT_QUERY, checkpoint, dbname)
+        return deleted
+
+    async def clear_table(self, table, dbname=DB_NAME):
+        _, table = await self._table(table, dbname)
+        await self.execute("CALL clear_table_proc(%s)", (table,), dbname)
+
+    async def clear_all_tables(self, dbname=DB_NAME):
+        await self.execute("CALL clear_all_tables_proc()", dbname=dbname)
+
+    # Расписание занятий
+
+    async def list_subjects(self, dbname=DB_NAME):
+        result = await self.execute("SELECT subject_id, title, level FROM Subjects ORDER BY title", dbname=dbname,
+                                    fetch=True)
+        return result.rows
+
+    async def available_tutors(self, subject_id, starts_at, duration, limit=AVAILABLE_TUTORS_LIMIT, dbname=DB_NAME):
+        """Репетиторы предмета, свободные с starts_at в течение duration минут.
+
+        Строки (tutor_id, имя, рейтинг, число отзывов) по убыванию рейтинга.
+        """
+        if duration <= 0:
+            raise ValueError("Длительность занятия должна быть больше нуля")
+        params = {'subject_id': subject_id, 'starts_at': starts_at,
+                  'ends_at': starts_at + datetime.timedelta(minutes=duration), 'limit': limit}
+        result = await self.execute(AVAILABLE_TUTORS_QUERY, params, dbname, fetch=True)
+        return result.rows
+
+    async def book_session(self, tutor_id, subject_id, starts_at, duration, dbname=DB_NAME):
+        # Записывает занятие и возвращает его session_id; пересечение с занятиями репетитора
+        # отклоняет ограничение-исключение, даже если два клиента записывают одновременно
+        if duration <= 0:
+            raise ValueError("Длительность занятия должна быть больше нуля")
+        ends_at = starts_at + datetime.timedelta(minutes=duration)
+        try:
+            result = await self.execute(BOOK_SESSION_QUERY, (
+                tutor_id, subject_id, starts_at.date(), starts_at.time(), duration), dbname, fetch=True)
+        except psycopg.errors.ExclusionViolation:
+            conflict = await self.execute(CONFLICTING_SESSION_QUERY, (tutor_id, starts_at, ends_at), dbname,
+                                          fetch=True)
+            if conflict.rows:
+                session_id, begins, ends = conflict.rows[0]
+                raise ValueError(f"Репетитор {tutor_id} занят: занятие {session_id} "
+                                 f"с {begins:%Y-%m-%d %H:%M} до {ends:%H:%M}")
+            raise ValueError(f"Репетитор {tutor_id} занят в это время")
+        return result.rows[0][0]
+
+
+def _cascade_order(root, edges):
+    # Таблицы, до которых доходит каскадное удаление из root, в порядке "родители раньше детей"
+    parents = {}
+    for child, _, parent, _ in edges:
+        if child != parent:
+            parents.setdefault(child, set()).add(parent)
+
+    reached = {root}
+    changed = True
+    while changed:
+        changed = False
+        for child, child_parents in parents.items():
+            if child not in reached and child_parents & reached:
+                reached.add(child)
+                changed = True
+
+    order = []
+    done = {root}
+    pending = reached - done
+    while pending:
+        ready = sorted(table for table in pending if parents.get(table, set()) & reached <= done)
+        if not ready:
+            # Циклические ссылки: оставшиеся таблицы не учитываются
+            break
+        order += ready
+        done.update(ready)
+        pending -= set(ready)
+    return order
+
+
+async def _create_service():
+    # Семафор и блокировки сервиса создаются внутри цикла, в котором будут работать
+    return DatabaseService()
+
+
+class ServiceRunner:
+    """Цикл asyncio в отдельном потоке для синхронных клиентов (окна Qt, скрипты).
+
+    submit() ставит корутину в цикл и возвращает concurrent.futures.Future, поэтому вызовы
+    из разных потоков делят один DatabaseService и его пулы соединений.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="database-service", daemon=True)
+        self.thread.start()
+        self.service = self.submit(_create_service()).result()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, method, *args, **kwargs):
+        return self.submit(getattr(self.service, method)(*args, **kwargs)).result()
+
+    def close(self):
+        self.submit(self.service.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ServiceRunner()
+        return _runner
+
+
+def close_runner():
+    global _runner
+    with _runner_lock:
+        runner, _runner = _runner, None
+    if runner is not None:
+        runner.close()
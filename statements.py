@@ -0,0 +1,193 @@
+import collections
+import itertools
+import re
+import threading
+
+from psycopg2 import errors, sql
+
+from catalog import schema_catalog
+
+try:
+    import psycopg
+    import psycopg.errors
+    import psycopg.sql
+except ImportError:  # psycopg 3 нужен только для асинхронного сервиса (service.py)
+    psycopg = None
+
+# Сколько подготовленных запросов держится на одном соединении; самые давние освобождаются DEALLOCATE
+MAX_PREPARED_PER_CONNECTION = 64
+# Для скольких соединений хранится список подготовленных запросов (соединения пула пересоздаются)
+MAX_TRACKED_CONNECTIONS = 32
+# Плейсхолдеры psycopg2 и psycopg 3 в тексте запроса: %s -> $1, $2, ...; %% -> %
+PLACEHOLDER_PATTERN = re.compile(r'%([s%])')
+# Имя подготовленного запроса: <операция>_<таблица>_<номер>, не длиннее NAMEDATALEN - 1
+MAX_STATEMENT_NAME_LENGTH = 63
+
+
+class ConnectionStatements:
+    def __init__(self, catalog_version):
+        # Версия каталога, для которой подготовлены запросы; при изменении схемы они освобождаются
+        self.catalog_version = catalog_version
+        # (операция, таблица, текст) -> имя подготовленного запроса, в порядке использования
+        self.names = collections.OrderedDict()
+
+
+def server_text(query, connection):
+    """Текст запроса с плейсхолдерами $1..$n для PREPARE и число параметров."""
+    text = query if isinstance(query, str) else query.as_string(connection)
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(1) == '%':
+            return '%'
+        count += 1
+        return f"${count}"
+
+    return PLACEHOLDER_PATTERN.sub(replace, text), count
+
+
+class StatementCache:
+    """Запросы к таблицам, подготовленные на сервере (PREPARE) один раз на соединение.
+
+    Запрос описывается операцией, таблицей и колонками, которые в нем участвуют: они проверяются
+    по каталогу схемы до отправки на сервер, а сам текст строит вызывающий код. Повторный запрос
+    той же формы выполняется через EXECUTE готового плана, без разбора и планирования. На каждом
+    соединении хранится не больше max_prepared запросов (давно не использованные освобождаются
+    DEALLOCATE), а после изменения схемы (новая версия каталога) запросы соединения освобождаются
+    и готовятся заново. execute работает с курсором psycopg2, execute_async - с асинхронным
+    курсором psycopg 3 (service.py).
+    """
+
+    def __init__(self, max_prepared=MAX_PREPARED_PER_CONNECTION, max_connections=MAX_TRACKED_CONNECTIONS):
+        self.max_prepared = max_prepared
+        self.max_connections = max_connections
+        self._connections = collections.OrderedDict()
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def validate(self, table, columns=(), catalog=None):
+        catalog = catalog or schema_catalog
+        table = table.lower()
+        if not catalog.has_table(table):
+            raise ValueError(f"Таблица {table} не найдена")
+        known = set(catalog.column_names(table))
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f"Колонки не найдены в таблице {table}: {', '.join(unknown)}")
+        return table
+
+    def execute(self, cursor, operation, table, columns, query, params=(), catalog=None):
+        """Выполняет query (sql.Composed с плейсхолдерами %s) как подготовленный запрос."""
+        catalog = catalog or schema_catalog
+        statements, key, count, params = self._lookup(cursor.connection, operation, table, columns, query, params,
+                                                      catalog)
+        try:
+            for command in self._prepare(statements, key, catalog.version, sql):
+                cursor.execute(command)
+        except Exception:
+            # Запрос не подготовлен (например, ошибка в тексте): следующий вызов попробует снова
+            statements.names.pop(key, None)
+            raise
+        try:
+            cursor.execute(self._execute_query(statements.names[key], count), params)
+        except errors.FeatureNotSupported:
+            if not cursor.connection.autocommit:
+                raise
+            for command in self._reprepare(statements, key, sql):
+                cursor.execute(command)
+            cursor.execute(self._execute_query(statements.names[key], count), params)
+
+    async def execute_async(self, cursor, operation, table, columns, query, params, catalog):
+        """То же для асинхронного курсора psycopg 3 (query - psycopg.sql.Composed)."""
+        statements, key, count, params = self._lookup(cursor.connection, operation, table, columns, query, params,
+                                                      catalog)
+        try:
+            for command in self._prepare(statements, key, catalog.version, psycopg.sql):
+                await cursor.execute(command)
+        except Exception:
+            statements.names.pop(key, None)
+            raise
+        # psycopg 3 передает параметры отдельно от текста, а параметры EXECUTE так передать нельзя:
+        # они подставляются в текст литералами
+        execute_query = self._execute_literals(statements.names[key], params)
+        try:
+            await cursor.execute(execute_query)
+        except psycopg.errors.FeatureNotSupported:
+            if not cursor.connection.autocommit:
+                raise
+            for command in self._reprepare(statements, key, psycopg.sql):
+                await cursor.execute(command)
+            await cursor.execute(self._execute_literals(statements.names[key], params))
+
+    def _lookup(self, connection, operation, table, columns, query, params, catalog):
+        table = self.validate(table, columns, catalog)
+        params = list(params)
+        text, count = server_text(query, connection)
+        if count != len(params):
+            raise ValueError(f"Запросу нужно параметров: {count}, передано: {len(params)}")
+        return self._statements(connection, catalog.version), (operation, table, text), count, params
+
+    def _statements(self, connection, version):
+        # Номер серверного процесса отличает новое соединение, созданное на месте закрытого
+        state_key = (id(connection), connection.info.backend_pid)
+        with self._lock:
+            statements = self._connections.get(state_key)
+            if statements is None:
+                statements = self._connections[state_key] = ConnectionStatements(version)
+            self._connections.move_to_end(state_key)
+            while len(self._connections) > self.max_connections:
+                self._connections.popitem(last=False)
+        return statements
+
+    def _prepare(self, statements, key, version, sql_module):
+        """Команды, после которых запрос key подготовлен на соединении (список может быть пуст).
+
+        Соединение используется одним потоком (или одной задачей), поэтому его список меняется
+        без общей блокировки.
+        """
+        commands = []
+        if statements.catalog_version != version:
+            if statements.names:
+                commands.append(sql_module.SQL("DEALLOCATE ALL"))
+                statements.names.clear()
+            statements.catalog_version = version
+
+        name = statements.names.get(key)
+        if name is not None:
+            statements.names.move_to_end(key)
+            return commands
+
+        while len(statements.names) >= self.max_prepared:
+            _, evicted = statements.names.popitem(last=False)
+            commands.append(sql_module.SQL("DEALLOCATE {}").format(sql_module.Identifier(evicted)))
+
+        operation, table, text = key
+        number = str(next(self._numbers))
+        prefix = f"{operation}_{table}"[:MAX_STATEMENT_NAME_LENGTH - len(number) - 1]
+        name = f"{prefix}_{number}"
+        # Текст уже без плейсхолдеров драйвера, поэтому % в нем не экранируется
+        commands.append(sql_module.SQL("PREPARE {} AS ").format(sql_module.Identifier(name)) + sql_module.SQL(text))
+        statements.names[key] = name
+        return commands
+
+    def _reprepare(self, statements, key, sql_module):
+        # "cached plan must not change result type": таблицу изменили после PREPARE,
+        # а уведомление об изменении схемы еще не пришло. В транзакции повторять нельзя.
+        name = statements.names.pop(key)
+        return [sql_module.SQL("DEALLOCATE {}").format(sql_module.Identifier(name)),
+                *self._prepare(statements, key, statements.catalog_version, sql_module)]
+
+    def _execute_query(self, name, count):
+        if not count:
+            return sql.SQL("EXECUTE {}").format(sql.Identifier(name))
+        return sql.SQL("EXECUTE {} ({})").format(sql.Identifier(name), sql.SQL(", ").join([sql.SQL("%s")] * count))
+
+    def _execute_literals(self, name, params):
+        if not params:
+            return psycopg.sql.SQL("EXECUTE {}").format(psycopg.sql.Identifier(name))
+        return psycopg.sql.SQL("EXECUTE {} ({})").format(
+            psycopg.sql.Identifier(name), psycopg.sql.SQL(", ").join(psycopg.sql.Literal(param) for param in params))
+
+
+statement_cache = StatementCache()
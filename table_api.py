@@ -0,0 +1,264 @@
+from psycopg2 import sql
+
+import search
+from catalog import schema_catalog
+from statements import statement_cache
+
+# Сколько строк на одной странице
+PAGE_SIZE = 200
+# Направления постраничного просмотра (TableBrowser.page_query)
+FIRST = 'first'
+NEXT = 'next'
+PREVIOUS = 'previous'
+DIRECTIONS = (FIRST, NEXT, PREVIOUS)
+
+
+class Page:
+    def __init__(self, columns, rows, has_next, has_previous, number=1):
+        self.columns = columns
+        self.rows = rows
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.number = number
+
+
+def _key_arrays(columns, column_types, keys, sql_module):
+    # Значения ключей по колонкам: по массиву на колонку, с приведением к типу колонки на сервере
+    keys = [tuple(key) if isinstance(key, (list, tuple)) else (key,) for key in keys]
+    if any(len(key) != len(columns) for key in keys):
+        raise ValueError(f"Ключ должен состоять из значений колонок: {', '.join(columns)}")
+    # Тип берется из каталога (format_type), а не из пользовательского ввода
+    arrays = sql_module.SQL(", ").join(sql_module.SQL("%s::" + column_types[column] + "[]") for column in columns)
+    params = [[None if key[index] is None else str(key[index]) for key in keys] for index in range(len(columns))]
+    return arrays, params
+
+
+def key_condition(columns, column_types, keys, sql_module=sql):
+    """Условие "ключ строки входит в keys" и параметры к нему.
+
+    keys - значения ключа: кортежи для составного ключа или отдельные значения для ключа
+    из одной колонки. Значения сравниваются после приведения к типам колонок, поэтому ключи
+    из JSON-уведомлений (даты строками) находят те же строки, что и значения из Python.
+    """
+    arrays, params = _key_arrays(columns, column_types, keys, sql_module)
+    condition = sql_module.SQL("({}) IN (SELECT * FROM unnest({}))").format(
+        sql_module.SQL(", ").join(sql_module.Identifier(column) for column in columns), arrays)
+    return condition, params
+
+
+def key_values_query(columns, column_types, keys, sql_module=sql):
+    # Те же ключи, приведенные к типам колонок: строки (значения ключа) для сравнения на клиенте
+    arrays, params = _key_arrays(columns, column_types, keys, sql_module)
+    return sql_module.SQL("SELECT * FROM unnest({})").format(arrays), params
+
+
+class TableBrowser:
+    """Постраничный просмотр таблицы с пагинацией по ключу (keyset), без OFFSET.
+
+    Страница запрашивается условием "после последней показанной строки" по
+    (колонка сортировки, колонки первичного ключа), поэтому дальние страницы стоят столько же,
+    сколько первая, а сортировка может идти по индексу. Первичный ключ
+    используется как второй ключ сортировки, чтобы порядок был однозначным.
+    Для представлений без первичного ключа вместо него передаются колонки
+    уникального индекса (key). Запросы строит page_query, а выполняет first_page и
+    соседние методы (соединение psycopg2) или DatabaseService.browse (psycopg 3).
+    """
+
+    def __init__(self, table, page_size=PAGE_SIZE, key=None, catalog=None, sql_module=sql):
+        # catalog и sql_module: каталог и модуль psycopg.sql асинхронного service.py, по умолчанию psycopg2
+        self.catalog = catalog if catalog is not None else schema_catalog
+        self.sql = sql_module
+        self.table = table.lower()
+        self.primary_key = self.catalog.primary_key(self.table)
+        self.key = list(key) if key else list(self.primary_key)
+        if not self.key:
+            raise ValueError(f"У таблицы {table} нет первичного ключа, постраничный просмотр невозможен")
+        self.page_size = page_size
+        self.order_by = None
+        self.descending = False
+        self.filters = []
+
+    def set_order(self, column=None, descending=False):
+        if column is not None and not self.catalog.has_column(self.table, column):
+            raise ValueError(f"Колонка {column} не найдена в таблице {self.table}")
+        self.order_by = None if [column] == self.key else column
+        self.descending = descending
+
+    def set_filters(self, filters):
+        # filters: список (колонка, значение, режим поиска из search.py)
+        for column, _, _ in filters:
+            if not self.catalog.has_column(self.table, column):
+                raise ValueError(f"Колонка {column} не найдена в таблице {self.table}")
+        self.filters = list(filters)
+
+    def first_page(self, connection):
+        return self._page(connection, FIRST)
+
+    def next_page(self, connection, page):
+        return self._page(connection, NEXT, page)
+
+    def previous_page(self, connection, page):
+        return self._page(connection, PREVIOUS, page)
+
+    def _page(self, connection, direction, page=None):
+        direction, query, params = self.page_query(direction, page)
+        # Страницы одной формы (сортировка, фильтры, направление) выполняются по готовому плану
+        operation, used_columns = self.statement_key()
+        with connection.cursor() as cursor:
+            statement_cache.execute(cursor, operation, self.table, used_columns, query, params, self.catalog)
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+        result = self.make_page(direction, page, columns, rows)
+        return result if result is not None else self.first_page(connection)
+
+    def statement_key(self, operation=None):
+        # Операция и колонки запроса для statement_cache: по умолчанию запроса страницы
+        if operation is None:
+            operation = 'search' if self.filters else 'browse'
+        return operation, self._used_columns()
+
+    def page_query(self, direction, page=None):
+        """Запрос страницы: (направление, запрос, параметры).
+
+        direction - FIRST, NEXT или PREVIOUS относительно page; если двигаться некуда,
+        запрашивается первая страница. Строки запроса передаются в make_page.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Неизвестное направление просмотра: {direction}")
+        if (direction == NEXT and not page.rows) or (direction == PREVIOUS and (not page.rows or page.number <= 1)):
+            direction = FIRST
+        if direction == FIRST:
+            return direction, *self._query()
+        if direction == NEXT:
+            return direction, *self._query(page.rows[-1], page.columns)
+        return direction, *self._query(page.rows[0], page.columns, backward=True)
+
+    def make_page(self, direction, page, columns, rows):
+        # Страница из строк запроса page_query; None - нужна первая страница
+        has_more = len(rows) > self.page_size
+        rows = list(rows[:self.page_size])
+        if direction == FIRST:
+            return Page(columns, rows, has_more, False)
+        if direction == NEXT:
+            if not rows:
+                return Page(page.columns, page.rows, False, page.has_previous, page.number)
+            return Page(columns, rows, has_more, True, page.number + 1)
+        rows.reverse()
+        if not rows:
+            return None
+        return Page(columns, rows, True, has_more, page.number - 1)
+
+    def _query(self, boundary_row=None, boundary_columns=None, backward=False):
+        sql = self.sql
+        # При движении назад порядок сортировки переворачивается, а строки потом разворачиваются
+        descending = self.descending != backward
+        conditions, params = self._filter_conditions()
+
+        if boundary_row is not None:
+            key_values = [boundary_row[boundary_columns.index(column)] for column in self.key]
+            if self.order_by is None:
+                conditions.append(self._key_condition(descending))
+                params.extend(key_values)
+            else:
+                order_value = boundary_row[boundary_columns.index(self.order_by)]
+                condition, condition_params = self._keyset_condition(order_value, key_values, descending)
+                conditions.append(condition)
+                params.extend(condition_params)
+
+        direction = sql.SQL("DESC" if descending else "ASC")
+        order_items = [sql.SQL("{} {}").format(sql.Identifier(column), direction) for column in self.key]
+        if self.order_by is not None:
+            # Значения NULL: в конце при ASC и в начале при DESC (порядок индекса по умолчанию)
+            order_items.insert(0, sql.SQL("{} {}").format(sql.Identifier(self.order_by), direction))
+
+        query = sql.SQL("SELECT * FROM {table}{where} ORDER BY {order} LIMIT %s").format(
+            table=sql.Identifier(self.table),
+            where=self._where(conditions),
+            order=sql.SQL(", ").join(order_items)
+        )
+        params.append(self.page_size + 1)
+        return query, params
+
+    def rows_query(self, keys):
+        # Строки с указанными ключами, которые проходят текущие фильтры (для точечного обновления)
+        sql = self.sql
+        conditions, params = self._filter_conditions()
+        condition, key_params = key_condition(self.key, self.catalog.column_types(self.table), keys, sql)
+        conditions.append(condition)
+        params.extend(key_params)
+        return sql.SQL("SELECT * FROM {}{}").format(sql.Identifier(self.table), self._where(conditions)), params
+
+    def compare_rows(self, columns, a, b):
+        # -1, 0 или 1 в зависимости от того, в каком порядке строки идут на странице
+        indexes = [columns.index(column) for column in self.key]
+        if self.order_by is not None:
+            indexes.insert(0, columns.index(self.order_by))
+        for index in indexes:
+            x, y = a[index], b[index]
+            if x == y:
+                continue
+            # NULL в конце при ASC и в начале при DESC, как в ORDER BY
+            if x is None:
+                result = 1
+            elif y is None:
+                result = -1
+            else:
+                result = -1 if x < y else 1
+            return -result if self.descending else result
+        return 0
+
+    def _filter_conditions(self):
+        conditions = []
+        params = []
+        column_types = self.catalog.column_types(self.table)
+        for column, value, mode in self.filters:
+            condition, condition_params = search.search_condition(column, column_types.get(column), value, mode,
+                                                                  sql_module=self.sql)
+            conditions.append(condition)
+            params.extend(condition_params)
+        return conditions, params
+
+    def _used_columns(self):
+        columns = list(self.key) + [column for column, _, _ in self.filters]
+        if self.order_by is not None:
+            columns.append(self.order_by)
+        return columns
+
+    def _where(self, conditions):
+        sql = self.sql
+        if not conditions:
+            return sql.SQL("")
+        return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(sql.SQL("({})").format(c) for c in conditions)
+
+    def _key_sql(self):
+        sql = self.sql
+        return sql.SQL(", ").join(sql.Identifier(column) for column in self.key)
+
+    def _key_placeholders(self):
+        return ", ".join(["%s"] * len(self.key))
+
+    def _key_condition(self, descending):
+        sql = self.sql
+        operator = "<" if descending else ">"
+        return sql.SQL("({}) " + operator + " (" + self._key_placeholders() + ")").format(self._key_sql())
+
+    def _keyset_condition(self, order_value, key_values, descending):
+        sql = self.sql
+        column = sql.Identifier(self.order_by)
+        operator = "<" if descending else ">"
+        nullable = not any(c.name == self.order_by and c.not_null for c in self.catalog.columns(self.table))
+
+        if order_value is None:
+            # Граница среди NULL: дальше идут остальные NULL по ключу, а при DESC - все не-NULL
+            condition = sql.SQL("{} IS NULL AND {}").format(column, self._key_condition(descending))
+            if descending:
+                condition = sql.SQL("({}) OR {} IS NOT NULL").format(condition, column)
+            return condition, list(key_values)
+
+        # Сравнение строк (col, pk) > (v, k) использует составной порядок индекса
+        condition = sql.SQL("({}, {}) " + operator + " (%s, " + self._key_placeholders() + ")").format(
+            column, self._key_sql())
+        if nullable and not descending:
+            condition = sql.SQL("{} OR {} IS NULL").format(condition, column)
+        return condition, [order_value] + list(key_values)
+
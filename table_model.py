@@ -0,0 +1,231 @@
+from PyQt5 import QtCore
+
+
+class RowTableModel(QtCore.QAbstractTableModel):
+    """Модель таблицы над списком строк (страница DatabaseService.browse или результат запроса).
+
+    Значения превращаются в текст только при отрисовке ячейки; строки страницы можно
+    точечно заменять, вставлять и удалять по уведомлениям об изменениях.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = []
+        self.rows = []
+
+    def set_result(self, columns, rows):
+        self.beginResetModel()
+        self.columns = columns
+        self.rows = list(rows)
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return str(self.rows[index.row()][index.column()])
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            if section < len(self.columns):
+                return self.columns[section]
+            return None
+        return str(section + 1)
+
+    def row_values(self, row):
+        return self.rows[row]
+
+    def column_index(self, column_name):
+        try:
+            return self.columns.index(column_name)
+        except ValueError:
+            return None
+
+    def find_rows(self, columns, keys):
+        # Номера строк, у которых значения колонок columns (ключа) входят в keys - кортежи
+        # значений с типами колонок, как их возвращает DatabaseService.changed_rows
+        indexes = [self.column_index(column) for column in columns]
+        if None in indexes:
+            return []
+        keys = {tuple(key) for key in keys}
+        return [row for row, values in enumerate(self.rows) if tuple(values[index] for index in indexes) in keys]
+
+    def update_row(self, row, values):
+        self.rows[row] = values
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def insert_row(self, row, values):
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.rows.insert(row, values)
+        self.endInsertRows()
+
+    def remove_rows(self, rows):
+        # Удаляем с конца, чтобы номера оставшихся строк не сдвигались
+        for row in sorted(rows, reverse=True):
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+
+
+class ColumnarTableModel(QtCore.QAbstractTableModel):
+    """Модель над ColumnarResult (result_cache.py): все строки уже в памяти, по колонкам."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.result = None
+
+    def set_result(self, result):
+        self.beginResetModel()
+        self.result = result
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.result is None:
+            return 0
+        return self.result.row_count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.result is None:
+            return 0
+        return len(self.result.names)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return str(self.result.columns[index.column()].value(index.row()))
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or self.result is None:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.result.names[section] if section < len(self.result.names) else None
+        return str(section + 1)
+
+
+class ColumnarProxyModel(QtCore.QAbstractProxyModel):
+    """Сортировка и фильтры над ColumnarTableModel без копирования строк.
+
+    Представление хранит только вектор номеров строк исходной модели; sort() и add_filter()
+    пересчитывают его векторными операциями ColumnarResult. Фильтры накапливаются (каждый
+    следующий сужает результат) и вместе с сортировкой сохраняются при замене результата.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filters = []
+        self.sort_column = None
+        self.descending = False
+        self._rows = []
+        self._positions = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelReset.connect(self._rebuild)
+        self._rebuild()
+
+    @property
+    def result(self):
+        return self.sourceModel().result if self.sourceModel() is not None else None
+
+    def _rebuild(self):
+        # Фильтры уже проверены в add_filter, поэтому к новому результату применяются без ошибок
+        result = self.result
+        rows = []
+        if result is not None:
+            rows = result.all_indices()
+            for column, value, mode in self.filters:
+                rows = result.filter_indices(column, value, mode, rows)
+            if self.sort_column is not None and self.sort_column in result.names:
+                rows = result.sort_indices(self.sort_column, self.descending, rows)
+        self.beginResetModel()
+        self._rows = rows
+        self._positions = None
+        self.endResetModel()
+
+    def add_filter(self, column, value, mode):
+        # Фильтр проверяется до сохранения: ошибка (ValueError) не меняет текущее представление
+        rows = self.result.filter_indices(column, value, mode, self._rows)
+        self.beginResetModel()
+        self.filters.append((column, value, mode))
+        self._rows = rows
+        self._positions = None
+        self.endResetModel()
+
+    def clear_filters(self):
+        self.filters = []
+        self._rebuild()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        if self.result is None or not 0 <= column < len(self.result.names):
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = self.result.names[column]
+        self.descending = order == QtCore.Qt.DescendingOrder
+        self._rows = self.result.sort_indices(self.sort_column, self.descending, self._rows)
+        self._positions = None
+        self.layoutChanged.emit()
+
+    def statistics(self, column):
+        return self.result.statistics(column, self._rows)
+
+    def row_values(self, row):
+        return self.result.row_values(int(self._rows[row]))
+
+    def column_index(self, column_name):
+        try:
+            return self.result.names.index(column_name)
+        except (AttributeError, ValueError):
+            return None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(int(self._rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+        if self._positions is None:
+            self._positions = {int(row): position for position, row in enumerate(self._rows)}
+        position = self._positions.get(source_index.row())
+        if position is None:
+            return QtCore.QModelIndex()
+        return self.index(position, source_index.column())
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Vertical:
+            return str(section + 1) if role == QtCore.Qt.DisplayRole else None
+        return self.sourceModel().headerData(section, orientation, role) if self.sourceModel() else None
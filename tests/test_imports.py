@@ -0,0 +1,14 @@
+import importlib
+
+import pytest
+
+# Модули верхнего уровня: ошибка при определении класса или функции видна уже при импорте
+MODULES = ['service', 'workers', 'main', 'gui', 'datagen', 'benchmark', 'bulk_io', 'reports',
+           'schema_migrations', 'statements', 'result_cache', 'table_model']
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import(module):
+    for dependency in ('psycopg2', 'psycopg', 'psycopg_pool', 'PyQt5.QtWidgets'):
+        pytest.importorskip(dependency)
+    importlib.import_module(module)
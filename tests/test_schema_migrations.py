@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+import schema_migrations
+from schema_migrations import baseline_history, checksum, load_migrations, pending_migrations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+@pytest.fixture
+def project(tmp_path):
+    write(tmp_path / 'migrations' / '0001_initial.sql', "CREATE TABLE a (id INT);")
+    write(tmp_path / 'migrations' / '0002_second.sql', "CREATE TABLE b (id INT);")
+    write(tmp_path / 'procedures.sql', "CREATE OR REPLACE FUNCTION f() RETURNS INT AS 'SELECT 1' LANGUAGE sql;")
+    return tmp_path
+
+
+def load(root):
+    return load_migrations(str(root / 'migrations'), root=str(root))
+
+
+def applied(migrations):
+    return {migration.script: (migration.version, migration.checksum) for migration in migrations}
+
+
+def test_project_migrations_are_valid():
+    migrations = load_migrations(os.path.join(ROOT, schema_migrations.MIGRATIONS_DIR), root=ROOT)
+    versions = [migration.version for migration in migrations if not migration.repeatable]
+    assert versions == list(range(1, len(versions) + 1))
+    assert [migration.script for migration in migrations if migration.repeatable] == ['procedures.sql']
+
+
+def test_load_orders_versions_then_repeatable(project):
+    migrations = load(project)
+    assert [migration.script for migration in migrations] == ['0001_initial.sql', '0002_second.sql', 'procedures.sql']
+    assert migrations[-1].repeatable
+
+
+@pytest.mark.parametrize('name, text, message', [
+    ('2_bad_name.sql', "SELECT 1;", "имя должно быть"),
+    ('0004_gap.sql', "SELECT 1;", "подряд"),
+    ('0003_empty.sql', "  \n", "пуст"),
+])
+def test_load_rejects_invalid_files(project, name, text, message):
+    write(project / 'migrations' / name, text)
+    with pytest.raises(ValueError, match=message):
+        load(project)
+
+
+def test_load_rejects_duplicate_version(project):
+    write(project / 'migrations' / '0002_other.sql', "SELECT 1;")
+    with pytest.raises(ValueError, match="уже занята"):
+        load(project)
+
+
+def test_load_rejects_stray_root_sql(project):
+    write(project / 'setup_db.sql', "SELECT 1;")
+    with pytest.raises(ValueError, match="вне миграций: setup_db.sql"):
+        load(project)
+
+
+def test_checksum_ignores_line_endings():
+    assert checksum("SELECT 1;\r\nSELECT 2;") == checksum("SELECT 1;\nSELECT 2;")
+
+
+def test_pending_on_empty_database(project):
+    migrations = load(project)
+    assert pending_migrations(migrations, {}) == migrations
+
+
+def test_pending_after_baseline(project):
+    migrations = load(project)
+    history = baseline_history(migrations)
+    assert list(history) == ['0001_initial.sql']
+    assert [migration.script for migration in pending_migrations(migrations, history)] == [
+        '0002_second.sql', 'procedures.sql']
+
+
+def test_nothing_pending_when_up_to_date(project):
+    migrations = load(project)
+    assert pending_migrations(migrations, applied(migrations)) == []
+
+
+def test_changed_repeatable_script_is_pending(project):
+    history = applied(load(project))
+    write(project / 'procedures.sql', "CREATE OR REPLACE FUNCTION f() RETURNS INT AS 'SELECT 2' LANGUAGE sql;")
+    assert [migration.script for migration in pending_migrations(load(project), history)] == ['procedures.sql']
+
+
+def test_changed_applied_migration_is_drift(project):
+    history = applied(load(project))
+    write(project / 'migrations' / '0001_initial.sql', "CREATE TABLE a (id BIGINT);")
+    with pytest.raises(ValueError, match="0001_initial.sql изменена"):
+        pending_migrations(load(project), history)
+
+
+def test_removed_applied_migration_is_drift(project):
+    history = applied(load(project))
+    history['0003_removed.sql'] = (3, checksum("SELECT 1;"))
+    with pytest.raises(ValueError, match="файла больше нет"):
+        pending_migrations(load(project), history)
+
+
+def test_new_migration_older_than_applied_is_drift(project):
+    migrations = load(project)
+    history = applied(migrations[1:2])
+    with pytest.raises(ValueError, match="0001_initial.sql старше"):
+        pending_migrations(migrations, history)
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+pytest.importorskip('psycopg2')
+psycopg_sql = pytest.importorskip('psycopg.sql')
+
+import search
+from search import AUTO, CONTAINS, EXACT, PREFIX
+
+
+def condition(column, data_type, value, mode=AUTO):
+    query, params = search.search_condition(column, data_type, value, mode, sql_module=psycopg_sql)
+    return query.as_string(None), tuple(params)
+
+
+@pytest.mark.parametrize('value, mode, pattern', [
+    ('ann', CONTAINS, '%ann%'),
+    ('ann', PREFIX, 'ann%'),
+    ('50%', CONTAINS, '%50\\%%'),
+    ('a_b', PREFIX, 'a\\_b%'),
+    ('c:\\temp', CONTAINS, '%c:\\\\temp%'),
+])
+def test_like_pattern_escapes_wildcards(value, mode, pattern):
+    assert search.like_pattern(value, mode) == pattern
+
+
+def test_text_contains_by_default():
+    assert condition('name', 'text', '50%') == ('"name" ILIKE %s', ('%50\\%%',))
+
+
+def test_text_prefix_and_exact():
+    assert condition('email', 'character varying', 'a_', PREFIX) == ('"email" ILIKE %s', ('a\\_%',))
+    assert condition('email', 'character varying', 'a_', EXACT) == ('"email" = %s', ('a_',))
+
+
+def test_number_exact_by_default():
+    assert condition('amount', 'numeric', '10') == ('"amount" = %s', ('10',))
+
+
+def test_non_text_substring_casts_to_text():
+    assert condition('amount', 'numeric', '1_', CONTAINS) == ('"amount"::text ILIKE %s', ('%1\\_%',))
+
+
+@pytest.mark.parametrize('value, bounds', [
+    ('2024-03-05', (datetime.date(2024, 3, 5), datetime.date(2024, 3, 6))),
+    ('2024-12', (datetime.date(2024, 12, 1), datetime.date(2025, 1, 1))),
+    ('2024', (datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))),
+    ('2024-03-01..2024-03-31', (datetime.date(2024, 3, 1), datetime.date(2024, 4, 1))),
+])
+def test_date_exact_is_range(value, bounds):
+    assert condition('session_date', 'timestamp without time zone', value) == (
+        '"session_date" >= %s AND "session_date" < %s', bounds)
+
+
+def test_unparsed_date_is_left_to_server():
+    assert condition('session_date', 'date', 'today') == (
+        '"session_date" >= %s::date AND "session_date" < %s::date + 1', ('today', 'today'))
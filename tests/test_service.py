@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('psycopg_pool')
+
+from service import _cascade_order
+
+
+def edges(*pairs):
+    # (дочерняя таблица, родительская таблица) -> строки CASCADE_QUERY
+    return [(child, 'parent_id', parent, 'id') for child, parent in pairs]
+
+
+SCHEMA = edges(('tutors', 'users'), ('sessions', 'tutors'), ('enrollments', 'sessions'),
+               ('enrollments', 'users'), ('reviews', 'sessions'), ('payments', 'sessions'),
+               ('subjects_log', 'subjects'))
+
+
+def test_parents_come_before_children():
+    assert _cascade_order('users', SCHEMA) == ['tutors', 'sessions', 'enrollments', 'payments', 'reviews']
+
+
+def test_only_reachable_tables_are_included():
+    assert _cascade_order('sessions', SCHEMA) == ['enrollments', 'payments', 'reviews']
+    assert _cascade_order('subjects', SCHEMA) == ['subjects_log']
+    assert _cascade_order('reviews', SCHEMA) == []
+
+
+def test_self_reference_is_ignored():
+    assert _cascade_order('users', edges(('users', 'users'), ('tutors', 'users'))) == ['tutors']
+
+
+def test_cycle_is_left_out():
+    order = _cascade_order('users', edges(('a', 'users'), ('a', 'b'), ('b', 'a'), ('c', 'users')))
+    assert order == ['c']
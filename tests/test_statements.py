@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from catalog import SchemaCatalog
+from statements import StatementCache, server_text
+
+
+class RecordingCursor:
+    # Курсор без сервера: запоминает команды, PREPARE можно заставить завершиться ошибкой
+    def __init__(self, backend_pid=1, fail_prepare=False):
+        self.connection = SimpleNamespace(info=SimpleNamespace(backend_pid=backend_pid), autocommit=True)
+        self.fail_prepare = fail_prepare
+        self.commands = []
+
+    def execute(self, query, params=None):
+        command = repr(query)
+        if self.fail_prepare and 'PREPARE' in command:
+            raise RuntimeError("PREPARE failed")
+        self.commands.append(command)
+
+
+@pytest.fixture
+def catalog():
+    rows = [('items', 'r', 'id', 'integer', True, True, False, 1, None, None),
+            ('items', 'r', 'name', 'text', False, False, False, None, None, None)]
+    return SchemaCatalog('test').load_rows(rows)
+
+
+def run(cache, cursor, catalog, operation, text='SELECT * FROM items WHERE id > %s', params=(1,)):
+    cache.execute(cursor, operation, 'items', ['id'], text, params, catalog)
+
+
+def names(cache, cursor):
+    return list(cache._statements(cursor.connection, None).names.values())
+
+
+def test_server_text_numbers_placeholders():
+    assert server_text("SELECT %s, %s, '100%%'", None) == ("SELECT $1, $2, '100%'", 2)
+
+
+def test_repeated_query_is_prepared_once(catalog):
+    cache, cursor = StatementCache(), RecordingCursor()
+    run(cache, cursor, catalog, 'browse')
+    run(cache, cursor, catalog, 'browse')
+    assert sum('PREPARE' in command for command in cursor.commands) == 1
+    assert sum('EXECUTE' in command for command in cursor.commands) == 2
+
+
+def test_least_recently_used_statement_is_deallocated(catalog):
+    cache, cursor = StatementCache(max_prepared=2), RecordingCursor()
+    run(cache, cursor, catalog, 'a')
+    run(cache, cursor, catalog, 'b')
+    run(cache, cursor, catalog, 'a')
+    run(cache, cursor, catalog, 'c')
+    assert names(cache, cursor) == ['a_items_1', 'c_items_3']
+    assert any('DEALLOCATE' in command and 'b_items_2' in command for command in cursor.commands)
+
+
+def test_catalog_change_deallocates_all(catalog):
+    cache, cursor = StatementCache(), RecordingCursor()
+    run(cache, cursor, catalog, 'browse')
+    catalog.invalidate()
+    catalog.load_rows([('items', 'r', 'id', 'integer', True, True, False, 1, None, None)])
+    run(cache, cursor, catalog, 'browse')
+    assert any('DEALLOCATE ALL' in command for command in cursor.commands)
+    assert names(cache, cursor) == ['browse_items_2']
+
+
+def test_least_recently_used_connection_is_forgotten(catalog):
+    cache = StatementCache(max_connections=2)
+    cursors = {backend_pid: RecordingCursor(backend_pid) for backend_pid in (1, 2, 3)}
+    for backend_pid in (1, 2, 1, 3):
+        run(cache, cursors[backend_pid], catalog, 'browse')
+    assert [backend_pid for _, backend_pid in cache._connections] == [1, 3]
+
+
+def test_failed_prepare_is_not_remembered(catalog):
+    cache, cursor = StatementCache(), RecordingCursor(fail_prepare=True)
+    with pytest.raises(RuntimeError):
+        run(cache, cursor, catalog, 'browse')
+    assert names(cache, cursor) == []
+    cursor.fail_prepare = False
+    run(cache, cursor, catalog, 'browse')
+    assert names(cache, cursor) == ['browse_items_2']
+
+
+@pytest.mark.parametrize('columns, params, message', [
+    (['missing'], (1,), "Колонки не найдены"),
+    (['id'], (), "нужно параметров: 1"),
+])
+def test_invalid_query_is_rejected(catalog, columns, params, message):
+    with pytest.raises(ValueError, match=message):
+        StatementCache().execute(RecordingCursor(), 'browse', 'items', columns,
+                                 'SELECT * FROM items WHERE id > %s', params, catalog)
@@ -0,0 +1,147 @@
+import datetime
+
+import pytest
+
+pytest.importorskip('psycopg2')
+psycopg_sql = pytest.importorskip('psycopg.sql')
+
+from catalog import SchemaCatalog
+from search import CONTAINS
+from table_api import FIRST, NEXT, PREVIOUS, TableBrowser, key_condition
+
+COLUMNS = ['payment_id', 'payment_date', 'amount', 'note']
+DAY = datetime.datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def catalog():
+    rows = [
+        ('payments', 'r', 'payment_id', 'integer', True, True, False, 1, None, None),
+        ('payments', 'r', 'payment_date', 'timestamp without time zone', True, True, False, 2, None, None),
+        ('payments', 'r', 'amount', 'numeric', False, False, False, None, None, None),
+        ('payments', 'r', 'note', 'text', True, False, False, None, None, None),
+        ('payments_view', 'v', 'amount', 'numeric', False, False, False, None, None, None),
+    ]
+    return SchemaCatalog('test').load_rows(rows)
+
+
+def browser(catalog, page_size=2, order_by=None, descending=False, filters=()):
+    result = TableBrowser('payments', page_size=page_size, catalog=catalog, sql_module=psycopg_sql)
+    result.set_order(order_by, descending)
+    result.set_filters(filters)
+    return result
+
+
+def render(browser, direction, page=None):
+    direction, query, params = browser.page_query(direction, page)
+    return direction, query.as_string(None), params
+
+
+def page_of(browser, rows):
+    return browser.make_page(FIRST, None, COLUMNS, rows)
+
+
+def test_composite_primary_key_orders_first_page(catalog):
+    assert render(browser(catalog), FIRST) == (
+        FIRST, 'SELECT * FROM "payments" ORDER BY "payment_id" ASC, "payment_date" ASC LIMIT %s', [3])
+
+
+def test_next_page_compares_whole_key(catalog):
+    paged = browser(catalog)
+    page = page_of(paged, [(1, DAY, 10, 'a'), (2, DAY, 20, 'b')])
+    assert render(paged, NEXT, page) == (
+        NEXT,
+        'SELECT * FROM "payments" WHERE (("payment_id", "payment_date") > (%s, %s)) '
+        'ORDER BY "payment_id" ASC, "payment_date" ASC LIMIT %s',
+        [2, DAY, 3])
+
+
+def test_previous_page_reverses_order(catalog):
+    paged = browser(catalog)
+    page = paged.make_page(NEXT, page_of(paged, [(1, DAY, 10, 'a')]), COLUMNS, [(5, DAY, 50, 'e'), (6, DAY, 60, 'f')])
+    assert render(paged, PREVIOUS, page) == (
+        PREVIOUS,
+        'SELECT * FROM "payments" WHERE (("payment_id", "payment_date") < (%s, %s)) '
+        'ORDER BY "payment_id" DESC, "payment_date" DESC LIMIT %s',
+        [5, DAY, 3])
+
+
+def test_nullable_sort_column_includes_nulls_after_values(catalog):
+    paged = browser(catalog, order_by='amount')
+    page = page_of(paged, [(1, DAY, 10, 'a'), (2, DAY, 20, 'b')])
+    _, query, params = render(paged, NEXT, page)
+    assert query == (
+        'SELECT * FROM "payments" WHERE (("amount", "payment_id", "payment_date") > (%s, %s, %s) '
+        'OR "amount" IS NULL) ORDER BY "amount" ASC, "payment_id" ASC, "payment_date" ASC LIMIT %s')
+    assert params == [20, 2, DAY, 3]
+
+
+def test_null_boundary_descending_continues_into_values(catalog):
+    paged = browser(catalog, order_by='amount', descending=True)
+    page = page_of(paged, [(1, DAY, None, 'a'), (2, DAY, None, 'b')])
+    _, query, params = render(paged, NEXT, page)
+    assert query == (
+        'SELECT * FROM "payments" WHERE (("amount" IS NULL AND ("payment_id", "payment_date") < (%s, %s)) '
+        'OR "amount" IS NOT NULL) ORDER BY "amount" DESC, "payment_id" DESC, "payment_date" DESC LIMIT %s')
+    assert params == [2, DAY, 3]
+
+
+def test_not_null_sort_column_has_no_null_branch(catalog):
+    paged = browser(catalog, order_by='note')
+    page = page_of(paged, [(1, DAY, 10, 'a'), (2, DAY, 20, 'b')])
+    _, query, params = render(paged, NEXT, page)
+    assert 'IS NULL' not in query
+    assert params == ['b', 2, DAY, 3]
+
+
+def test_filters_come_before_keyset_condition(catalog):
+    paged = browser(catalog, filters=[('note', 'x', CONTAINS)])
+    page = page_of(paged, [(1, DAY, 10, 'x'), (2, DAY, 20, 'x')])
+    _, query, params = render(paged, NEXT, page)
+    assert query.startswith('SELECT * FROM "payments" WHERE ("note" ILIKE %s) AND ((')
+    assert params == ['%x%', 2, DAY, 3]
+
+
+def test_sorting_by_single_key_column_uses_key_order(catalog):
+    paged = TableBrowser('payments', catalog=catalog, key=['payment_id'], sql_module=psycopg_sql)
+    paged.set_order('payment_id')
+    assert paged.order_by is None
+
+
+def test_empty_next_page_keeps_current_rows(catalog):
+    paged = browser(catalog)
+    page = page_of(paged, [(1, DAY, 10, 'a'), (2, DAY, 20, 'b'), (3, DAY, 30, 'c')])
+    assert page.has_next and len(page.rows) == 2
+    last = paged.make_page(NEXT, page, COLUMNS, [])
+    assert last.rows == page.rows and not last.has_next
+
+
+def test_previous_before_first_page_requests_first(catalog):
+    paged = browser(catalog)
+    page = page_of(paged, [(1, DAY, 10, 'a')])
+    assert paged.make_page(PREVIOUS, page, COLUMNS, []) is None
+    assert render(paged, PREVIOUS, page)[0] == FIRST
+
+
+def test_compare_rows_follows_sort_order(catalog):
+    paged = browser(catalog, order_by='amount', descending=True)
+    assert paged.compare_rows(COLUMNS, (1, DAY, 20, 'a'), (2, DAY, 10, 'b')) == -1
+    assert paged.compare_rows(COLUMNS, (1, DAY, None, 'a'), (2, DAY, 10, 'b')) == -1
+    assert paged.compare_rows(COLUMNS, (1, DAY, 10, 'a'), (1, DAY, 10, 'b')) == 0
+
+
+def test_key_condition_casts_composite_keys(catalog):
+    types = catalog.column_types('payments')
+    condition, params = key_condition(['payment_id', 'payment_date'], types,
+                                      [(1, DAY), [2, '2024-03-02T00:00:00']], psycopg_sql)
+    assert condition.as_string(None) == (
+        '("payment_id", "payment_date") IN '
+        '(SELECT * FROM unnest(%s::integer[], %s::timestamp without time zone[]))')
+    assert params == [['1', '2'], [str(DAY), '2024-03-02T00:00:00']]
+    with pytest.raises(ValueError, match="Ключ должен состоять"):
+        key_condition(['payment_id', 'payment_date'], types, [1], psycopg_sql)
+
+
+def test_relation_without_key_is_rejected(catalog):
+    with pytest.raises(ValueError, match="нет первичного ключа"):
+        TableBrowser('payments_view', catalog=catalog, sql_module=psycopg_sql)
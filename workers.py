@@ -0,0 +1,145 @@
+import concurrent.futures
+
+from PyQt5 import QtWidgets, QtCore
+from psycopg2 import extensions
+
+from service import get_runner
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskSignals(QtCore.QObject):
+    progress = QtCore.pyqtSignal(str)
+    result = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+    finished = QtCore.pyqtSignal()
+
+
+class DbTask(QtCore.QRunnable):
+    """Операция с базой данных, которая выполняется в QThreadPool, а не в потоке интерфейса.
+
+    Функция вызывается как fn(task, *args, **kwargs). Через task она сообщает о прогрессе
+    (task.report), регистрирует соединение, на котором идет запрос (task.use_connection),
+    или вызов асинхронного сервиса (task.use_future) и проверяет отмену между шагами
+    (task.check_cancelled). Результат и ошибки возвращаются в поток интерфейса через сигналы.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self.active_connection = None
+        self.active_future = None
+        self.is_cancelled = False
+
+    def use_connection(self, connection):
+        self.active_connection = connection
+        return connection
+
+    def use_future(self, future):
+        self.active_future = future
+        if self.is_cancelled:
+            future.cancel()
+        return future
+
+    def report(self, message):
+        self.signals.progress.emit(message)
+
+    def check_cancelled(self):
+        if self.is_cancelled:
+            raise TaskCancelled()
+
+    def cancel(self):
+        # Вызывается из потока интерфейса: прерывает текущий запрос на сервере
+        self.is_cancelled = True
+        connection = self.active_connection
+        if connection is not None and not connection.closed:
+            try:
+                connection.cancel()
+            except Exception as e:
+                print('Не удалось отменить запрос:', e)
+        future = self.active_future
+        if future is not None:
+            # Отмена корутины в цикле сервиса отменяет и запрос на сервере
+            future.cancel()
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except (TaskCancelled, extensions.QueryCanceledError, concurrent.futures.CancelledError):
+            self.signals.cancelled.emit()
+        except Exception as e:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.error.emit(str(e))
+        else:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+def call_service(task, method, *args, **kwargs):
+    # Выполняет метод DatabaseService (service.py) и ждет результата; задачу можно отменить
+    runner = get_runner()
+    future = task.use_future(runner.submit(getattr(runner.service, method)(*args, **kwargs)))
+    return future.result()
+
+
+def service_task(method, *args, **kwargs):
+    # DbTask, которая вызывает один метод DatabaseService
+    return DbTask(lambda task: call_service(task, method, *args, **kwargs))
+
+
+def start_task(parent, task, label, on_result=None, on_error=None):
+    # Запускает задачу в фоне и показывает окно прогресса с кнопкой отмены
+    dialog = QtWidgets.QProgressDialog(label, "Отмена", 0, 0, parent)
+    dialog.setWindowTitle("Выполнение")
+    dialog.setWindowModality(QtCore.Qt.WindowModal)
+    dialog.setMinimumDuration(300)
+    dialog.setAutoReset(False)
+    dialog.setValue(0)
+
+    if not hasattr(parent, 'active_tasks'):
+        parent.active_tasks = set()
+    parent.active_tasks.add(task)
+
+    def finish():
+        parent.active_tasks.discard(task)
+        dialog.canceled.disconnect(task.cancel)
+        dialog.close()
+
+    dialog.canceled.connect(task.cancel)
+    task.signals.progress.connect(dialog.setLabelText)
+    if on_result is not None:
+        task.signals.result.connect(on_result)
+    task.signals.error.connect(on_error or parent.show_error)
+    task.signals.cancelled.connect(lambda: parent.show_message("Отмена", "Операция отменена."))
+    task.signals.finished.connect(finish)
+
+    QtCore.QThreadPool.globalInstance().start(task)
+    return task
+
+
+def start_background_task(parent, task, on_result=None, on_error=None):
+    # Как start_task, но без окна прогресса: для фоновых обновлений, которые не должны мешать работе
+    if not hasattr(parent, 'active_tasks'):
+        parent.active_tasks = set()
+    parent.active_tasks.add(task)
+
+    if on_result is not None:
+        task.signals.result.connect(on_result)
+    if on_error is not None:
+        task.signals.error.connect(on_error)
+    task.signals.finished.connect(lambda: parent.active_tasks.discard(task))
+
+    QtCore.QThreadPool.globalInstance().start(task)
+    return task